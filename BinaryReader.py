@@ -1,13 +1,59 @@
+import mmap
 import struct
 
 class BinaryReader:
     def __init__(self, data: bytes):
-        self.data = data
+        self.data = self._view(data)
         self.pos = 0
-        self.size = len(data)
+        self.size = len(self.data)
+
+    @classmethod
+    def from_file(cls, path):
+        # Map the file read-only; every slice handed out by bytes() stays a view into the mapping
+        with open(path, "rb") as f:
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty files can't be mapped
+                data = b""
+        return cls(data)
+
+    def close(self):
+        """
+        Drop the buffer and unmap a file opened with from_file. Views handed out by bytes() and the arrays
+        over them still point into the mapping, it is then unmapped once the last of them is gone.
+        """
+        data = self.data
+        source = data.obj
+        self.data = memoryview(b"")
+        self.size = 0
+        self.pos = 0
+        try:
+            data.release()
+        except BufferError:
+            pass
+        if isinstance(source, mmap.mmap):
+            try:
+                source.close()
+            except BufferError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @staticmethod
+    def _view(data):
+        view = memoryview(data)
+        if view.format != "B" or view.ndim != 1:
+            view = view.cast("B")
+        return view
 
     def set_buffer(self, data):
-        self.data = data
+        self.data = self._view(data)
+        self.size = len(self.data)
 
     def tell(self):
         return self.pos
@@ -61,10 +107,23 @@ class BinaryReader:
         self.pos += 4
         return v
 
+    def record(self, fmt):
+        # fmt is a precompiled struct.Struct describing a fixed-layout record
+        v = fmt.unpack_from(self.data, self.pos)
+        self.pos += fmt.size
+        return v
+
+    def array(self, code, count):
+        # a negative count reads nothing, like the range(count) loops this replaced
+        fmt = "<%d%s" % (max(count, 0), code)
+        v = struct.unpack_from(fmt, self.data, self.pos)
+        self.pos += struct.calcsize(fmt)
+        return v
+
     def bytes(self, size):
         b = self.data[self.pos:self.pos+size]
         self.pos += size
         return b
 
     def string(self, size):
-        return self.bytes(size).rstrip(b"\x00").decode("utf-8", errors="replace")
+        return self.bytes(size).tobytes().rstrip(b"\x00").decode("utf-8", errors="replace")
@@ -0,0 +1,348 @@
+import numpy as np
+
+from SMOGraph import smo_graph
+from XBGParser import ESecondaryMotionObjectType
+
+
+EPSILON = 1e-9
+
+
+def _scatter_add(index, values, count):
+    """Sum the (M,3) values into count rows, always float64"""
+    # bincount gives int64 for an empty index even with weights
+    return np.stack([np.bincount(index, weights=values[:, axis], minlength=count) for axis in range(3)],
+                    axis=1).astype(np.float64)
+
+
+def _particle_fields(particles, count):
+    """Radius and attached flag of every particle, for the dict/record and the arrays=True shapes"""
+    table = particles["particle"]
+    if isinstance(table, np.ndarray):
+        radius = table["radius"].astype(np.float64)
+        attached = table["isAttached"] != 0
+    else:
+        radius = np.array([p["radius"] for p in table], dtype=np.float64)
+        attached = np.array([bool(p["isAttached"]) for p in table], dtype=bool)
+
+    # springs may reference particles past the table, they get no radius and aren't attached
+    return np.pad(radius, (0, count - len(radius))), np.pad(attached, (0, count - len(attached)))
+
+
+def _spring_stiffness(params):
+    """Stiffness indexed by ESecondaryMotionSpringType value"""
+    return np.array([
+        params["verticalStiffness"],    # StructuralMisc
+        params["verticalStiffness"],    # StructuralVertical
+        params["horizontalStiffness"],  # StructuralHorizontal
+        params["shearStiffness"],       # ShearDiagonal
+        params["bendStiffness"],        # Bend
+        params["bendStiffness"],        # BendVertical
+    ], dtype=np.float64)
+
+
+def _frame(matrix):
+    """Origin and orthonormal rows of a row-vector 4x4, scale removed"""
+    rotation = matrix[:3, :3]
+    rotation = rotation / np.maximum(np.linalg.norm(rotation, axis=1, keepdims=True), EPSILON)
+    return matrix[3, :3], rotation
+
+
+class ClothSolver:
+    """
+    Position based preview of parsed secondary motion objects.
+
+    Any number of SMOs are stepped together as one particle system, every constraint is solved as array
+    operations over all of them. The format stores no particle rest pose, so the initial positions are
+    given per SMO (e.g. the world positions of the bones the particles follow); spring rest lengths are
+    taken from them and attached particles stay on them unless step() gets new targets.
+
+    Collision primitives and limits are placed with bone_world, a {bone name: 4x4 row-vector world matrix}
+    map looked up with the primitive name. Collision primitives of unknown bones are used in object space,
+    limits of unknown bones are centred on the initial position of their particle.
+    """
+
+    def __init__(self, smos, positions, bone_world=None):
+        self.smos = list(smos)
+        if not self.smos:
+            raise ValueError("ClothSolver needs at least one secondary motion object")
+        positions = list(positions)
+        if len(positions) != len(self.smos):
+            raise ValueError(f"{len(self.smos)} secondary motion objects, got {len(positions)} position arrays")
+        self._bone_world = bone_world or {}
+        self._parts = {}
+        self._starts = [0]
+        for owner, (smo, initial) in enumerate(zip(self.smos, positions)):
+            self._add_smo(owner, smo, np.asarray(initial, dtype=np.float64).reshape(-1, 3))
+
+        parts = {key: np.concatenate(values) for key, values in self._parts.items()}
+        del self._parts
+
+        count = self._starts[-1]
+        self.positions = parts["positions"]
+        self.velocities = np.zeros((count, 3))
+        self.targets = self.positions.copy()
+        self.attached = parts["attached"]
+        self.inverse_mass = np.where(self.attached, 0.0, 1.0)
+        self.radius = parts["radius"]
+        self.gravity = parts["gravity"]
+        self.viscous_drag = parts["viscousDrag"]
+        self.aerodynamic_drag = parts["aerodynamicDrag"]
+        self.friction = parts["friction"]
+        self.friction_extra_radius = parts["frictionExtraRadius"]
+        self.jiggle_stiffness = parts["jiggleStiffness"]
+
+        self.spring_a = parts["springA"]
+        self.spring_b = parts["springB"]
+        self.spring_owner = parts["springOwner"]
+        self.spring_rest = np.linalg.norm(self.positions[self.spring_b] - self.positions[self.spring_a], axis=1)
+        self.spring_stiffness = parts["springStiffness"]
+        self.spring_iterations = parts["springIterations"]
+        self.spring_max_length = parts["springMaxLength"]
+        self.iterations = int(self.spring_iterations.max(initial=1))
+
+        self._spheres = (parts["sphereParticle"], parts["sphereCenter"], parts["sphereRadius"])
+        self._segments = (parts["segmentParticle"], parts["segmentA"], parts["segmentB"], parts["segmentRadius"],
+                          parts["segmentCapped"])
+        self._planes = (parts["planeParticle"], parts["planeOrigin"], parts["planeNormal"])
+        self._limits = {kind: tuple(parts[f"{kind}{field}"] for field in fields) for kind, fields in (
+            ("sphereLimit", ("Particle", "Anchor", "Rotation", "Radius")),
+            ("boxLimit", ("Particle", "Anchor", "Rotation", "HalfRange")),
+            ("cylinderLimit", ("Particle", "Anchor", "Rotation", "Direction", "Length", "Radius")),
+        )}
+
+    def _add(self, **parts):
+        for key, value in parts.items():
+            self._parts.setdefault(key, []).append(value)
+
+    def _add_smo(self, owner, smo, initial):
+        graph = smo_graph(smo)
+        count = graph.particle_count
+        if len(initial) != count:
+            raise ValueError(f"SMO {owner} has {count} particles, got {len(initial)} initial positions")
+
+        start = self._starts[-1]
+        self._starts.append(start + count)
+        particles = np.arange(start, start + count)
+        params = smo["simulationParameters"]
+        radius, attached = _particle_fields(smo["particles"], count)
+        jiggle = params["jiggleStiffness"] if params["objectType"] == ESecondaryMotionObjectType.Jiggle else 0.0
+
+        self._add(
+            positions=initial,
+            attached=attached,
+            radius=radius,
+            gravity=np.tile(np.asarray(params["gravity"], dtype=np.float64), (count, 1)),
+            viscousDrag=np.full(count, params["viscousDrag"]),
+            aerodynamicDrag=np.full(count, params["aerodynamicDrag"]),
+            friction=np.full(count, params["frictionCoefficient"]),
+            frictionExtraRadius=np.full(count, params["frictionExtraRadius"]),
+            jiggleStiffness=np.full(count, jiggle),
+        )
+
+        # per iteration stiffness so numIterations passes add up to the configured stiffness
+        iterations = max(int(params["numIterations"]), 1)
+        stiffness = np.clip(_spring_stiffness(params)[graph.spring_type_values], 0.0, 1.0)
+        spring_count = len(graph.spring_pairs)
+        self._add(
+            springA=graph.spring_pairs[:, 0] + start,
+            springB=graph.spring_pairs[:, 1] + start,
+            springOwner=np.full(spring_count, owner),
+            springStiffness=1.0 - (1.0 - stiffness) ** (1.0 / iterations),
+            springIterations=np.full(spring_count, iterations),
+            springMaxLength=np.full(spring_count, bool(params["useMaxLengthConstraints"])),
+        )
+
+        self._add_collisions(smo["collisionPrimitiveCollectionDescription"], particles)
+        self._add_limits(smo["limitCollectionDescription"], initial, start)
+
+    def _primitive_matrix(self, primitive):
+        matrix = np.asarray(primitive["primitiveToBone"][0], dtype=np.float64).reshape(4, 4)
+        bone = self._bone_world.get(primitive["primitive"]["value"])
+        return matrix if bone is None else matrix @ np.asarray(bone, dtype=np.float64).reshape(4, 4)
+
+    def _add_collisions(self, collisions, particles):
+        # every primitive collides with every particle of its own SMO
+        def pairs(count):
+            return np.tile(particles, count), np.repeat(np.arange(count), len(particles))
+
+        centers = np.array([self._primitive_matrix(s)[3, :3] for s in collisions["spheres"]]).reshape(-1, 3)
+        particle, primitive = pairs(len(centers))
+        radius = np.array([s["radius"] for s in collisions["spheres"]], dtype=np.float64)
+        self._add(sphereParticle=particle, sphereCenter=centers[primitive], sphereRadius=radius[primitive])
+
+        segments = [(s, False) for s in collisions["cylinders"]] + [(s, True) for s in collisions["capsules"]]
+        a, b = [], []
+        for segment, _ in segments:
+            matrix = self._primitive_matrix(segment)
+            a.append(np.asarray(segment["localPointA"]) @ matrix[:3, :3] + matrix[3, :3])
+            b.append(np.asarray(segment["localPointB"]) @ matrix[:3, :3] + matrix[3, :3])
+        a = np.array(a, dtype=np.float64).reshape(-1, 3)
+        b = np.array(b, dtype=np.float64).reshape(-1, 3)
+        radius = np.array([s["radius"] for s, _ in segments], dtype=np.float64)
+        capped = np.array([capsule for _, capsule in segments], dtype=bool)
+        particle, primitive = pairs(len(segments))
+        self._add(segmentParticle=particle, segmentA=a[primitive], segmentB=b[primitive],
+                  segmentRadius=radius[primitive], segmentCapped=capped[primitive])
+
+        origins, normals = [], []
+        for plane in collisions["planes"]:
+            matrix = self._primitive_matrix(plane)
+            origins.append(np.asarray(plane["localOrigin"]) @ matrix[:3, :3] + matrix[3, :3])
+            normal = np.asarray(plane["localNormal"]) @ matrix[:3, :3]
+            normals.append(normal / max(np.linalg.norm(normal), EPSILON))
+        origins = np.array(origins, dtype=np.float64).reshape(-1, 3)
+        normals = np.array(normals, dtype=np.float64).reshape(-1, 3)
+        particle, primitive = pairs(len(origins))
+        self._add(planeParticle=particle, planeOrigin=origins[primitive], planeNormal=normals[primitive])
+
+    def _limit_frame(self, limit, initial):
+        bone = self._bone_world.get(limit["primitive"]["value"])
+        if bone is None:
+            return initial[limit["particleIndex"]] + limit["offset"], np.eye(3)
+        origin, rotation = _frame(np.asarray(bone, dtype=np.float64).reshape(4, 4))
+        return np.asarray(limit["offset"]) @ rotation + origin, rotation
+
+    def _add_limits(self, limits, initial, start):
+        for kind, fields in (("sphereLimit", ("radius",)), ("boxLimit", ("halfRange",)),
+                             ("cylinderLimit", ("localDirection", "length", "radius"))):
+            entries = limits[kind + "s"]
+            frames = [self._limit_frame(limit, initial) for limit in entries]
+            parts = {
+                kind + "Particle": np.array([limit["particleIndex"] for limit in entries], dtype=np.int64) + start,
+                kind + "Anchor": np.array([f[0] for f in frames], dtype=np.float64).reshape(-1, 3),
+                kind + "Rotation": np.array([f[1] for f in frames], dtype=np.float64).reshape(-1, 3, 3),
+            }
+            for field in fields:
+                values = np.array([limit[field] for limit in entries], dtype=np.float64)
+                key = kind + {"localDirection": "Direction"}.get(field, field[0].upper() + field[1:])
+                parts[key] = values.reshape(-1, 3) if field in ("halfRange", "localDirection") else values
+            self._add(**parts)
+
+    def _solve_springs(self, p, iteration):
+        active = self.spring_iterations > iteration
+        a, b = self.spring_a[active], self.spring_b[active]
+        delta = p[b] - p[a]
+        length = np.linalg.norm(delta, axis=1)
+        rest = self.spring_rest[active]
+
+        # stretched max length springs are projected fully
+        stiffness = np.where(self.spring_max_length[active] & (length > rest), 1.0, self.spring_stiffness[active])
+        wa, wb = self.inverse_mass[a], self.inverse_mass[b]
+        scale = stiffness * (length - rest) / np.maximum(length, EPSILON) / np.maximum(wa + wb, EPSILON)
+        correction = delta * scale[:, None]
+
+        count = len(p)
+        moved = _scatter_add(a, correction * wa[:, None], count) - _scatter_add(b, correction * wb[:, None], count)
+        constraints = np.bincount(a, minlength=count) + np.bincount(b, minlength=count)
+        p += moved / np.maximum(constraints, 1)[:, None]
+
+    def _solve_collisions(self, p):
+        """Push particles out of the collision primitives, returns the particles close enough for friction"""
+        count = len(p)
+        touching = np.zeros(count, dtype=bool)
+
+        # spheres and cylinders/capsules resolve against their closest point
+        sphere_particle, centers, sphere_radius = self._spheres
+        segment_particle, a, b, segment_radius, capped = self._segments
+        ab = b - a
+        t = np.einsum("ij,ij->i", p[segment_particle] - a, ab) / np.maximum(np.einsum("ij,ij->i", ab, ab), EPSILON)
+        inside = capped | ((t >= 0.0) & (t <= 1.0))
+        closest_on_segment = a + np.clip(t, 0.0, 1.0)[:, None] * ab
+
+        particle = np.concatenate((sphere_particle, segment_particle[inside]))
+        closest = np.concatenate((centers, closest_on_segment[inside]))
+        reach = np.concatenate((sphere_radius, segment_radius[inside])) + self.radius[particle]
+
+        away = p[particle] - closest
+        distance = np.linalg.norm(away, axis=1)
+        normal = np.where(distance[:, None] > EPSILON, away / np.maximum(distance, EPSILON)[:, None], [0.0, 0.0, 1.0])
+        depth = reach - distance
+        touching[particle[depth > -self.friction_extra_radius[particle]]] = True
+        hit = depth > 0.0
+        push = _scatter_add(particle[hit], normal[hit] * depth[hit, None], count)
+
+        plane_particle, origins, normals = self._planes
+        distance = np.einsum("ij,ij->i", p[plane_particle] - origins, normals) - self.radius[plane_particle]
+        touching[plane_particle[distance < self.friction_extra_radius[plane_particle]]] = True
+        hit = distance < 0.0
+        push += _scatter_add(plane_particle[hit], -normals[hit] * distance[hit, None], count)
+
+        p += push
+        return touching
+
+    def _solve_limits(self, p):
+        # limits are solved in the local frame of their bone: local = world @ R.T, world = local @ R
+        particle, anchor, rotation, radius = self._limits["sphereLimit"]
+        local = np.einsum("ni,nji->nj", p[particle] - anchor, rotation)
+        length = np.linalg.norm(local, axis=1)
+        local *= (np.minimum(length, radius) / np.maximum(length, EPSILON))[:, None]
+        p[particle] = anchor + np.einsum("ni,nij->nj", local, rotation)
+
+        particle, anchor, rotation, half_range = self._limits["boxLimit"]
+        local = np.einsum("ni,nji->nj", p[particle] - anchor, rotation)
+        local = np.clip(local, -half_range, half_range)
+        p[particle] = anchor + np.einsum("ni,nij->nj", local, rotation)
+
+        particle, anchor, rotation, direction, length, radius = self._limits["cylinderLimit"]
+        local = np.einsum("ni,nji->nj", p[particle] - anchor, rotation)
+        axis = direction / np.maximum(np.linalg.norm(direction, axis=1, keepdims=True), EPSILON)
+        along = np.einsum("ij,ij->i", local, axis)
+        radial = local - along[:, None] * axis
+        radial_length = np.linalg.norm(radial, axis=1)
+        radial *= (np.minimum(radial_length, radius) / np.maximum(radial_length, EPSILON))[:, None]
+        local = np.clip(along, 0.0, length)[:, None] * axis + radial
+        p[particle] = anchor + np.einsum("ni,nij->nj", local, rotation)
+
+    def step(self, dt=1.0 / 30.0, targets=None):
+        """Advance every SMO by dt. targets (all particles, (N,3)) moves the attached and jiggle anchors"""
+        if targets is not None:
+            self.targets = np.asarray(targets, dtype=np.float64).reshape(-1, 3)
+
+        v = self.velocities + self.gravity * dt
+        speed = np.linalg.norm(v, axis=1)
+        v /= (1.0 + (self.viscous_drag + self.aerodynamic_drag * speed) * dt)[:, None]
+
+        previous = self.positions
+        p = previous + v * dt
+        p += (self.targets - p) * np.clip(self.jiggle_stiffness * dt, 0.0, 1.0)[:, None]
+        p[self.attached] = self.targets[self.attached]
+
+        touching = np.zeros(len(p), dtype=bool)
+        for iteration in range(self.iterations):
+            self._solve_springs(p, iteration)
+            self._solve_limits(p)
+            touching |= self._solve_collisions(p)
+            p[self.attached] = self.targets[self.attached]
+
+        v = (p - previous) / dt
+        # friction approximated as damping of the particles in contact
+        v[touching] *= np.clip(1.0 - self.friction[touching], 0.0, 1.0)[:, None]
+
+        self.positions = p
+        self.velocities = v
+        return p
+
+    def simulate(self, frames, dt=1.0 / 30.0):
+        """Positions of all particles after each of frames steps, (frames, N, 3)"""
+        return np.stack([self.step(dt).copy() for _ in range(frames)])
+
+    def split(self, values=None):
+        """Per particle values (the current positions by default) split back per SMO"""
+        values = self.positions if values is None else values
+        return np.split(values, self._starts[1:-1])
+
+    def spring_strain(self):
+        """Relative stretch of every spring, 0 at rest length"""
+        length = np.linalg.norm(self.positions[self.spring_b] - self.positions[self.spring_a], axis=1)
+        return length / np.maximum(self.spring_rest, EPSILON) - 1.0
+
+    def max_strain(self):
+        """Largest absolute spring strain of each SMO, for validating cloth setups in bulk"""
+        out = np.zeros(len(self.smos))
+        np.maximum.at(out, self.spring_owner, np.abs(self.spring_strain()))
+        return out
+
+
+def simulate(smo, positions, frames, dt=1.0 / 30.0, bone_world=None):
+    """Preview one SMO, returns its particle positions after each frame"""
+    return ClothSolver([smo], [positions], bone_world).simulate(frames, dt)
@@ -1,11 +1,19 @@
+import struct
+
+VEC2 = struct.Struct("<2f")
+VEC3 = struct.Struct("<3f")
+SPHERE = struct.Struct("<4f")
+
+
 def vec2(r):
-    return r.f32(), r.f32()
+    return r.record(VEC2)
 
 def vec3(r):
-    return r.f32(), r.f32(), r.f32()
+    return r.record(VEC3)
 
 def sphere(r):
+    v = r.record(SPHERE)
     return {
-        "center": vec3(r),
-        "radius": r.f32()
+        "center": v[:3],
+        "radius": v[3]
     }
\ No newline at end of file
@@ -0,0 +1,454 @@
+import argparse
+import json
+import os
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import MeshDecoder
+import SkeletonPose
+import Skinning
+from XBGBatch import find_xbg_files
+from XBGParser import XBGParser
+
+
+# glTF accessor component types
+BYTE = 5120
+UNSIGNED_BYTE = 5121
+SHORT = 5122
+UNSIGNED_SHORT = 5123
+FLOAT = 5126
+
+# bufferView targets
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+
+# primitive modes
+LINES = 1
+TRIANGLES = 4
+
+GLB_MAGIC = 0x46546C67
+GLB_JSON = 0x4E4F534A
+GLB_BIN = 0x004E4942
+
+# The game is Z-up like Blender, glTF is Y-up: -90 degrees about X on the root node
+Z_UP_TO_Y_UP = [-0.7071067811865476, 0.0, 0.0, 0.7071067811865476]
+
+
+def _component_type(dtype):
+    return {"i1": BYTE, "u1": UNSIGNED_BYTE, "i2": SHORT, "u2": UNSIGNED_SHORT, "f4": FLOAT}[np.dtype(dtype).str[1:]]
+
+
+def _joint_dtype(count):
+    return np.uint8 if count <= 256 else np.uint16
+
+
+def _compact_joints(table, indices, weights):
+    """
+    Skeleton bones the weighted vertex influences reference, sorted and unique, and the vertex bone indices
+    remapped onto them. Influences without weight or without a bone (see palette_bone_table) use joint 0.
+    """
+    # indices past the palette map to no bone, like in the table itself
+    table = np.append(table, -1)
+    bones = np.where(weights > 0.0, table[np.minimum(indices, len(table) - 1)], -1)
+    joints = np.unique(bones[bones >= 0])
+    if not len(joints):
+        joints = np.zeros(1, dtype=np.int64)
+    return joints, np.where(bones >= 0, np.searchsorted(joints, bones), 0)
+
+
+class _BinChunk:
+    """Pieces of the GLB binary chunk, kept as the buffers they came from and only joined when written"""
+
+    def __init__(self):
+        self.pieces = []
+        self.size = 0
+
+    def add(self, data, alignment=4):
+        padding = -self.size % alignment
+        if padding:
+            self.pieces.append(bytes(padding))
+            self.size += padding
+        data = memoryview(data).cast("B")
+        offset = self.size
+        self.pieces.append(data)
+        self.size += len(data)
+        return offset
+
+
+class GLTFExporter:
+    """
+    Convert a parsed .xbg to a binary glTF (.glb) without Blender.
+
+    Every LOD is a node under the root with one child node per scene mesh, and every draw range of the scene
+    mesh is one primitive of that node's mesh. Scene meshes on the same vertex stream share its accessors,
+    each primitive only has its own indices. The skeleton becomes a node hierarchy and every skinned vertex
+    stream a skin over the bones its vertices use, with the vertex bone indices remapped onto its joints.
+
+    Attributes the format stores the way glTF wants them are accessors with a byteStride straight over the
+    original vertex buffer, written to the file as slices of it: float positions, compressed positions as
+    KHR_mesh_quantization shorts (dequantized by the node transform, or by the inverse bind matrices of a
+    skin), and 8-bit weights. Normals, UVs, colors, joints, rigid and 6-bone skinning and the triangle indices
+    are decoded with MeshDecoder and written as tightly packed arrays.
+    """
+
+    def __init__(self, meta, name="xbg", lods=None, quantized=True):
+        self.meta = meta
+        self.name = name
+        self.lods = range(meta["geomParams"]["lodCount"]) if lods is None else lods
+        self.quantized = quantized
+
+        self.bin = _BinChunk()
+        self.gltf = {
+            "asset": {"version": "2.0", "generator": "XBG_Deserialize GLTFExporter"},
+            "scene": 0,
+            "scenes": [{"name": name, "nodes": [0]}],
+            "nodes": [{"name": name, "rotation": Z_UP_TO_Y_UP, "children": []}],
+            "meshes": [],
+            "materials": [],
+            "accessors": [],
+            "bufferViews": [],
+            "buffers": [],
+        }
+
+        geom_params = meta["geomParams"]
+        self.pos_min = float(geom_params["meshDecompression"]["positionMin"])
+        self.pos_range = float(geom_params["meshDecompression"]["positionRange"])
+
+        self._materials = {}
+        self._streams = {}
+        self._bone_nodes = []
+        self._skinner = None
+        skeletons = meta["skeletons"]["skeletons"]
+        if skeletons and len(skeletons[0]):
+            self._skinner = Skinning.Skinner(meta)
+
+    # ---- buffers and accessors ----
+
+    def _view(self, data, byte_stride=None, target=None):
+        view = {"buffer": 0, "byteOffset": self.bin.add(data), "byteLength": memoryview(data).nbytes}
+        if byte_stride is not None:
+            view["byteStride"] = byte_stride
+        if target is not None:
+            view["target"] = target
+        self.gltf["bufferViews"].append(view)
+        return len(self.gltf["bufferViews"]) - 1
+
+    def _accessor(self, view, component_type, accessor_type, count, byte_offset=0, normalized=False, bounds=None):
+        accessor = {"bufferView": view, "componentType": component_type, "count": int(count), "type": accessor_type}
+        if byte_offset:
+            accessor["byteOffset"] = byte_offset
+        if normalized:
+            accessor["normalized"] = True
+        if bounds is not None:
+            accessor["min"], accessor["max"] = bounds
+        self.gltf["accessors"].append(accessor)
+        return len(self.gltf["accessors"]) - 1
+
+    def _array_accessor(self, array, accessor_type, normalized=False, bounds=False, target=ARRAY_BUFFER):
+        """Accessor over a tightly packed copy of an array"""
+        array = np.ascontiguousarray(array)
+        if bounds:
+            bounds = (array.min(axis=0).tolist(), array.max(axis=0).tolist())
+        view = self._view(array, target=target)
+        return self._accessor(view, _component_type(array.dtype), accessor_type, len(array), 0, normalized, bounds or None)
+
+    def _raw_accessor(self, stream, field, accessor_type, components, normalized=False, bounds=False):
+        """Accessor with a byteStride over one element of the raw vertex stream"""
+        vertices = stream["raw"]
+        if stream["view"] is None:
+            stream["view"] = self._view(stream["bytes"], byte_stride=vertices.dtype.itemsize, target=ARRAY_BUFFER)
+        element_dtype, byte_offset = vertices.dtype.fields[field][:2]
+        if bounds:
+            values = vertices[field][:, :components]
+            bounds = (values.min(axis=0).tolist(), values.max(axis=0).tolist())
+        return self._accessor(stream["view"], _component_type(element_dtype.base), accessor_type, len(vertices),
+                              byte_offset, normalized, bounds or None)
+
+    # ---- skeleton and skins ----
+
+    def _add_skeleton(self, root):
+        skeleton = self.meta["skeletons"]["skeletons"][0]
+        positions, rotations, parents = SkeletonPose.skeleton_arrays(skeleton)
+        rotations = rotations / np.maximum(np.linalg.norm(rotations, axis=1, keepdims=True), 1e-12)
+        names = SkeletonPose.skeleton_names(skeleton)
+
+        first = len(self.gltf["nodes"])
+        self._bone_nodes = list(range(first, first + len(names)))
+        for bone, name in enumerate(names):
+            self.gltf["nodes"].append({
+                "name": name or f"Bone_{bone}",
+                "translation": positions[bone].tolist(),
+                "rotation": rotations[bone].tolist(),
+            })
+        for bone, parent in enumerate(parents.tolist()):
+            parent_node = root if parent < 0 else self.gltf["nodes"][self._bone_nodes[parent]]
+            parent_node.setdefault("children", []).append(self._bone_nodes[bone])
+
+    def _dequantize_matrix(self):
+        """Column-vector matrix taking KHR_mesh_quantization positions to the decoded ones"""
+        matrix = np.eye(4)
+        matrix[:3, :3] *= self.pos_range
+        matrix[:3, 3] = self.pos_min
+        return matrix
+
+    def _skin(self, stream):
+        """Skin of a vertex stream over the bones its vertices use, shared by the scene meshes on the stream"""
+        if stream["skin"] is None:
+            joints = stream["joints"]
+            inverse_bind = self._skinner.inverse_bind[joints]
+            if stream["dequantize"]:
+                inverse_bind = inverse_bind @ self._dequantize_matrix()
+
+            # glTF matrices are column-major
+            accessor = self._array_accessor(np.swapaxes(inverse_bind, 1, 2).astype(np.float32), "MAT4", target=None)
+            self.gltf.setdefault("skins", []).append({
+                "inverseBindMatrices": accessor,
+                "joints": [self._bone_nodes[joint] for joint in joints.tolist()],
+            })
+            stream["skin"] = len(self.gltf["skins"]) - 1
+        return stream["skin"]
+
+    # ---- meshes ----
+
+    def _material(self, mesh_index, lod_index):
+        mesh = self.meta["meshes"][lod_index][mesh_index]
+        name = f"Material_{mesh['materialIndex']}"
+        for slot in self.meta["materials"]["slots"]:
+            if slot["slotIndex"] == mesh["materialIndex"]:
+                name = slot["value"]
+                break
+        if name not in self._materials:
+            self.gltf["materials"].append({"name": name})
+            self._materials[name] = len(self.gltf["materials"]) - 1
+        return self._materials[name]
+
+    def _stream(self, lod_index, mesh_index):
+        """Attribute accessors of the vertex stream of a scene mesh, shared by the scene meshes using it"""
+        mesh = self.meta["meshes"][lod_index][mesh_index]
+        vertex_buffer = MeshDecoder.lod_buffer(self.meta, lod_index)["vertexBuffer"]
+        mr = mesh["mergedRanges"]
+        key = (min(lod_index, len(self.meta["buffers"]["gfxBuffer"]) - 1), mr["vertexBufferByteOffset"],
+               mr["vertexCount"], mesh["fvf"], mesh["vertexSize"], mesh["boneMapIndex"])
+        if key in self._streams:
+            return self._streams[key]
+
+        raw = MeshDecoder.vertex_view(vertex_buffer, mesh)
+        start = mr["vertexBufferByteOffset"]
+        stream = {
+            "raw": raw,
+            "bytes": memoryview(vertex_buffer).cast("B")[start:start + raw.nbytes],
+            "view": None,
+            "attributes": {},
+            "dequantize": False,
+            "joints": None,
+            "skin": None,
+        }
+        self._streams[key] = stream
+        vertices = MeshDecoder.decode_scene_mesh(self.meta, lod_index, mesh_index)
+        attributes = stream["attributes"]
+        fields = raw.dtype.names
+        # vertex attributes need a stride that is a multiple of 4 to be read in place
+        in_place = raw.dtype.itemsize % 4 == 0
+
+        if "point" in fields and in_place:
+            attributes["POSITION"] = self._raw_accessor(stream, "point", "VEC3", 3, bounds=True)
+        elif "pointComp" in fields and in_place and self.quantized:
+            attributes["POSITION"] = self._raw_accessor(stream, "pointComp", "VEC3", 3, bounds=True)
+            stream["dequantize"] = True
+        else:
+            attributes["POSITION"] = self._array_accessor(vertices["positions"].astype(np.float32), "VEC3", bounds=True)
+
+        if len(vertices["normal"]):
+            normals = vertices["normal"] / np.maximum(np.linalg.norm(vertices["normal"], axis=1, keepdims=True), 1e-12)
+            attributes["NORMAL"] = self._array_accessor(normals.astype(np.float32), "VEC3")
+
+        for uv_set, uvs in enumerate(vertices["uvSets"]):
+            # MeshDecoder flips V for Blender, glTF has its origin at the top
+            uvs = np.stack((uvs[:, 0], 1.0 - uvs[:, 1]), axis=1)
+            attributes[f"TEXCOORD_{uv_set}"] = self._array_accessor(uvs.astype(np.float32), "VEC2")
+
+        if "color" in fields:
+            # stored BGRA
+            attributes["COLOR_0"] = self._array_accessor(raw["color"][:, [2, 1, 0, 3]], "VEC4", normalized=True)
+
+        if len(vertices["normalModified"]):
+            attributes["_NORMAL_MODIFIED"] = self._array_accessor(vertices["normalModified"].astype(np.float32), "VEC3")
+
+        if self._skinner is not None and len(vertices["boneIndices"]):
+            # glTF joints must be unique, so the palette-local indices are remapped onto the bones in use
+            stream["joints"], local = _compact_joints(self._skinner.bone_table(mesh), vertices["boneIndices"],
+                                                      vertices["boneWeights"])
+            # rigid (bone in the position w) and 6-bone skinning are padded to sets of 4
+            influences = -(-local.shape[1] // 4) * 4
+            joints = np.zeros((len(raw), influences), dtype=_joint_dtype(len(stream["joints"])))
+            joints[:, :local.shape[1]] = local
+            if "skinWeights" in fields and "skinWeightsExtra" not in fields and in_place:
+                attributes["JOINTS_0"] = self._array_accessor(joints, "VEC4")
+                attributes["WEIGHTS_0"] = self._raw_accessor(stream, "skinWeights", "VEC4", 4, normalized=True)
+            else:
+                weights = np.zeros((len(raw), influences), dtype=np.float32)
+                weights[:, :vertices["boneWeights"].shape[1]] = vertices["boneWeights"]
+                for influence_set in range(influences // 4):
+                    columns = slice(influence_set * 4, influence_set * 4 + 4)
+                    attributes[f"JOINTS_{influence_set}"] = self._array_accessor(joints[:, columns], "VEC4")
+                    attributes[f"WEIGHTS_{influence_set}"] = self._array_accessor(weights[:, columns], "VEC4")
+        return stream
+
+    def _add_scene_mesh(self, lod_node, lod_index, mesh_index):
+        mesh = self.meta["meshes"][lod_index][mesh_index]
+        stream = self._stream(lod_index, mesh_index)
+        index_buffer = MeshDecoder.lod_buffer(self.meta, lod_index)["indexBuffer"]
+        material = self._material(mesh_index, lod_index)
+
+        primitives = []
+        for draw_range in mesh["ranges"]:
+            dc = draw_range["drawCall"]
+            indices, _ = MeshDecoder.decode_indices(index_buffer, dc["indexBufferStartIndex"] * 2, dc["indexCount"],
+                                                    mesh["primitiveType"])
+            if not len(indices):
+                continue
+            primitives.append({
+                "attributes": dict(stream["attributes"]),
+                "indices": self._array_accessor(indices.astype(np.uint16).ravel(), "SCALAR", target=ELEMENT_ARRAY_BUFFER),
+                "material": material,
+                "mode": LINES if indices.shape[1] == 2 else TRIANGLES,
+                "extras": {"name": draw_range["name"]["value"]},
+            })
+        if not primitives:
+            return
+
+        self.gltf["meshes"].append({"name": f"LOD{lod_index}_Mesh{mesh_index}", "primitives": primitives})
+        node = {"name": f"LOD{lod_index}_Mesh{mesh_index}", "mesh": len(self.gltf["meshes"]) - 1}
+        skinned = "JOINTS_0" in stream["attributes"]
+        if skinned:
+            node["skin"] = self._skin(stream)
+        elif stream["dequantize"]:
+            node["scale"] = [self.pos_range] * 3
+            node["translation"] = [self.pos_min] * 3
+        self.gltf["nodes"].append(node)
+        lod_node.setdefault("children", []).append(len(self.gltf["nodes"]) - 1)
+
+    # ---- output ----
+
+    def build(self):
+        """Fill in the glTF document and the binary chunk, returns the document"""
+        root = self.gltf["nodes"][0]
+        if self._skinner is not None:
+            self._add_skeleton(root)
+
+        lod_distances = self.meta["geomParams"]["lodDistances"]
+        for lod_index in self.lods:
+            lod_node = {"name": f"LOD{lod_index}"}
+            if lod_index < len(lod_distances):
+                lod_node["extras"] = {"lodDistance": lod_distances[lod_index]}
+            self.gltf["nodes"].append(lod_node)
+            root["children"].append(len(self.gltf["nodes"]) - 1)
+            for mesh_index in range(len(self.meta["meshes"][lod_index])):
+                self._add_scene_mesh(lod_node, lod_index, mesh_index)
+
+        if any(stream["dequantize"] for stream in self._streams.values()):
+            self.gltf["extensionsUsed"] = ["KHR_mesh_quantization"]
+            self.gltf["extensionsRequired"] = ["KHR_mesh_quantization"]
+        self.gltf["buffers"] = [{"byteLength": self.bin.size}]
+        # glTF doesn't allow empty top-level arrays
+        for key in [key for key, value in self.gltf.items() if isinstance(value, list) and not value]:
+            del self.gltf[key]
+        return self.gltf
+
+    def write(self, path):
+        """Build and write the .glb, the binary chunk is written piece by piece from the source buffers"""
+        gltf = self.build()
+        json_chunk = json.dumps(gltf, separators=(",", ":")).encode("utf-8")
+        json_chunk += b" " * (-len(json_chunk) % 4)
+        bin_padding = -self.bin.size % 4
+        total = 12 + 8 + len(json_chunk) + 8 + self.bin.size + bin_padding
+
+        with open(path, "wb") as f:
+            f.write(struct.pack("<III", GLB_MAGIC, 2, total))
+            f.write(struct.pack("<II", len(json_chunk), GLB_JSON))
+            f.write(json_chunk)
+            f.write(struct.pack("<II", self.bin.size + bin_padding, GLB_BIN))
+            for piece in self.bin.pieces:
+                f.write(piece)
+            f.write(bytes(bin_padding))
+        return path
+
+
+def export_glb(xbg_path, glb_path, lods=None, quantized=True):
+    """Parse an .xbg and write it as .glb"""
+    name = os.path.splitext(os.path.basename(xbg_path))[0]
+    # the binary chunk is written straight from the mapped buffers, the file is unmapped after
+    with XBGParser(xbg_path) as parser:
+        return GLTFExporter(parser.parse(), name, lods, quantized).write(glb_path)
+
+
+def output_path(path, root, output_dir):
+    """.glb path of an .xbg, mirroring its place below root inside output_dir"""
+    relative = os.path.relpath(path, root) if root and os.path.isdir(root) else os.path.basename(path)
+    return os.path.join(output_dir, os.path.splitext(relative)[0] + ".glb")
+
+
+def _export_chunk(jobs, quantized=True):
+    results = []
+    for path, glb_path in jobs:
+        try:
+            os.makedirs(os.path.dirname(glb_path) or ".", exist_ok=True)
+            export_glb(path, glb_path, quantized=quantized)
+            results.append((path, glb_path, None))
+        except Exception as e:
+            results.append((path, None, f"{type(e).__name__}: {e}"))
+    return results
+
+
+def export_files(paths, output_dir, root=None, workers=None, chunk_size=16, quantized=True):
+    """
+    Export files over a process pool, yielding (path, glb path, error) as chunks finish.
+    A file that fails to export yields its error message instead of aborting the batch.
+    """
+    jobs = [(path, output_path(path, root, output_dir)) for path in paths]
+    chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+
+    if workers == 1:
+        for chunk in chunks:
+            yield from _export_chunk(chunk, quantized)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_export_chunk, chunk, quantized) for chunk in chunks]
+        for future in as_completed(futures):
+            yield from future.result()
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Convert every .xbg below a directory (or matching a glob) to .glb in parallel")
+    arg_parser.add_argument("path", help="unpacked game directory or glob, e.g. windy_city_unpack/graphics")
+    arg_parser.add_argument("output", help="output directory, the directory layout below path is kept")
+    arg_parser.add_argument("--pattern", default="**/*.xbg", help="file pattern used when path is a directory")
+    arg_parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    arg_parser.add_argument("--chunk-size", type=int, default=16, help="files per work unit")
+    arg_parser.add_argument("--no-quantization", action="store_true",
+                            help="write float positions instead of KHR_mesh_quantization shorts")
+    args = arg_parser.parse_args(argv)
+
+    paths = find_xbg_files(args.path, args.pattern)
+    print(f"Exporting {len(paths)} files", file=sys.stderr)
+
+    errors = []
+    results = export_files(paths, args.output, args.path, args.workers, args.chunk_size, not args.no_quantization)
+    for done, (path, glb_path, error) in enumerate(results, 1):
+        if error:
+            errors.append((path, error))
+        if done % 100 == 0:
+            print(f"{done}/{len(paths)}", file=sys.stderr)
+
+    for path, error in errors:
+        print(f"Failed: {path}: {error}", file=sys.stderr)
+    print(f"Exported {len(paths) - len(errors)} files, {len(errors)} failed", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
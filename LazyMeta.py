@@ -0,0 +1,77 @@
+from collections.abc import Mapping, Sequence
+
+
+class LazyMeta(Mapping):
+    """
+    Parsed XBG metadata whose sections are decoded the first time they are accessed.
+    Behaves like the dict returned by XBGParser.parse(); dict(meta) decodes everything.
+    """
+
+    def __init__(self, order, values, loaders):
+        self._order = order
+        self._values = values
+        self._loaders = loaders
+
+    def __getitem__(self, key):
+        if key not in self._values:
+            if key not in self._loaders:
+                raise KeyError(key)
+            self._values[key] = self._loaders.pop(key)()
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._order)
+
+    def __len__(self):
+        return len(self._order)
+
+    def __contains__(self, key):
+        return key in self._values or key in self._loaders
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            self._order.append(key)
+        self._loaders.pop(key, None)
+        self._values[key] = value
+
+    def is_loaded(self, key):
+        return key in self._values
+
+    def __repr__(self):
+        sections = ", ".join(f"{key!r}: {'...' if key in self._loaders else 'loaded'}" for key in self._order)
+        return f"LazyMeta({{{sections}}})"
+
+
+class MipBufferList(Sequence):
+    """
+    gfxBuffer list of a file with an .xbgmip companion.
+    The first mip_count entries live in the .xbgmip and are loaded one at a time on first access,
+    the rest are the buffers stored in the .xbg itself.
+    """
+
+    def __init__(self, buffers, mip_count, load_mip_buffer):
+        self._buffers = buffers
+        self._mip_buffers = [None] * mip_count
+        self._load_mip_buffer = load_mip_buffer
+
+    def __len__(self):
+        return len(self._mip_buffers) + len(self._buffers)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("gfxBuffer index out of range")
+
+        if index >= len(self._mip_buffers):
+            return self._buffers[index - len(self._mip_buffers)]
+
+        if self._mip_buffers[index] is None:
+            self._mip_buffers[index] = self._load_mip_buffer(index)
+        return self._mip_buffers[index]
+
+    def is_loaded(self, index):
+        return index >= len(self._mip_buffers) or self._mip_buffers[index] is not None
@@ -0,0 +1,308 @@
+import bisect
+import hashlib
+
+import numpy as np
+
+
+# Vertex stream elements in the order they appear inside a vertex, see MeshFVF in xbg_new.bt.
+# Flags without an entry here (UV, PackedFirstUV, UVComp3, Normal) are not emitted by WD1.
+VERTEX_ELEMENTS = (
+    ("Point", "point", "<f4", 4),
+    ("PointComp", "pointComp", "<i2", 4),
+    ("UVComp1", "uv0", "<i2", 2),
+    ("UVComp2", "uv1", "<i2", 2),
+    ("Skin", "skinWeights", "u1", 4),
+    ("Skin", "skinIndices", "u1", 4),
+    ("SkinExtra", "skinWeightsExtra", "u1", 2),
+    ("SkinExtra", "skinIndicesExtra", "u1", 2),
+    ("NormalComp", "normal", "u1", 4),
+    ("Color", "color", "u1", 4),
+    ("TangentComp", "tangent", "u1", 4),
+    ("BinormalComp", "binormal", "u1", 4),
+    ("NormalModifiedComp", "normalModified", "u1", 4),
+)
+
+
+def vertex_dtype(mesh):
+    """Build the structured dtype of one vertex from the scene mesh FVF flags"""
+    names, formats, offsets = [], [], []
+    offset = 0
+    for flag, name, fmt, count in VERTEX_ELEMENTS:
+        if not mesh[flag]:
+            continue
+        # SkinExtra only extends a Skin vertex
+        if flag == "SkinExtra" and not mesh["Skin"]:
+            continue
+        names.append(name)
+        formats.append((fmt, (count,)))
+        offsets.append(offset)
+        offset += np.dtype(fmt).itemsize * count
+
+    if offset > mesh["vertexSize"]:
+        raise ValueError(f"FVF {mesh['fvf']:#06x} needs {offset} bytes, vertex size is {mesh['vertexSize']}")
+
+    return np.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": mesh["vertexSize"]})
+
+
+def vertex_view(vertex_buffer, mesh):
+    """Zero-copy structured view over the vertices of a scene mesh"""
+    return np.frombuffer(
+        vertex_buffer,
+        dtype=vertex_dtype(mesh),
+        count=mesh["mergedRanges"]["vertexCount"],
+        offset=mesh["mergedRanges"]["vertexBufferByteOffset"],
+    )
+
+
+def _unpack_unorm(packed):
+    return packed.astype(np.float64) / 255.0
+
+
+def _unpack_direction(packed):
+    # R8G8B8A8_UNORM stored as BGR, expand to [-1, 1] and renormalize
+    n = _unpack_unorm(packed[:, :3]) * 2.0 - 1.0
+    n0, n1, n2 = n[:, 0], n[:, 1], n[:, 2]
+    normalizer = np.sqrt(n0 * n0 + n1 * n1 + n2 * n2)
+    return np.stack((n2 / normalizer, n1 / normalizer, n0 / normalizer), axis=1)
+
+
+def _decode_uv(packed, uv_decomp_xy, uv_decomp_zw):
+    # UV needs wrap address mode, V is flipped for blender
+    u = packed[:, 0].astype(np.float64)
+    v = -packed[:, 1].astype(np.float64)
+    return np.stack((np.mod(u * uv_decomp_zw + uv_decomp_xy, 1.0),
+                     np.mod(v * uv_decomp_zw + uv_decomp_xy, 1.0)), axis=1)
+
+
+def decode_vertices(vertex_buffer, mesh, pos_min, pos_range, uv_decomp_xy, uv_decomp_zw):
+    """
+    Decode the whole vertex stream of a scene mesh as arrays.
+    Values are float64 and match the per-vertex reader in blender.py bit for bit.
+    """
+    vertices = vertex_view(vertex_buffer, mesh)
+    count = len(vertices)
+    fields = vertices.dtype.names
+
+    out = {
+        "positions": np.empty((0, 3)),
+        "uvSets": [],
+        "uvSetNames": [],
+        "boneIndices": np.empty((0, 4), dtype=np.int64),
+        "boneWeights": np.empty((0, 4)),
+        "normal": np.empty((0, 3)),
+        "normalModified": np.empty((0, 3)),
+        "color": np.empty((0, 4)),
+        "tangent": np.empty((0, 4)),
+        "binormal": np.empty((0, 4)),
+    }
+
+    # w of the position carries the rigid skinning bone
+    w = None
+    if "point" in fields:
+        point = vertices["point"]
+        out["positions"] = point[:, :3].astype(np.float64)
+        w = point[:, 3]
+    if "pointComp" in fields:
+        point = vertices["pointComp"]
+        out["positions"] = point[:, :3].astype(np.float64) * pos_range + pos_min
+        w = point[:, 3]
+
+    for name in ("uv0", "uv1"):
+        if name in fields:
+            out["uvSets"].append(_decode_uv(vertices[name], uv_decomp_xy, uv_decomp_zw))
+            out["uvSetNames"].append(name)
+
+    if "skinWeights" in fields:
+        weights = vertices["skinWeights"]
+        indices = vertices["skinIndices"]
+        if "skinWeightsExtra" in fields:
+            weights = np.concatenate((weights, vertices["skinWeightsExtra"]), axis=1)
+            indices = np.concatenate((indices, vertices["skinIndicesExtra"]), axis=1)
+        out["boneWeights"] = _unpack_unorm(weights)
+        out["boneIndices"] = indices.astype(np.int64)
+    elif mesh["SkinRigid"]:
+        if w is None:
+            raise ValueError("SkinRigid vertices need a position w component")
+        # BlendWeight is float4(1, 0, 0, 0), BlendIndex comes from the position w
+        bones = np.zeros((count, 4), dtype=np.int64)
+        if mesh["BinormalComp"]:
+            bones[:, 0] = np.floor(w / 256.0)
+        else:
+            bones[:, 0] = w
+        weights = np.zeros((count, 4))
+        weights[:, 0] = 1.0
+        out["boneIndices"] = bones
+        out["boneWeights"] = weights
+
+    if "normal" in fields:
+        out["normal"] = _unpack_direction(vertices["normal"])
+
+    if "color" in fields:
+        # BGRA
+        out["color"] = _unpack_unorm(vertices["color"][:, [2, 1, 0, 3]])
+
+    # not used for blender, but alpha is used for some stuff
+    for name in ("tangent", "binormal"):
+        if name in fields:
+            packed = vertices[name]
+            out[name] = np.concatenate((_unpack_direction(packed), _unpack_unorm(packed[:, 3:])), axis=1)
+
+    if "normalModified" in fields:
+        out["normalModified"] = _unpack_direction(vertices["normalModified"])
+
+    return out
+
+
+def lod_buffer(meta, lod_index):
+    """gfxBuffer holding the vertices and indices of a LOD, the last one is shared by the remaining LODs"""
+    buffers = meta["buffers"]["gfxBuffer"]
+    return buffers[min(lod_index, len(buffers) - 1)]
+
+
+def lod_for_distance(geom_params, distance, low_end=False):
+    """
+    LOD to show at a camera distance, None past killDistance (a killDistance <= 0 never culls).
+    LOD i is used up to lodDistances[i], the last LOD also beyond its distance. With low_end the LODs
+    before firstLowEndLOD are skipped and lowEndDistances apply to the remaining ones.
+    """
+    kill_distance = geom_params["killDistance"]
+    if kill_distance > 0 and distance > kill_distance:
+        return None
+
+    lod_count = geom_params["lodCount"]
+    first, distances = 0, geom_params["lodDistances"]
+    if low_end and geom_params["firstLowEndLOD"] < lod_count:
+        first, distances = geom_params["firstLowEndLOD"], geom_params["lowEndDistances"]
+    if not lod_count or not len(distances):
+        return None
+    return first + min(bisect.bisect_left(distances, distance), len(distances) - 1)
+
+
+def decode_scene_mesh(meta, lod_index, mesh_index):
+    """decode_vertices of one scene mesh, with the decompression parameters of the file"""
+    geom_params = meta["geomParams"]
+    return decode_vertices(
+        lod_buffer(meta, lod_index)["vertexBuffer"],
+        meta["meshes"][lod_index][mesh_index],
+        geom_params["meshDecompression"]["positionMin"],
+        geom_params["meshDecompression"]["positionRange"],
+        geom_params["uvDecompression"]["UVDecompressionXY"],
+        geom_params["uvDecompression"]["UVDecompressionZW"],
+    )
+
+
+# Strip and fan primitives use 0xFFFF to restart the primitive
+RESTART_INDEX = 0xFFFF
+
+
+def _strip_windows(indices):
+    """First index of every triangle window of a strip/fan and the first index of the primitive it belongs to"""
+    count = len(indices)
+    if count < 3:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+
+    positions = np.arange(count)
+    restart = indices == RESTART_INDEX
+    primitive_start = np.maximum.accumulate(np.where(restart, positions + 1, 0))
+
+    last = positions[2:]
+    first = last - 2
+    valid = (first >= primitive_start[last]) & ~restart[last]
+    first = first[valid]
+    return first, primitive_start[first]
+
+
+def _drop_degenerate(triangles):
+    a, b, c = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+    return triangles[(a != b) & (b != c) & (a != c)]
+
+
+def decode_indices(index_buffer, idx_offset, idx_count, primitive_type):
+    """
+    Decode a range of the index buffer.
+    Triangle primitives come back as (N,3) triangles, line primitives as (N,2) segments,
+    together with the sorted array of referenced vertices.
+    """
+    indices = np.frombuffer(index_buffer, dtype="<u2", count=idx_count, offset=idx_offset).astype(np.int32)
+    name = primitive_type.name
+
+    if name == "TriangleList":
+        out = indices[:idx_count // 3 * 3].reshape(-1, 3)[:, ::-1]
+
+    elif name == "TriangleStrip":
+        first, start = _strip_windows(indices)
+        odd = (first - start) % 2 == 1
+        a = indices[first]
+        b = indices[first + 1]
+        c = indices[first + 2]
+        # every other triangle of a strip is flipped to keep the winding
+        out = np.stack((np.where(odd, b, a), np.where(odd, a, b), c), axis=1)
+        out = _drop_degenerate(out)
+
+    elif name == "TriangleFan":
+        first, start = _strip_windows(indices)
+        # every triangle shares the first vertex of its fan, wound like the lists
+        out = np.stack((indices[first + 2], indices[first + 1], indices[start]), axis=1)
+        out = _drop_degenerate(out)
+
+    elif name == "QuadList":
+        quads = indices[:idx_count // 4 * 4].reshape(-1, 4)
+        a, b, c, d = quads[:, 0], quads[:, 1], quads[:, 2], quads[:, 3]
+        out = np.stack((np.stack((c, b, a), axis=1), np.stack((d, c, a), axis=1)), axis=1).reshape(-1, 3)
+
+    elif name == "RectList":
+        # the fourth corner of a rect is derived by the GPU and has no index, keep the indexed half
+        out = indices[:idx_count // 3 * 3].reshape(-1, 3)[:, ::-1]
+
+    elif name == "LineList":
+        out = indices[:idx_count // 2 * 2].reshape(-1, 2)
+
+    elif name == "LineStrip":
+        segments = np.stack((indices[:-1], indices[1:]), axis=1)
+        out = segments[(segments != RESTART_INDEX).all(axis=1)]
+
+    else:
+        raise ValueError(f"Unsupported primitive type: {primitive_type}")
+
+    out = np.ascontiguousarray(out)
+    return out, np.unique(out)
+
+
+def compact_vertices(vertices, indices, used=None):
+    """
+    Restrict decoded vertices (decode_vertices) to the ones an index range references.
+    Returns the sliced arrays and the indices remapped onto them; used is the sorted array of referenced
+    vertices decode_indices returns along with the indices, computed here when not given.
+    """
+    if used is None:
+        used = np.unique(indices)
+    remapped = np.searchsorted(used, indices).astype(indices.dtype)
+
+    out = {}
+    for name, value in vertices.items():
+        if name == "uvSets":
+            out[name] = [uv[used] for uv in value]
+        elif name == "uvSetNames" or not len(value):
+            out[name] = value
+        else:
+            out[name] = value[used]
+    return out, remapped
+
+
+def range_hash(vertices, indices, fvf, *extra):
+    """
+    Content hash of a compacted draw range (compact_vertices): its decoded vertex arrays, indices and FVF,
+    plus any extra strings the caller's copy of the geometry depends on. Equal hashes mean equal meshes.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(fvf).encode("utf-8"))
+    arrays = [indices] + [value for name, value in sorted(vertices.items()) if name not in ("uvSets", "uvSetNames")]
+    arrays += vertices["uvSets"]
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        h.update(f"{array.dtype.str}{array.shape}".encode("utf-8"))
+        h.update(array.tobytes())
+    for value in list(vertices["uvSetNames"]) + list(extra):
+        h.update(b"\0" + str(value).encode("utf-8"))
+    return h.hexdigest()
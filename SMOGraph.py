@@ -0,0 +1,122 @@
+from collections import namedtuple
+
+import numpy as np
+
+from XBGParser import ESecondaryMotionSpringType
+
+
+# Compressed sparse rows: the neighbours of row i are indices[indptr[i]:indptr[i + 1]]
+CSR = namedtuple("CSR", "indptr indices")
+
+
+def _table(rows, fields):
+    """(N, len(fields)) int64 table from an arrays=True table or a list of dicts/records"""
+    if isinstance(rows, np.ndarray):
+        return rows.astype(np.int64).reshape(-1, len(fields))
+    # springType is an Enum in the dict shape
+    values = [[getattr(row[field], "value", row[field]) for field in fields] for row in rows]
+    return np.array(values, dtype=np.int64).reshape(-1, len(fields))
+
+
+def build_csr(count, sources, targets):
+    """CSR over count rows with an entry per (source, target) pair, duplicates dropped and rows sorted"""
+    keys = np.unique(sources.astype(np.int64) * count + targets)
+    rows, cols = np.divmod(keys, count)
+    indptr = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=count), out=indptr[1:])
+    return CSR(indptr, cols)
+
+
+def connected_components(count, a, b):
+    """Number of components and the component label of every node, for the undirected edges a-b"""
+    labels = np.arange(count)
+    if len(a):
+        while True:
+            # hook both ends to the smaller label, then jump pointers until nothing changes
+            low = np.minimum(labels[a], labels[b])
+            hooked = labels.copy()
+            np.minimum.at(hooked, a, low)
+            np.minimum.at(hooked, b, low)
+            hooked = hooked[hooked]
+            if np.array_equal(hooked, labels):
+                break
+            labels = hooked
+
+    roots, labels = np.unique(labels, return_inverse=True)
+    return len(roots), labels
+
+
+class SMOGraph:
+    """
+    Particle graph of one secondary motion object.
+
+    Springs are undirected edges, queried over all springs or per ESecondaryMotionSpringType. Triangle
+    incidence maps every particle to the triangleDesc entries using it. The connectivity neighbour list is
+    exposed as parsed, its layout isn't known.
+    """
+
+    def __init__(self, smo):
+        springs = _table(smo["springs"]["spring"], ("index1", "index2", "springType"))
+        self.triangles = _table(smo["triangles"]["triangleDesc"], ("index1", "index2", "index3"))
+        self.connectivity = np.asarray(smo["connectivities"]["neighbor"], dtype=np.int64)
+
+        # out of range indices grow the graph rather than fail
+        self.particle_count = int(max(smo["particles"]["particleCount"],
+                                      springs[:, :2].max(initial=-1) + 1, self.triangles.max(initial=-1) + 1))
+
+        self.spring_pairs = springs[:, :2]
+        self.spring_type_values = springs[:, 2]
+        self._adjacency = {}
+        self._incidence = None
+
+    def _pairs(self, spring_type):
+        if spring_type is None:
+            return self.spring_pairs
+        return self.spring_pairs[self.spring_type_values == ESecondaryMotionSpringType(spring_type).value]
+
+    def adjacency(self, spring_type=None):
+        """Symmetric CSR over particles for all springs, or only the springs of one type"""
+        key = None if spring_type is None else ESecondaryMotionSpringType(spring_type)
+        if key not in self._adjacency:
+            pairs = self._pairs(key)
+            a, b = pairs[:, 0], pairs[:, 1]
+            self._adjacency[key] = build_csr(self.particle_count, np.concatenate((a, b)), np.concatenate((b, a)))
+        return self._adjacency[key]
+
+    def neighbors(self, particle, spring_type=None):
+        indptr, indices = self.adjacency(spring_type)
+        return indices[indptr[particle]:indptr[particle + 1]]
+
+    def degree(self, spring_type=None):
+        return np.diff(self.adjacency(spring_type).indptr)
+
+    def triangle_incidence(self):
+        """CSR from every particle to the triangles referencing it"""
+        if self._incidence is None:
+            triangles = np.repeat(np.arange(len(self.triangles)), 3)
+            self._incidence = build_csr(self.particle_count, self.triangles.reshape(-1), triangles)
+        return self._incidence
+
+    def particle_triangles(self, particle):
+        indptr, indices = self.triangle_incidence()
+        return indices[indptr[particle]:indptr[particle + 1]]
+
+    def connected_components(self, spring_type=None, triangles=False):
+        """(count, per particle label) over the springs, optionally joined by the triangle edges as well"""
+        pairs = self._pairs(spring_type)
+        if triangles:
+            t = self.triangles
+            pairs = np.concatenate((pairs, t[:, [0, 1]], t[:, [1, 2]]))
+        return connected_components(self.particle_count, pairs[:, 0], pairs[:, 1])
+
+
+def smo_graph(smo):
+    """SMOGraph of a parsed secondary motion object, built once and kept on it under "graph" """
+    graph = smo.get("graph")
+    if graph is None:
+        graph = smo["graph"] = SMOGraph(smo)
+    return graph
+
+
+def smo_graphs(meta):
+    return [smo_graph(smo) for smo in meta["secondaryMotionObjects"]["secondaryMotionObject"]]
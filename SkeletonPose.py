@@ -0,0 +1,130 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+
+# bind poses kept by skeleton_world_matrices, keyed on the skeleton contents
+BIND_POSE_CACHE_SIZE = 256
+_bind_poses = OrderedDict()
+
+
+def skeleton_arrays(skeleton):
+    """
+    positions (N,3), xyzw rotations (N,4) and parents (N,) of a parsed skeleton, as float64/int64 arrays.
+    Takes the node list of parse() (dicts or records) or the arrays=True table. Roots have parent -1.
+    """
+    if isinstance(skeleton, dict):
+        positions = np.asarray(skeleton["position"], dtype=np.float64).reshape(-1, 3)
+        rotations = np.asarray(skeleton["rotation"], dtype=np.float64).reshape(-1, 4)
+        parents = np.asarray(skeleton["parent"], dtype=np.int64)
+    else:
+        positions = np.array([node["position"] for node in skeleton], dtype=np.float64).reshape(-1, 3)
+        rotations = np.array([node["rotation"] for node in skeleton], dtype=np.float64).reshape(-1, 4)
+        parents = np.array([node["parent"] for node in skeleton], dtype=np.int64)
+
+    # 0xFFFF and anything else out of range is a root
+    parents = np.where((parents >= 0) & (parents < len(parents)), parents, -1)
+    return positions, rotations, parents
+
+
+def skeleton_names(skeleton):
+    """Bone names of a parsed skeleton, node list or arrays=True table"""
+    if isinstance(skeleton, dict):
+        return list(skeleton["name"])
+    return [node["name"] for node in skeleton]
+
+
+def skeleton_hash(skeleton):
+    """
+    Content hash of a skeleton: bone names, parents and local transforms, canonicalized so skeletons
+    that build the same armature hash the same (out of range parents are roots, q and -q are one rotation).
+    """
+    positions, rotations, parents = skeleton_arrays(skeleton)
+    # -0.0 and 0.0 are the same value but not the same bytes
+    positions = positions + 0.0
+    # q and -q: the first nonzero of w, x, y, z (xyzw stored) is made positive, w alone misses w == 0
+    wxyz = rotations[:, [3, 0, 1, 2]]
+    leading = wxyz[np.arange(len(wxyz)), np.argmax(wxyz != 0.0, axis=1)]
+    rotations = np.where(leading[:, None] < 0.0, -rotations, rotations) + 0.0
+
+    h = hashlib.blake2b(digest_size=16)
+    h.update("\0".join(str(name) for name in skeleton_names(skeleton)).encode("utf-8"))
+    for array in (parents, positions, rotations):
+        h.update(b"\0" + np.ascontiguousarray(array).tobytes())
+    return h.hexdigest()
+
+
+def quaternion_matrices(rotations):
+    """(...,3,3) rotation matrices of xyzw quaternions, same formula as mathutils.Quaternion.to_matrix"""
+    x, y, z, w = rotations[..., 0], rotations[..., 1], rotations[..., 2], rotations[..., 3]
+    xx, yy, zz = x * x, y * y, z * z
+    xy, xz, yz = x * y, x * z, y * z
+    wx, wy, wz = w * x, w * y, w * z
+    return np.stack((
+        np.stack((1.0 - 2.0 * (yy + zz), 2.0 * (xy - wz), 2.0 * (xz + wy)), axis=-1),
+        np.stack((2.0 * (xy + wz), 1.0 - 2.0 * (xx + zz), 2.0 * (yz - wx)), axis=-1),
+        np.stack((2.0 * (xz - wy), 2.0 * (yz + wx), 1.0 - 2.0 * (xx + yy)), axis=-1),
+    ), axis=-2)
+
+
+def local_matrices(positions, rotations):
+    """(...,N,4,4) column-vector local transforms, translation @ rotation"""
+    out = np.zeros(positions.shape[:-1] + (4, 4))
+    out[..., :3, :3] = quaternion_matrices(rotations)
+    out[..., :3, 3] = positions
+    out[..., 3, 3] = 1.0
+    return out
+
+
+def depth_levels(parents):
+    """Bone indices grouped by hierarchy depth, roots first. Bones in a parent cycle are treated as roots"""
+    count = len(parents)
+    depth = np.zeros(count, dtype=np.int64)
+    has_parent = parents >= 0
+    for _ in range(count):
+        new_depth = np.where(has_parent, depth[parents] + 1, 0)
+        if np.array_equal(new_depth, depth):
+            break
+        depth = new_depth
+    else:
+        # still growing after count passes: cut the cycles
+        cyclic = depth >= count
+        has_parent &= ~cyclic
+        depth = np.where(cyclic, 0, depth)
+
+    order = np.argsort(depth, kind="stable")
+    bounds = np.flatnonzero(np.diff(depth[order])) + 1
+    return np.split(order, bounds) if count else []
+
+
+def world_matrices(positions, rotations, parents):
+    """
+    (...,N,4,4) column-vector world transforms, every depth level composed in one batched matmul.
+    positions (...,N,3) and rotations (...,N,4) may carry leading axes to evaluate many poses at once.
+    """
+    local = local_matrices(np.asarray(positions, dtype=np.float64), np.asarray(rotations, dtype=np.float64))
+    world = local.copy()
+    # the first level holds the roots, every deeper bone has its parent one level up
+    for level in depth_levels(parents)[1:]:
+        world[..., level, :, :] = world[..., parents[level], :, :] @ local[..., level, :, :]
+    return world
+
+
+def skeleton_world_matrices(skeleton):
+    """
+    Bind pose world matrices of a parsed skeleton, cached on its contents so the same rig in many files
+    is only evaluated once. The returned array is shared, don't modify it.
+    """
+    positions, rotations, parents = skeleton_arrays(skeleton)
+    key = (positions.tobytes(), rotations.tobytes(), parents.tobytes())
+    world = _bind_poses.get(key)
+    if world is None:
+        world = world_matrices(positions, rotations, parents)
+        world.flags.writeable = False
+        _bind_poses[key] = world
+        if len(_bind_poses) > BIND_POSE_CACHE_SIZE:
+            _bind_poses.popitem(last=False)
+    else:
+        _bind_poses.move_to_end(key)
+    return world
@@ -0,0 +1,146 @@
+import numpy as np
+
+import MeshDecoder
+import SkeletonPose
+
+
+# boneMapIndex of scene meshes indexing the skeleton matrices directly
+NO_BONE_PALETTE = 0xFFFFFFFF
+
+
+def object_to_bone_matrices(meta):
+    """objectToBone as (N,4,4) column-vector matrices; the file stores D3D row-vector matrices"""
+    matrices = np.asarray(meta["skeletons"]["objectToBone"]["matrices"], dtype=np.float64).reshape(-1, 4, 4)
+    return np.swapaxes(matrices, 1, 2)
+
+
+def _matrix_indices(skeleton):
+    if isinstance(skeleton, dict):
+        return np.asarray(skeleton["matrixIndex"], dtype=np.int64)
+    return np.array([node["matrixIndex"] for node in skeleton], dtype=np.int64)
+
+
+def bone_of_matrix(skeleton):
+    """matrix index -> skeleton bone table, -1 for unused matrix indices; the last bone using one wins"""
+    matrix_index = _matrix_indices(skeleton)
+    table = np.full(matrix_index.max(initial=-1) + 1, -1, dtype=np.int64)
+    _, last = np.unique(matrix_index[::-1], return_index=True)
+    last = len(matrix_index) - 1 - last
+    table[matrix_index[last]] = last
+    return table
+
+
+def palette_bone_table(meta, mesh, bone_of_matrix):
+    """Skeleton bone of every vertex bone index of a scene mesh, -1 where it maps to no bone"""
+    if mesh["boneMapIndex"] == NO_BONE_PALETTE:
+        matrices = np.arange(len(bone_of_matrix))
+    else:
+        matrices = np.asarray(meta["bonePalettes"][mesh["boneMapIndex"]], dtype=np.int64)
+    valid = matrices < len(bone_of_matrix)
+    table = np.full(len(matrices), -1, dtype=np.int64)
+    table[valid] = bone_of_matrix[matrices[valid]]
+    return table
+
+
+class Skinner:
+    """
+    CPU linear blend skinning of the scene meshes of one parsed file.
+
+    Vertex bone indices go through the bone palette of the scene mesh (if any) to a matrix index, and from
+    there to the skeleton bone using it (palette_bone_table), resolved once per palette. Poses are
+    column-vector world matrices of the skeleton bones, (B,4,4) for one pose or (P,B,4,4) for P poses at
+    once, e.g. from SkeletonPose.world_matrices; by default the bind pose is used.
+    Inverse bind matrices come from objectToBone, or from the skeleton bind pose with bind_from_skeleton.
+    """
+
+    def __init__(self, meta, skeleton_index=0, bind_from_skeleton=False):
+        self.meta = meta
+        skeleton = meta["skeletons"]["skeletons"][skeleton_index]
+        self.bind_pose = SkeletonPose.skeleton_world_matrices(skeleton)
+        bone_count = len(self.bind_pose)
+
+        matrix_index = _matrix_indices(skeleton)
+        self.bone_of_matrix = bone_of_matrix(skeleton)
+
+        if bind_from_skeleton:
+            self.inverse_bind = np.linalg.inv(self.bind_pose)
+        else:
+            object_to_bone = object_to_bone_matrices(meta)
+            self.inverse_bind = np.tile(np.eye(4), (bone_count, 1, 1))
+            valid = matrix_index < len(object_to_bone)
+            self.inverse_bind[valid] = object_to_bone[matrix_index[valid]]
+
+        self._bone_tables = {}
+
+    def bone_table(self, mesh):
+        """palette_bone_table of a scene mesh, resolved once per palette"""
+        key = mesh["boneMapIndex"]
+        table = self._bone_tables.get(key)
+        if table is None:
+            table = self._bone_tables[key] = palette_bone_table(self.meta, mesh, self.bone_of_matrix)
+        return table
+
+    def _pose_batch(self, poses):
+        poses = self.bind_pose if poses is None else np.asarray(poses, dtype=np.float64)
+        return poses.reshape((-1,) + poses.shape[-3:])
+
+    def skin_matrices(self, mesh, poses=None):
+        """
+        (P,T+1,4,4) skinning matrix of every vertex bone index of a scene mesh, pose @ inverse bind.
+        The extra last entry is the identity, used by indices mapping to no bone.
+        """
+        poses = self._pose_batch(poses)
+        table = self.bone_table(mesh)
+
+        skin = np.broadcast_to(np.eye(4), (len(poses), len(table) + 1, 4, 4)).copy()
+        mapped = table >= 0
+        skin[:, :-1][:, mapped] = poses[:, table[mapped]] @ self.inverse_bind[table[mapped]]
+        return skin
+
+    def skin(self, mesh, vertices, poses=None):
+        """
+        Skin the decoded vertices (MeshDecoder.decode_vertices) of a scene mesh.
+        Returns positions and normals as (V,3) for a single pose or (P,V,3) for a batch of poses.
+        Handles 4 and 6 (SkinExtra) influences and SkinRigid; weight missing from 1 keeps the bind position.
+        """
+        single = poses is None or np.ndim(poses) == 3
+        positions = vertices["positions"]
+        normals = vertices["normal"] if len(vertices["normal"]) else None
+        indices = vertices["boneIndices"]
+        weights = vertices["boneWeights"]
+
+        if not len(indices):
+            # static mesh
+            count = len(self._pose_batch(poses))
+            out_positions = np.broadcast_to(positions, (count,) + positions.shape).copy()
+            out_normals = None if normals is None else np.broadcast_to(normals, (count,) + normals.shape).copy()
+        else:
+            skin = self.skin_matrices(mesh, poses)
+            identity = skin.shape[1] - 1
+            indices = np.where(indices < identity, indices, identity)
+
+            rest = 1.0 - weights.sum(axis=1)
+            out_positions = np.broadcast_to(positions * rest[:, None], (len(skin),) + positions.shape).copy()
+            out_normals = None if normals is None else np.broadcast_to(normals * rest[:, None], out_positions.shape).copy()
+
+            # only the influences used by some vertex, rigid meshes have a single one
+            for k in np.flatnonzero(weights.any(axis=0)):
+                matrices = skin[:, indices[:, k]]
+                weight = weights[:, k, None]
+                out_positions += weight * (np.einsum("pvij,vj->pvi", matrices[..., :3, :3], positions)
+                                           + matrices[..., :3, 3])
+                if normals is not None:
+                    out_normals += weight * np.einsum("pvij,vj->pvi", matrices[..., :3, :3], normals)
+
+            if out_normals is not None:
+                out_normals /= np.maximum(np.linalg.norm(out_normals, axis=-1, keepdims=True), 1e-12)
+
+        if single:
+            out_positions = out_positions[0]
+            out_normals = None if out_normals is None else out_normals[0]
+        return {"positions": out_positions, "normals": out_normals}
+
+    def skin_scene_mesh(self, lod_index, mesh_index, poses=None):
+        """Decode and skin one scene mesh of the file"""
+        mesh = self.meta["meshes"][lod_index][mesh_index]
+        return self.skin(mesh, MeshDecoder.decode_scene_mesh(self.meta, lod_index, mesh_index), poses)
@@ -0,0 +1,130 @@
+import argparse
+import glob
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from XBGCache import XBGCache
+from XBGParser import XBGParser
+
+
+def find_xbg_files(path, pattern="**/*.xbg"):
+    """All .xbg files below a directory, or the files matching a glob"""
+    if os.path.isdir(path):
+        path = os.path.join(path, pattern)
+    return sorted(glob.glob(path, recursive=True))
+
+
+def summarize(path, meta):
+    """Compact, picklable summary of a parsed file - no buffers or nested section dicts"""
+    lods = []
+    for lod_meshes in meta["meshes"]:
+        vertex_streams = {}
+        primitives = 0
+        ranges = 0
+        for scene_mesh in lod_meshes:
+            mr = scene_mesh["mergedRanges"]
+            vertex_streams[(mr["vertexBufferByteOffset"], mr["vertexCount"])] = mr["vertexCount"]
+            primitives += mr["primitiveCount"]
+            ranges += scene_mesh["numRanges"]
+        lods.append({
+            "meshes": len(lod_meshes),
+            "ranges": ranges,
+            "vertices": sum(vertex_streams.values()),
+            "primitives": primitives,
+            "fvf": sorted({scene_mesh["fvf"] for scene_mesh in lod_meshes}),
+            "primitiveTypes": sorted({scene_mesh["primitiveType"].name for scene_mesh in lod_meshes}),
+        })
+
+    skeletons = meta["skeletons"]["skeletons"]
+    return {
+        "path": path,
+        "version": (meta["header"]["majorVersion"], meta["header"]["minorVersion"]),
+        "lodCount": meta["geomParams"]["lodCount"],
+        "lodDistances": meta["geomParams"]["lodDistances"],
+        "killDistance": meta["geomParams"]["killDistance"],
+        "materials": [material["value"] for material in meta["materials"]["materials"]],
+        "skins": [skin["name"] for skin in meta["skins"]],
+        "boneCount": len(skeletons[0]) if skeletons else 0,
+        "secondaryMotionObjectCount": len(meta["secondaryMotionObjects"]["secondaryMotionObject"]),
+        "mipCount": meta["mipCount"],
+        "mipResourceFound": meta["mipResourceFound"],
+        "lods": lods,
+    }
+
+
+def parse_summary(path, cache=None):
+    # lazy: buffers and mips are never decoded for a summary
+    if cache:
+        with cache.open(path) as parser:
+            return summarize(path, parser.meta)
+    with XBGParser(path) as parser:
+        return summarize(path, parser.parse(lazy=True))
+
+
+def _parse_chunk(paths, cache_dir=None):
+    cache = XBGCache(cache_dir) if cache_dir else None
+    results = []
+    for path in paths:
+        try:
+            results.append((path, parse_summary(path, cache), None))
+        except Exception as e:
+            results.append((path, None, f"{type(e).__name__}: {e}"))
+    return results
+
+
+def parse_files(paths, workers=None, chunk_size=64, cache_dir=None):
+    """
+    Parse files over a process pool, yielding (path, summary, error) as chunks finish.
+    A file that fails to parse yields its error message instead of aborting the batch.
+    With cache_dir the workers go through an XBGCache in that directory.
+    """
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+
+    if workers == 1:
+        for chunk in chunks:
+            yield from _parse_chunk(chunk, cache_dir)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_parse_chunk, chunk, cache_dir) for chunk in chunks]
+        for future in as_completed(futures):
+            yield from future.result()
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Parse every .xbg below a directory (or matching a glob) in parallel")
+    arg_parser.add_argument("path", help="unpacked game directory or glob, e.g. windy_city_unpack/graphics")
+    arg_parser.add_argument("--pattern", default="**/*.xbg", help="file pattern used when path is a directory")
+    arg_parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    arg_parser.add_argument("--chunk-size", type=int, default=64, help="files per work unit")
+    arg_parser.add_argument("--cache", help="parse cache directory, unchanged files are not parsed again")
+    arg_parser.add_argument("--output", help="write one JSON summary per line to this file instead of stdout")
+    args = arg_parser.parse_args(argv)
+
+    paths = find_xbg_files(args.path, args.pattern)
+    print(f"Parsing {len(paths)} files", file=sys.stderr)
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    errors = []
+    try:
+        for done, (path, summary, error) in enumerate(parse_files(paths, args.workers, args.chunk_size, args.cache), 1):
+            if error:
+                errors.append((path, error))
+            else:
+                out.write(json.dumps(summary) + "\n")
+            if done % 1000 == 0:
+                print(f"{done}/{len(paths)}", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    for path, error in errors:
+        print(f"Failed: {path}: {error}", file=sys.stderr)
+    print(f"Parsed {len(paths) - len(errors)} files, {len(errors)} failed", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+import hashlib
+import os
+import pickle
+
+from XBGParser import XBGParser, FILE_BACKED_SECTIONS
+
+# bump whenever the parsed meta changes shape, older entries are then ignored
+CACHE_VERSION = 3
+CACHE_SUFFIX = ".xbgcache"
+
+
+class XBGCache:
+    """
+    Opt-in on-disk cache around XBGParser.parse.
+
+    Entries are keyed on the .xbg path and validated against its size and mtime (plus a content hash with
+    hash_contents=True), and against the same identity of the companion .xbgmip, so editing or adding the
+    mip invalidates the entry. Every decoded section is pickled except FILE_BACKED_SECTIONS: those are stored
+    as offsets and read again from the mapped source file. The cache directory is kept under max_bytes by
+    dropping the least recently used entries.
+    """
+
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024, hash_contents=False, records=False, arrays=False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hash_contents = hash_contents
+        # parse() options, entries written with other options are misses
+        self.options = {"records": records, "arrays": arrays}
+        self._size = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def parse(self, xbg_path):
+        """
+        Same as XBGParser(xbg_path).parse(lazy=True, ...), served from the cache when the files are unchanged.
+        The file stays mapped as long as the meta is alive, open() hands out the parser to close instead.
+        """
+        return self.open(xbg_path).meta
+
+    def open(self, xbg_path):
+        """
+        XBGParser of a file with its lazy meta in parser.meta, restored from the cache when the files are
+        unchanged. Close it (or use it in a with block) once the meta has been used to unmap the file.
+        """
+        xbg_path = os.path.abspath(xbg_path)
+        entry_path = self._entry_path(xbg_path)
+        identity = self._identity(xbg_path)
+
+        entry = self._load(entry_path, xbg_path, identity)
+        if entry is not None:
+            # refresh the entry for LRU eviction
+            try:
+                os.utime(entry_path)
+            except FileNotFoundError:
+                pass
+            parser = XBGParser(xbg_path)
+            parser.restore(entry["order"], entry["values"], entry["offsets"], **self.options)
+            return parser
+
+        parser = XBGParser(xbg_path)
+        meta = parser.parse(lazy=True, **self.options)
+        mip_path = parser.mip_resource_path()
+        entry = {
+            "version": CACHE_VERSION,
+            "path": xbg_path,
+            "identity": identity,
+            "options": self.options,
+            "mipPath": str(mip_path) if mip_path else None,
+            "mipIdentity": self._identity(mip_path) if mip_path else None,
+            "order": list(meta),
+            "values": {key: meta[key] for key in meta if key not in FILE_BACKED_SECTIONS},
+            "offsets": parser.section_offsets,
+        }
+        self._store(entry_path, entry)
+        return parser
+
+    def invalidate(self, xbg_path):
+        self._remove(self._entry_path(os.path.abspath(xbg_path)))
+
+    def clear(self):
+        for path in self._entry_paths():
+            self._remove(path)
+        self._size = 0
+
+    def _entry_path(self, xbg_path):
+        key = hashlib.sha1(xbg_path.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key + CACHE_SUFFIX)
+
+    def _entry_paths(self):
+        return [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith(CACHE_SUFFIX)]
+
+    def _identity(self, path):
+        """(size, mtime[, content hash]) of a file, None if it doesn't exist"""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        identity = (st.st_size, st.st_mtime_ns)
+        if self.hash_contents:
+            identity += (self._hash_file(path),)
+        return identity
+
+    @staticmethod
+    def _hash_file(path):
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def _load(self, entry_path, xbg_path, identity):
+        try:
+            with open(entry_path, "rb") as f:
+                entry = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # truncated or written by an incompatible version
+            self._remove(entry_path)
+            return None
+
+        if entry.get("version") != CACHE_VERSION or entry["path"] != xbg_path or entry["identity"] != identity:
+            return None
+        if entry["options"] != self.options:
+            return None
+        if entry["mipPath"] is not None and entry["mipIdentity"] != self._identity(entry["mipPath"]):
+            return None
+        return entry
+
+    def _store(self, entry_path, entry):
+        # write then rename, concurrent readers never see a partial entry
+        tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, entry_path)
+
+        if self._size is None:
+            self._size = self._total_size()
+        else:
+            self._size += os.path.getsize(entry_path)
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def _total_size(self):
+        total = 0
+        for path in self._entry_paths():
+            try:
+                total += os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+        return total
+
+    def _evict(self):
+        entries = []
+        for path in self._entry_paths():
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, path))
+
+        entries.sort()
+        self._size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self._size <= self.max_bytes:
+                break
+            self._remove(path)
+            self._size -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -1,11 +1,23 @@
 import BinaryReader
+import ntpath
 import os
+from LazyMeta import LazyMeta, MipBufferList
+from XBGRecords import *
 from DataHelper import *
 
 import json
+import struct
+import sys
+from collections import namedtuple
 from pathlib import Path
 from enum import Enum
 
+try:
+    import numpy as np
+except ImportError:
+    # only needed for parse(arrays=True)
+    np = None
+
 
 class EPrimitiveType(Enum):
     TriangleList = 0
@@ -32,80 +44,205 @@ class ESecondaryMotionSpringType(Enum):
     BendVertical = 5
 
 
+class EParseEvent(Enum):
+    SectionStart = 0
+    SectionEnd = 1
+    SkeletonNode = 2
+    SceneMesh = 3
+    DrawCallRange = 4
+    Buffer = 5
+
+
+def spring_types(springs):
+    """ESecondaryMotionSpringType of every spring of an arrays=True springs table"""
+    return [ESecondaryMotionSpringType(t) for t in springs["spring"][:, 2].tolist()]
+
+
+# Yielded by XBGParser.iter_events. index locates the item inside its section,
+# e.g. (skeleton, node), (lod, mesh, range) or (gfxBuffer,)
+ParseEvent = namedtuple("ParseEvent", "type section offset index data")
+
+
+# Precompiled layouts of the fixed-size records, see xbg_new.bt
+STRING_BLOCK = struct.Struct("<II")
+HEADER = struct.Struct("<IHHIII")
+MEMORY_NEED = struct.Struct("<II")
+UNKNOWN_PARAMS = struct.Struct("<fB")
+GEOM_PARAMS = struct.Struct("<16f4I")
+GEOM_PARAMS_TAIL = struct.Struct("<f4BI")
+SKELETON_NODE = struct.Struct("<B3x3f4fHHII")
+OBJECT_TO_BONE = struct.Struct("<II")
+SIMULATION_PARAMETERS = struct.Struct("<13f2IB")
+COLLISION_SPHERE = struct.Struct("<16ff")
+COLLISION_CYLINDER = struct.Struct("<16ff3f3f")
+COLLISION_PLANE = struct.Struct("<16f3f3f")
+LIMIT = struct.Struct("<H3f")
+SPHERE_LIMIT = struct.Struct("<f")
+BOX_LIMIT = struct.Struct("<3f")
+CYLINDER_LIMIT = struct.Struct("<3fff")
+PARTICLE = struct.Struct("<fHH2f")
+SMO_TAIL = struct.Struct("<HH")
+PROCEDURAL_NODE = struct.Struct("<HBx")
+BASIC_DRAW_CALL_RANGE = struct.Struct("<4I4H")
+DRAW_CALL_RANGE = struct.Struct("<4I4H4f3f3f")
+DRAW_CALL_RANGE_TAIL = struct.Struct("<HH")
+SCENE_MESH = struct.Struct("<4f3f3fIHHBBHI4I4H3I")
+MIP_RESOURCE = struct.Struct("<IIII")
+
+# SKELETON_NODE and PARTICLE as structured array rows, for parse(arrays=True)
+SKELETON_NODE_DTYPE = {
+    "names": ["boneLOD", "position", "rotation", "parent", "matrixIndex", "id", "nameLength"],
+    "formats": ["u1", ("<f4", (3,)), ("<f4", (4,)), "<u2", "<u2", "<u4", "<u4"],
+    "offsets": [0, 4, 16, 32, 34, 36, 40],
+    "itemsize": 44,
+}
+PARTICLE_DTYPE = [("radius", "<f4"), ("isAttached", "<u2"), ("teleportParentBoneIndex", "<u2"),
+                  ("texCoordinate", "<f4", (2,))]
+
+PROCEDURAL_NODE_PARAMS = {
+    1: (struct.Struct("<IfIf"), ("t1_unk1", "t1_unk2", "t1_unk3", "t1_unk4")),
+    2: (struct.Struct("<If"), ("t2_unk1", "t2_unk2")),
+    3: (struct.Struct("<IIf"), ("t3_unk1", "t3_unk2", "t3_unk3")),
+    5: (struct.Struct("<II7f"), ("t5_unk1", "t5_unk2", "t5_unk3", "t5_unk4", "t5_unk5",
+                                 "t5_unk6", "t5_unk7", "t5_unk8", "t5_unk9")),
+    6: (struct.Struct("<5I"), ("t6_unk1", "t6_unk2", "t6_unk3", "t6_unk4", "t6_unk5")),
+}
+
+# Sections that hold views into the mapped .xbg or depend on the .xbgmip; see XBGParser.restore
+FILE_BACKED_SECTIONS = ("reflex", "buffers", "mipResourceFound", "clothWrinkleControlPatchBundles")
+
+# Sections iter_events skips unless they are listed in decode, they have no item events
+EVENT_SKIPPED_SECTIONS = ("reflex", "secondaryMotionObjects", "proceduralNodes")
+
+
 class XBGParser:
     def __init__(self, file_path):
         self.file_path = Path(file_path)
         self.meta = None
         self._reader = None
         self._mip_reader = None
+        self._mip_path = None
+        self._mip_offsets = None
+        self.section_offsets = None
+        self._records = False
+        self._arrays = False
+
+    def close(self):
+        """
+        Unmap the .xbg and .xbgmip once the parsed data has been used. Sections of a lazy parse that weren't
+        loaded yet can't be read afterwards; buffers handed out earlier keep their mapping until dropped.
+        """
+        self._close_readers()
+        # the loaders of the meta point back to the parser
+        self.meta = None
+
+    def _close_readers(self):
+        for reader in (self._reader, self._mip_reader):
+            if reader is not None:
+                reader.close()
+        self._reader = None
+        self._mip_reader = None
+        self._mip_offsets = None
+
+    def _open(self):
+        """Map the .xbg for a new walk over it, the files mapped by an earlier one are closed first"""
+        self._close_readers()
+        self._reader = BinaryReader.BinaryReader.from_file(self.file_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _make_record(self, cls, **fields):
+        """A cls record with records=True, otherwise the plain dict"""
+        return cls(**fields) if self._records else fields
+
+    def _read_ndarray(self, dtype, count):
+        """count items of dtype as a zero-copy view into the file"""
+        out = np.frombuffer(self._reader.data, dtype=dtype, count=count, offset=self._reader.tell())
+        self._reader.skip(out.nbytes)
+        return out
+
+    def _gather_records(self, offsets, dtype):
+        """Fixed-size records scattered between variable-length data, copied into one structured array"""
+        dtype = np.dtype(dtype)
+        data = np.frombuffer(self._reader.data, dtype=np.uint8)
+        rows = data[np.asarray(offsets, dtype=np.intp)[:, None] + np.arange(dtype.itemsize)]
+        return rows.view(dtype).reshape(-1)
 
     def _read_string_block(self, align=4):
-        sid = self._reader.u32()
-        size = self._reader.u32()
+        sid, size = self._reader.record(STRING_BLOCK)
         value = self._reader.string(size)
         self._reader.align(align)
         return {"id": sid, "value": value}
 
     def _read_header(self):
+        v = self._reader.record(HEADER)
         return {
-            "magic": self._reader.u32(),
-            "majorVersion": self._reader.u16(),
-            "minorVersion": self._reader.u16(),
-            "unk1": self._reader.u32(),
-            "unk2": self._reader.u32(),
-            "unk3": self._reader.u32(),
+            "magic": v[0],
+            "majorVersion": v[1],
+            "minorVersion": v[2],
+            "unk1": v[3],
+            "unk2": v[4],
+            "unk3": v[5],
         }
 
     def _read_memory_need(self):
+        v = self._reader.record(MEMORY_NEED)
         return {
-            "total": self._reader.u32(),
-            "sceneMeshCount": self._reader.u32()
+            "total": v[0],
+            "sceneMeshCount": v[1]
         }
 
     def _read_unknown_params(self):
+        v = self._reader.record(UNKNOWN_PARAMS)
         out = {
-            "unk1": self._reader.f32(),
-            "unk2": self._reader.u8()
+            "unk1": v[0],
+            "unk2": v[1]
         }
         self._reader.align(4)
         return out
 
     def _read_geom_params(self):
         out = {}
+        v = self._reader.record(GEOM_PARAMS)
 
         out["meshDecompression"] = {
-            "positionMin": self._reader.f32(),
-            "positionRange": self._reader.f32(),
-            "LocalHeight": self._reader.f32(),
+            "positionMin": v[0],
+            "positionRange": v[1],
+            "LocalHeight": v[2],
         }
 
         out["uvDecompression"] = {
-            "UVDecompressionXY": self._reader.f32(),
-            "UVDecompressionZW": self._reader.f32(),
+            "UVDecompressionXY": v[3],
+            "UVDecompressionZW": v[4],
         }
-        out["unk6"] = self._reader.f32()
+        out["unk6"] = v[5]
 
-        out["boundingSphere"] = sphere(self._reader)
-        out["bboxMin"] = vec3(self._reader)
-        out["bboxMax"] = vec3(self._reader)
+        out["boundingSphere"] = {"center": v[6:9], "radius": v[9]}
+        out["bboxMin"] = v[10:13]
+        out["bboxMax"] = v[13:16]
 
-        out["unk11"] = self._reader.u32()
-        out["unk12"] = self._reader.u32()
-        out["unk13"] = self._reader.u32()
+        out["unk11"] = v[16]
+        out["unk12"] = v[17]
+        out["unk13"] = v[18]
 
-        out["lodCount"] = self._reader.u32()
-        out["lodDistances"] = [self._reader.f32() for _ in range(out["lodCount"])]
+        out["lodCount"] = v[19]
+        out["lodDistances"] = list(self._reader.array("f", out["lodCount"]))
 
-        out["killDistance"] = self._reader.f32()
-        out["castShadow"] = self._reader.u8()
-        out["showInReflection"] = self._reader.u8()
-        out["pcSkuLodFlags"] = self._reader.u8()
-        out["unk19"] = self._reader.u8()
+        v = self._reader.record(GEOM_PARAMS_TAIL)
+        out["killDistance"] = v[0]
+        out["castShadow"] = v[1]
+        out["showInReflection"] = v[2]
+        out["pcSkuLodFlags"] = v[3]
+        out["unk19"] = v[4]
 
-        out["firstLowEndLOD"] = self._reader.u32()
-        out["lowEndDistances"] = [
-            self._reader.f32() for _ in range(out["lodCount"] - out["firstLowEndLOD"])
-        ]
+        out["firstLowEndLOD"] = v[5]
+        out["lowEndDistances"] = list(
+            self._reader.array("f", out["lodCount"] - out["firstLowEndLOD"])
+        )
 
         return out
 
@@ -128,8 +265,7 @@ class XBGParser:
         skins = []
         count = self._reader.u32()
         for _ in range(count):
-            sid = self._reader.u32()
-            size = self._reader.u32()
+            sid, size = self._reader.record(STRING_BLOCK)
             name = self._reader.string(size)
             self._reader.align(4)
             skins.append({"id": sid, "name": name})
@@ -140,50 +276,85 @@ class XBGParser:
         count = self._reader.u32()
         for _ in range(count):
             bone_count = self._reader.u32()
-            indices = [self._reader.u16() for _ in range(bone_count)]
+            if self._arrays:
+                indices = self._read_ndarray("<u2", bone_count)
+            else:
+                indices = list(self._reader.array("H", bone_count))
             self._reader.align(4)
             palettes.append(indices)
         self._reader.align(4)
         return palettes
 
+    def _read_skeleton_node(self):
+        v = self._reader.record(SKELETON_NODE)
+        name = self._reader.string(v[11])
+        self._reader.align(4)
+        return self._make_record(
+            SkeletonNode,
+            boneLOD=v[0],
+            position=v[1:4],
+            rotation=list(v[4:8]),
+            parent=v[8],
+            matrixIndex=v[9],
+            id=v[10],
+            name=name,
+        )
+
     def _read_skeletons(self):
         skels = []
         count = self._reader.u32()
         for _ in range(count):
             nodes = []
             node_count = self._reader.u32()
+            if self._arrays:
+                skels.append(self._read_skeleton_arrays(node_count))
+                continue
             for _ in range(node_count):
-                boneLOD = self._reader.u8()
-                self._reader.skip(3)
-                pos = vec3(self._reader)
-                rot = [self._reader.f32() for _ in range(4)]
-                parent = self._reader.u16()
-                mat_idx = self._reader.u16()
-                nid = self._reader.u32()
-                size = self._reader.u32()
-                name = self._reader.string(size)
-                self._reader.align(4)
-                nodes.append({
-                    "boneLOD": boneLOD,
-                    "position": pos,
-                    "rotation": rot,
-                    "parent": parent,
-                    "matrixIndex": mat_idx,
-                    "id": nid,
-                    "name": name
-                })
+                nodes.append(self._read_skeleton_node())
             skels.append(nodes)
 
+        return {"skeletons": skels, "objectToBone": self._read_object_to_bone()}
+
+    def _read_object_to_bone(self):
+        v = self._reader.record(OBJECT_TO_BONE)
         matrices = {
-            "rootIndex": self._reader.u32(),
-            "count": self._reader.u32(),
+            "rootIndex": v[0],
+            "count": v[1],
             "matrices": []
         }
         self._reader.align(16)
+        if self._arrays:
+            matrices["matrices"] = self._read_ndarray("<f4", matrices["count"] * 16).reshape(-1, 4, 4)
+            return matrices
         for _ in range(matrices["count"]):
-            matrices["matrices"].append([self._reader.f32() for _ in range(16)])
+            matrices["matrices"].append(list(self._reader.array("f", 16)))
+        return matrices
+
+    def _read_skeleton_arrays(self, node_count):
+        """
+        Skeleton for parse(arrays=True): one array per node field instead of a list of nodes,
+        e.g. position (N,3) and rotation (N,4) float32. parent is int32 with -1 for the roots.
+        """
+        names = []
+        offsets = []
+        for _ in range(node_count):
+            offsets.append(self._reader.tell())
+            self._reader.skip(SKELETON_NODE.size - 4)
+            names.append(self._reader.string(self._reader.u32()))
+            self._reader.align(4)
 
-        return {"skeletons": skels, "objectToBone": matrices}
+        nodes = self._gather_records(offsets, SKELETON_NODE_DTYPE)
+        parent = nodes["parent"].astype(np.int32)
+        parent[parent == 0xFFFF] = -1
+        return {
+            "boneLOD": np.ascontiguousarray(nodes["boneLOD"]),
+            "position": np.ascontiguousarray(nodes["position"]),
+            "rotation": np.ascontiguousarray(nodes["rotation"]),
+            "parent": parent,
+            "matrixIndex": np.ascontiguousarray(nodes["matrixIndex"]),
+            "id": np.ascontiguousarray(nodes["id"]),
+            "name": names,
+        }
 
     def _read_reflex(self):
         has = self._reader.u32()
@@ -198,21 +369,22 @@ class XBGParser:
         secondary_motion_objects = []
         count = self._reader.u32()
         for _ in range(count):
+            v = self._reader.record(SIMULATION_PARAMETERS)
             simulation_parameters = {
-                "gravity": vec3(self._reader),
-                "verticalStiffness": self._reader.f32(),
-                "horizontalStiffness": self._reader.f32(),
-                "shearStiffness": self._reader.f32(),
-                "bendStiffness": self._reader.f32(),
-                "viscousDrag": self._reader.f32(),
-                "aerodynamicDrag": self._reader.f32(),
-                "internalFriction": self._reader.f32(),
-                "jiggleStiffness": self._reader.f32(),
-                "frictionCoefficient": self._reader.f32(),
-                "frictionExtraRadius": self._reader.f32(),
-                "numIterations": self._reader.u32(),
-                "objectType": ESecondaryMotionObjectType(self._reader.u32()),
-                "useMaxLengthConstraints": self._reader.u8()
+                "gravity": v[0:3],
+                "verticalStiffness": v[3],
+                "horizontalStiffness": v[4],
+                "shearStiffness": v[5],
+                "bendStiffness": v[6],
+                "viscousDrag": v[7],
+                "aerodynamicDrag": v[8],
+                "internalFriction": v[9],
+                "jiggleStiffness": v[10],
+                "frictionCoefficient": v[11],
+                "frictionExtraRadius": v[12],
+                "numIterations": v[13],
+                "objectType": ESecondaryMotionObjectType(v[14]),
+                "useMaxLengthConstraints": v[15]
             }
             self._reader.align(4)
 
@@ -229,8 +401,9 @@ class XBGParser:
                     "primitive": self._read_string_block(16),
                     "primitiveToBone": [],
                 }
-                sphere["primitiveToBone"].append([self._reader.f32() for _ in range(16)])
-                sphere["radius"] = self._reader.f32()
+                v = self._reader.record(COLLISION_SPHERE)
+                sphere["primitiveToBone"].append(list(v[0:16]))
+                sphere["radius"] = v[16]
                 collision_primitive_collection_description["spheres"].append(sphere)
 
             cylinderCount = self._reader.u32()
@@ -240,10 +413,11 @@ class XBGParser:
                     "primitive": self._read_string_block(16),
                     "primitiveToBone": [],
                 }
-                cylinder["primitiveToBone"].append([self._reader.f32() for _ in range(16)])
-                cylinder["radius"] = self._reader.f32()
-                cylinder["localPointA"] = vec3(self._reader)
-                cylinder["localPointB"] = vec3(self._reader)
+                v = self._reader.record(COLLISION_CYLINDER)
+                cylinder["primitiveToBone"].append(list(v[0:16]))
+                cylinder["radius"] = v[16]
+                cylinder["localPointA"] = v[17:20]
+                cylinder["localPointB"] = v[20:23]
                 collision_primitive_collection_description["cylinders"].append(cylinder)
 
             capsuleCount = self._reader.u32()
@@ -253,10 +427,11 @@ class XBGParser:
                     "primitive": self._read_string_block(16),
                     "primitiveToBone": [],
                 }
-                capsule["primitiveToBone"].append([self._reader.f32() for _ in range(16)])
-                capsule["radius"] = self._reader.f32()
-                capsule["localPointA"] = vec3(self._reader)
-                capsule["localPointB"] = vec3(self._reader)
+                v = self._reader.record(COLLISION_CYLINDER)
+                capsule["primitiveToBone"].append(list(v[0:16]))
+                capsule["radius"] = v[16]
+                capsule["localPointA"] = v[17:20]
+                capsule["localPointB"] = v[20:23]
                 collision_primitive_collection_description["capsules"].append(capsule)
 
             planeCount = self._reader.u32()
@@ -266,9 +441,10 @@ class XBGParser:
                     "primitive": self._read_string_block(16),
                     "primitiveToBone": [],
                 }
-                plane["primitiveToBone"].append([self._reader.f32() for _ in range(16)])
-                plane["localOrigin"] = vec3(self._reader)
-                plane["localNormal"] = vec3(self._reader)
+                v = self._reader.record(COLLISION_PLANE)
+                plane["primitiveToBone"].append(list(v[0:16]))
+                plane["localOrigin"] = v[16:19]
+                plane["localNormal"] = v[19:22]
                 collision_primitive_collection_description["planes"].append(plane)
 
             limit_collection_description = {
@@ -279,39 +455,34 @@ class XBGParser:
             sphereLimitCount = self._reader.u32()
             limit_collection_description["sphereLimitCount"] = sphereLimitCount
             for _ in range(sphereLimitCount):
-                sphereLimit = {
-                    "primitive": self._read_string_block(2),
-                    "particleIndex": self._reader.u16(),
-                    "offset": vec3(self._reader),
-                }
+                primitive = self._read_string_block(2)
+                v = self._reader.record(LIMIT)
+                sphereLimit = self._make_record(SphereLimit, primitive=primitive, particleIndex=v[0], offset=v[1:4])
                 self._reader.align(4)
-                sphereLimit["radius"] = self._reader.f32()
+                sphereLimit["radius"] = self._reader.record(SPHERE_LIMIT)[0]
                 limit_collection_description["sphereLimits"].append(sphereLimit)
 
             boxLimitCount = self._reader.u32()
             limit_collection_description["boxLimitCount"] = boxLimitCount
             for _ in range(boxLimitCount):
-                boxLimit = {
-                    "primitive": self._read_string_block(2),
-                    "particleIndex": self._reader.u16(),
-                    "offset": vec3(self._reader),
-                }
+                primitive = self._read_string_block(2)
+                v = self._reader.record(LIMIT)
+                boxLimit = self._make_record(BoxLimit, primitive=primitive, particleIndex=v[0], offset=v[1:4])
                 self._reader.align(4)
-                boxLimit["halfRange"] = vec3(self._reader)
+                boxLimit["halfRange"] = self._reader.record(BOX_LIMIT)
                 limit_collection_description["boxLimits"].append(boxLimit)
 
             cylinderLimitCount = self._reader.u32()
             limit_collection_description["cylinderLimitCount"] = cylinderLimitCount
             for _ in range(cylinderLimitCount):
-                cylinderLimit = {
-                    "primitive": self._read_string_block(2),
-                    "particleIndex": self._reader.u16(),
-                    "offset": vec3(self._reader),
-                }
+                primitive = self._read_string_block(2)
+                v = self._reader.record(LIMIT)
+                cylinderLimit = self._make_record(CylinderLimit, primitive=primitive, particleIndex=v[0], offset=v[1:4])
                 self._reader.align(4)
-                cylinderLimit["localDirection"] = vec3(self._reader)
-                cylinderLimit["length"] = self._reader.f32()
-                cylinderLimit["radius"] = self._reader.f32()
+                v = self._reader.record(CYLINDER_LIMIT)
+                cylinderLimit["localDirection"] = v[0:3]
+                cylinderLimit["length"] = v[3]
+                cylinderLimit["radius"] = v[4]
                 limit_collection_description["cylinderLimits"].append(cylinderLimit)
 
             particles = {
@@ -319,15 +490,28 @@ class XBGParser:
             }
             particleCount = self._reader.u32()
             particles["particleCount"] = particleCount
-            for _ in range(particleCount):
-                particle = {
-                    "name": self._read_string_block(4),
-                    "radius": self._reader.f32(),
-                    "isAttached": self._reader.u16(),
-                    "teleportParentBoneIndex": self._reader.u16(),
-                    "texCoordinate": vec2(self._reader)
-                }
-                particles["particle"].append(particle)
+            if self._arrays:
+                # names are variable length, only the fixed part goes into the array
+                particles["names"] = []
+                offsets = []
+                for _ in range(particleCount):
+                    particles["names"].append(self._read_string_block(4))
+                    offsets.append(self._reader.tell())
+                    self._reader.skip(PARTICLE.size)
+                particles["particle"] = self._gather_records(offsets, PARTICLE_DTYPE)
+            else:
+                for _ in range(particleCount):
+                    name = self._read_string_block(4)
+                    v = self._reader.record(PARTICLE)
+                    particle = self._make_record(
+                        Particle,
+                        name=name,
+                        radius=v[0],
+                        isAttached=v[1],
+                        teleportParentBoneIndex=v[2],
+                        texCoordinate=v[3:5],
+                    )
+                    particles["particle"].append(particle)
 
             teleport_parent_bones = {
                 "teleportParentBones": [],
@@ -345,13 +529,17 @@ class XBGParser:
             }
             triangleDescCount = self._reader.u32()
             triangles_descs["triangleDescCount"] = triangleDescCount
-            for _ in range(triangleDescCount):
-                triangles_desc = {
-                    "index1": self._reader.u16(),
-                    "index2": self._reader.u16(),
-                    "index3": self._reader.u16(),
-                }
-                triangles_descs["triangleDesc"].append(triangles_desc)
+            if self._arrays:
+                triangles_descs["triangleDesc"] = self._read_ndarray("<u2", triangleDescCount * 3).reshape(-1, 3)
+            else:
+                it = iter(self._reader.array("H", triangleDescCount * 3))
+                for index1, index2, index3 in zip(it, it, it):
+                    triangles_desc = {
+                        "index1": index1,
+                        "index2": index2,
+                        "index3": index3,
+                    }
+                    triangles_descs["triangleDesc"].append(triangles_desc)
             self._reader.align(4)
 
             connectivities = {
@@ -359,21 +547,27 @@ class XBGParser:
             }
             connectivityCount = self._reader.u32()
             connectivities["connectivityCount"] = connectivityCount
-            for _ in range(connectivityCount):
-                connectivities["neighbor"].append(self._reader.u16())
+            if self._arrays:
+                connectivities["neighbor"] = self._read_ndarray("<u2", connectivityCount)
+            else:
+                connectivities["neighbor"] = list(self._reader.array("H", connectivityCount))
 
             spring_descs = {
                 "spring": [],
             }
             springCount = self._reader.u32()
             spring_descs["springCount"] = springCount
-            for _ in range(springCount):
-                spring_desc = {
-                    "index1": self._reader.u16(),
-                    "index2": self._reader.u16(),
-                    "springType": ESecondaryMotionSpringType(self._reader.u16()),
-                }
-                spring_descs["spring"].append(spring_desc)
+            if self._arrays:
+                # index1, index2, springType per row, see spring_types()
+                spring_descs["spring"] = self._read_ndarray("<u2", springCount * 3).reshape(-1, 3)
+            else:
+                it = iter(self._reader.array("H", springCount * 3))
+                for index1, index2, spring_type in zip(it, it, it):
+                    spring_desc = self._make_record(
+                        Spring, index1=index1, index2=index2, springType=ESecondaryMotionSpringType(spring_type))
+                    spring_descs["spring"].append(spring_desc)
+
+            v = self._reader.record(SMO_TAIL)
 
             secondary_motion_object = {
                 "simulationParameters": simulation_parameters,
@@ -381,10 +575,11 @@ class XBGParser:
                 "limitCollectionDescription": limit_collection_description,
                 "particles": particles,
                 "teleportParentBones": teleport_parent_bones,
+                "triangles": triangles_descs,
                 "connectivities": connectivities,
                 "springs": spring_descs,
-                "numStructuralVerticalSprings": self._reader.u16(),
-                "isHandInPocketCompatible": self._reader.u16(),
+                "numStructuralVerticalSprings": v[0],
+                "isHandInPocketCompatible": v[1],
             }
             secondary_motion_objects.append(secondary_motion_object)
             self._reader.align(4)
@@ -400,117 +595,91 @@ class XBGParser:
         procedural_nodes["nodeCount"] = nodeCount
 
         for _ in range(nodeCount):
+            v = self._reader.record(PROCEDURAL_NODE)
             node = {
-                "boneIndex": self._reader.u16(),
-                "proceduralNodeType": self._reader.u8(),
+                "boneIndex": v[0],
+                "proceduralNodeType": v[1],
             }
-            self._reader.skip(1)
-
-            if node["proceduralNodeType"] == 1:
-                node["t1_unk1"] = self._reader.u32()
-                node["t1_unk2"] = self._reader.f32()
-                node["t1_unk3"] = self._reader.u32()
-                node["t1_unk4"] = self._reader.f32()
-
-            elif node["proceduralNodeType"] == 2:
-                node["t2_unk1"] = self._reader.u32()
-                node["t2_unk2"] = self._reader.f32()
-
-            elif node["proceduralNodeType"] == 3:
-                node["t3_unk1"] = self._reader.u32()
-                node["t3_unk2"] = self._reader.u32()
-                node["t3_unk3"] = self._reader.f32()
-
-            elif node["proceduralNodeType"] == 5:
-                node["t5_unk1"] = self._reader.u32()
-                node["t5_unk2"] = self._reader.u32()
-                node["t5_unk3"] = self._reader.f32()
-                node["t5_unk4"] = self._reader.f32()
-                node["t5_unk5"] = self._reader.f32()
-                node["t5_unk6"] = self._reader.f32()
-                node["t5_unk7"] = self._reader.f32()
-                node["t5_unk8"] = self._reader.f32()
-                node["t5_unk9"] = self._reader.f32()
-
-            elif node["proceduralNodeType"] == 6:
-                node["t6_unk1"] = self._reader.u32()
-                node["t6_unk2"] = self._reader.u32()
-                node["t6_unk3"] = self._reader.u32()
-                node["t6_unk4"] = self._reader.u32()
-                node["t6_unk5"] = self._reader.u32()
+
+            params = PROCEDURAL_NODE_PARAMS.get(node["proceduralNodeType"])
+            if params:
+                fmt, keys = params
+                node.update(zip(keys, self._reader.record(fmt)))
 
             procedural_nodes["node"].append(node)
 
         return procedural_nodes
 
+    def _basic_draw_call_range(self, v):
+        return self._make_record(
+            BasicDrawCall,
+            vertexBufferByteOffset=v[0],
+            primitiveCount=v[1],
+            indexCount=v[2],
+            indexBufferStartIndex=v[3],
+            vertexCount=v[4],
+            minIndexValue=v[5],
+            maxIndexValue=v[6],
+            groupCount=v[7],
+        )
+
     def _read_basic_draw_call_range(self):
-        return {
-            "vertexBufferByteOffset": self._reader.u32(),
-            "primitiveCount": self._reader.u32(),
-            "indexCount": self._reader.u32(),
-            "indexBufferStartIndex": self._reader.u32(),
-            "vertexCount": self._reader.u16(),
-            "minIndexValue": self._reader.u16(),
-            "maxIndexValue": self._reader.u16(),
-            "groupCount": self._reader.u16(),
-        }
+        return self._basic_draw_call_range(self._reader.record(BASIC_DRAW_CALL_RANGE))
 
     def _read_draw_call_range(self):
-        draw_call = {
-            "drawCall": self._read_basic_draw_call_range(),
-            "boundingSphere": sphere(self._reader),
-            "bboxMin": vec3(self._reader),
-            "bboxMax": vec3(self._reader),
-            "name": self._read_string_block(4)
-        }
-        draw_call["skinIndex"] = self._reader.u16()
-        draw_call["attachedBoneIndex"] = self._reader.u16()
+        v = self._reader.record(DRAW_CALL_RANGE)
+        draw_call = self._make_record(
+            DrawCallRange,
+            drawCall=self._basic_draw_call_range(v),
+            boundingSphere=self._make_record(Sphere, center=v[8:11], radius=v[11]),
+            bboxMin=v[12:15],
+            bboxMax=v[15:18],
+            name=self._read_string_block(4),
+        )
+        v = self._reader.record(DRAW_CALL_RANGE_TAIL)
+        draw_call["skinIndex"] = v[0]
+        draw_call["attachedBoneIndex"] = v[1]
         return draw_call
 
+    def _read_scene_mesh_header(self):
+        """Scene mesh record without its draw call ranges, numRanges of them follow it"""
+        v = self._reader.record(SCENE_MESH)
+        mesh = self._make_record(
+            SceneMesh,
+            boundingSphere=self._make_record(Sphere, center=v[0:3], radius=v[3]),
+            bboxMin=v[4:7],
+            bboxMax=v[7:10],
+            primitiveType=EPrimitiveType(v[10]),
+            materialIndex=v[11],
+            fvf=v[12],
+            vertexSize=v[13],
+            unk9=v[14],
+            unk10=v[15],
+            boneMapIndex=v[16],
+        )
+        if not self._records:
+            # SceneMesh records compute the flags from fvf
+            fvf = mesh["fvf"]
+            for bit, flag in enumerate(FVF_FLAGS):
+                mesh[flag] = (fvf >> bit) & 1
+
+        mesh["mergedRanges"] = self._basic_draw_call_range(v[17:25])
+
+        mesh["numRanges"] = v[25]
+        mesh["numSkins"] = v[26]   # use the max skin count always?
+        mesh["unk13"] = v[27]
+        return mesh
+
     def _read_scene_meshes(self, lod_count):
         lods = []
         for _ in range(lod_count):
             meshes = []
             numSceneMesh = self._reader.u32()
             for _ in range(numSceneMesh):
-                mesh = {
-                    "boundingSphere": sphere(self._reader),
-                    "bboxMin": vec3(self._reader),
-                    "bboxMax": vec3(self._reader),
-                    "primitiveType": EPrimitiveType(self._reader.u32()),
-                    "materialIndex": self._reader.u16(),
-                    "fvf": self._reader.u16(),
-                    "vertexSize": self._reader.u8(),
-                    "unk9": self._reader.u8(),
-                    "unk10": self._reader.u16(),
-                    "boneMapIndex": self._reader.u32(),
-                }
-                mesh["Point"] = mesh["fvf"] & 0x1
-                mesh["PointComp"] = (mesh["fvf"] & 0x2) >> 1
-                mesh["UV"] = (mesh["fvf"] & 0x4) >> 2
-                mesh["UVComp1"] = (mesh["fvf"] & 0x8) >> 3
-                mesh["Skin"] = (mesh["fvf"] & 0x10) >> 4
-                mesh["SkinExtra"] = (mesh["fvf"] & 0x20) >> 5
-                mesh["SkinRigid"] = (mesh["fvf"] & 0x40) >> 6
-                mesh["NormalComp"] = (mesh["fvf"] & 0x80) >> 7
-                mesh["Color"] = (mesh["fvf"] & 0x100) >> 8
-                mesh["TangentComp"] = (mesh["fvf"] & 0x200) >> 9
-                mesh["BinormalComp"] = (mesh["fvf"] & 0x400) >> 10
-                mesh["PackedFirstUV"] = (mesh["fvf"] & 0x800) >> 11
-                mesh["UVComp2"] = (mesh["fvf"] & 0x1000) >> 12
-                mesh["UVComp3"] = (mesh["fvf"] & 0x2000) >> 13
-                mesh["Normal"] = (mesh["fvf"] & 0x4000) >> 14
-                mesh["NormalModifiedComp"] = (mesh["fvf"] & 0x8000) >> 15
-
-                mesh["mergedRanges"] = self._read_basic_draw_call_range()
-
-                numRanges = self._reader.u32()
-                mesh["numRanges"] = numRanges
-                mesh["numSkins"] = self._reader.u32()   # use the max skin count always?
-                mesh["unk13"] = self._reader.u32()
+                mesh = self._read_scene_mesh_header()
 
                 mesh["ranges"] = []
-                for _ in range(numRanges):
+                for _ in range(mesh["numRanges"]):
                     range_draw = self._read_draw_call_range()
                     mesh["ranges"].append(range_draw)
 
@@ -518,6 +687,31 @@ class XBGParser:
             lods.append(meshes)
         return lods
 
+    @staticmethod
+    def _read_buffer_extents(reader):
+        """(vertex offset, vertex size, index offset, index size) of the next gfx buffer, leaves reader after it"""
+        vbuf_size = reader.u32()
+        vbuf_offset = reader.tell()
+        reader.skip(vbuf_size)
+        reader.align(4)
+
+        ibuf_size = reader.u32()
+        ibuf_offset = reader.tell()
+        reader.skip(ibuf_size)
+        reader.align(4)
+
+        return vbuf_offset, vbuf_size, ibuf_offset, ibuf_size
+
+    @staticmethod
+    def _buffer_views(data, extents):
+        vbuf_offset, vbuf_size, ibuf_offset, ibuf_size = extents
+        return {
+            "vbuf_size": vbuf_size,
+            "vertexBuffer": data[vbuf_offset:vbuf_offset + vbuf_size],
+            "ibuf_size": ibuf_size,
+            "indexBuffer": data[ibuf_offset:ibuf_offset + ibuf_size],
+        }
+
     def _read_buffers(self):
         buffers = {
             "gfxBuffer": [],
@@ -527,85 +721,364 @@ class XBGParser:
         buffers["numBuffer"] = numBuffer
 
         for _ in range(numBuffer):
-            buffer = {}
-
-            vbuf_size = self._reader.u32()
-            buffer["vbuf_size"] = vbuf_size
-            buffer["vertexBuffer"] = self._reader.bytes(vbuf_size)
-            self._reader.align(4)
-
-            ibuf_size = self._reader.u32()
-            buffer["ibuf_size"] = ibuf_size
-            buffer["indexBuffer"] = self._reader.bytes(ibuf_size)
-            self._reader.align(4)
-
-            buffers["gfxBuffer"].append(buffer)
+            extents = self._read_buffer_extents(self._reader)
+            buffers["gfxBuffer"].append(self._buffer_views(self._reader.data, extents))
 
         return buffers
 
     def _read_mip(self):
         out = {"hasMips": self._reader.u32()}
         if out["hasMips"]:
-            out["unk1"] = self._reader.u32()
-            out["mipSize"] = self._reader.u32()
-            out["pathID"] = self._reader.u32()
-            size = self._reader.u32()
-            out["path"] = self._reader.string(size)
+            v = self._reader.record(MIP_RESOURCE)
+            out["unk1"] = v[0]
+            out["mipSize"] = v[1]
+            out["pathID"] = v[2]
+            out["path"] = self._reader.string(v[3])
             self._reader.align(4)
         return out
 
-    def parse(self):
+    def _skip_string_block(self, align=4):
+        self._reader.skip(4)
+        self._reader.skip(self._reader.u32())
+        self._reader.align(align)
+
+    def _skip_skeletons(self):
+        count = self._reader.u32()
+        for _ in range(count):
+            node_count = self._reader.u32()
+            for _ in range(node_count):
+                self._reader.skip(SKELETON_NODE.size - 4)
+                self._reader.skip(self._reader.u32())
+                self._reader.align(4)
+
+        self._reader.skip(4)
+        matrix_count = self._reader.u32()
+        self._reader.align(16)
+        self._reader.skip(matrix_count * 64)
+
+    def _skip_reflex(self):
+        if self._reader.u32():
+            self._reader.skip(self._reader.u32())
+            self._reader.align(4)
+
+    def _skip_smos(self):
+        count = self._reader.u32()
+        for _ in range(count):
+            self._reader.skip(SIMULATION_PARAMETERS.size)
+            self._reader.align(4)
+
+            # spheres, cylinders, capsules, planes
+            for fmt in (COLLISION_SPHERE, COLLISION_CYLINDER, COLLISION_CYLINDER, COLLISION_PLANE):
+                for _ in range(self._reader.u32()):
+                    self._skip_string_block(16)
+                    self._reader.skip(fmt.size)
+
+            # sphere, box and cylinder limits
+            for fmt in (SPHERE_LIMIT, BOX_LIMIT, CYLINDER_LIMIT):
+                for _ in range(self._reader.u32()):
+                    self._skip_string_block(2)
+                    self._reader.skip(LIMIT.size)
+                    self._reader.align(4)
+                    self._reader.skip(fmt.size)
+
+            for _ in range(self._reader.u32()):
+                self._skip_string_block(4)
+                self._reader.skip(PARTICLE.size)
+
+            for _ in range(self._reader.u32()):
+                self._skip_string_block(4)
+
+            self._reader.skip(self._reader.u32() * 6)
+            self._reader.align(4)
+            self._reader.skip(self._reader.u32() * 2)
+            self._reader.skip(self._reader.u32() * 6)
+
+            self._reader.skip(SMO_TAIL.size)
+            self._reader.align(4)
+
+    def _skip_procedural_nodes(self):
+        count = self._reader.u32()
+        for _ in range(count):
+            params = PROCEDURAL_NODE_PARAMS.get(self._reader.record(PROCEDURAL_NODE)[1])
+            if params:
+                self._reader.skip(params[0].size)
+
+    def _skip_scene_meshes(self, lod_count):
+        for _ in range(lod_count):
+            numSceneMesh = self._reader.u32()
+            for _ in range(numSceneMesh):
+                # numRanges, numSkins and unk13 close the record
+                self._reader.skip(SCENE_MESH.size - 12)
+                numRanges = self._reader.u32()
+                self._reader.skip(8)
+                for _ in range(numRanges):
+                    self._reader.skip(DRAW_CALL_RANGE.size)
+                    self._skip_string_block(4)
+                    self._reader.skip(DRAW_CALL_RANGE_TAIL.size)
+
+    def _skip_buffers(self):
+        numBuffer = self._reader.u32()
+        for _ in range(numBuffer):
+            self._reader.skip(self._reader.u32())
+            self._reader.align(4)
+            self._reader.skip(self._reader.u32())
+            self._reader.align(4)
+
+    def _skip_mip(self):
+        if self._reader.u32():
+            self._reader.skip(12)
+            self._reader.skip(self._reader.u32())
+            self._reader.align(4)
+
+    def _sections(self):
+        """Top-level sections in file order as (key, reader, skipper), small sections have no skipper"""
+        lod_count = lambda: self.meta["geomParams"]["lodCount"]
+        return [
+            ("header", self._read_header, None),
+            ("memory", self._read_memory_need, None),
+            ("unknown", self._read_unknown_params, None),
+            ("geomParams", self._read_geom_params, None),
+            ("materials", self._read_materials, None),
+            ("skins", self._read_skins, None),
+            ("bonePalettes", self._read_bone_palettes, None),
+            ("skeletons", self._read_skeletons, self._skip_skeletons),
+            ("reflex", self._read_reflex, self._skip_reflex),
+            ("secondaryMotionObjects", self._read_smos, self._skip_smos),
+            ("proceduralNodes", self._read_procedural_nodes, self._skip_procedural_nodes),
+            ("meshes", lambda: self._read_scene_meshes(lod_count()), lambda: self._skip_scene_meshes(lod_count())),
+            ("mipCount", self._reader.u32, None),
+            ("buffers", self._read_buffers, self._skip_buffers),
+            ("mip", self._read_mip, self._skip_mip),
+        ]
+
+    def _check_open(self):
+        if self._reader is None:
+            raise ValueError(f"{self.file_path.name} was closed, sections not loaded before can't be read")
+
+    def _read_section_at(self, offset, read):
+        self._check_open()
+        self._reader.seek(offset)
+        return read()
 
+    def mip_resource_path(self):
+        """Where the companion .xbgmip is expected, None if the file has no mips"""
+        if self.meta["mipCount"] == 0:
+            return None
+
+        # just assume xbgmip in the same folder
         directory = os.path.dirname(self.file_path)
+        return Path(os.path.join(Path(directory).resolve(), ntpath.basename(self.meta["mip"]["path"])))
+
+    def _find_mip_resource(self):
+        self._check_open()
+        mip_path = self.mip_resource_path()
+        if mip_path is None:
+            return 0
+
+        if not os.path.exists(mip_path):
+            # stderr, so batch runs writing JSON to stdout stay parseable
+            print(f"Mip resource not found: {mip_path}", file=sys.stderr)
+            return 0
+
+        self._mip_path = mip_path
+        return 1
+
+    def _index_mip_buffers(self):
+        """Offsets of the .xbgmip buffers, built from the size prefixes after its 16 byte header"""
+        self._mip_reader = BinaryReader.BinaryReader.from_file(self._mip_path)
+        self._mip_reader.skip(16)
+
+        return [self._read_buffer_extents(self._mip_reader) for _ in range(self.meta["mipCount"])]
+
+    def _read_mip_buffer(self, index):
+        self._check_open()
+        if self._mip_offsets is None:
+            self._mip_offsets = self._index_mip_buffers()
+
+        return self._buffer_views(self._mip_reader.data, self._mip_offsets[index])
+
+    def _attach_mip_buffers(self, buffers):
+        # the high LODs come first, they are only read from the .xbgmip once requested
+        # self.meta["buffers"]["numBuffer"] += self.meta["mipCount"]
+        buffers["gfxBuffer"] = MipBufferList(buffers["gfxBuffer"], self.meta["mipCount"], self._read_mip_buffer)
+        return buffers
+
+    def _read_buffers_with_mips(self, offset):
+        buffers = self._read_section_at(offset, self._read_buffers)
+        if self.meta["mipResourceFound"]:
+            self._attach_mip_buffers(buffers)
+        return buffers
+
+    def parse(self, lazy=False, records=False, arrays=False):
+        """
+        Parse the .xbg file. With lazy=True only the byte offsets of the top-level sections are recorded
+        and the returned LazyMeta decodes skeletons, SMOs, meshes, buffers and mips on first access.
+        With records=True skeleton nodes, scene meshes, draw call ranges, particles, springs and limits
+        are compact XBGRecords instances instead of dicts; they are still readable by key.
+        With arrays=True bone palettes, skeletons, objectToBone and the SMO particle, triangle, connectivity
+        and spring tables are NumPy arrays.
+        """
+        self._open()
+        self._records = records
+        self._arrays = arrays
+        if lazy:
+            return self._parse_lazy()
 
-        data = self.file_path.read_bytes()
-        self._reader = BinaryReader.BinaryReader(data)
         self.meta = {}
         #self.meta["directory"] = Path(directory).resolve()
-        self.meta["header"] = self._read_header()
-        self.meta["memory"] = self._read_memory_need()
-        self.meta["unknown"] = self._read_unknown_params()
-        self.meta["geomParams"] = self._read_geom_params()
-        self.meta["materials"] = self._read_materials()
-        self.meta["skins"] = self._read_skins()
-        self.meta["bonePalettes"] = self._read_bone_palettes()
-        self.meta["skeletons"] = self._read_skeletons()
-        self.meta["reflex"] = self._read_reflex()
-        self.meta["secondaryMotionObjects"] = self._read_smos()
-        self.meta["proceduralNodes"] = self._read_procedural_nodes()
-        self.meta["meshes"] = self._read_scene_meshes(self.meta["geomParams"]["lodCount"])
-        self.meta["mipCount"] = self._reader.u32()
-        self.meta["buffers"] = self._read_buffers()
-        self.meta["mip"] = self._read_mip()
+        for key, read, _ in self._sections():
+            self.meta[key] = read()
+
+        self.meta["mipResourceFound"] = self._find_mip_resource()
+        if self.meta["mipResourceFound"]:
+            self._attach_mip_buffers(self.meta["buffers"])
 
-        self.meta["mipResourceFound"] = 0
-        if self.meta["mipCount"] > 0:
-            # just assume xbgmip in the same folder
-            mip_path = Path(os.path.join(Path(directory).resolve(), os.path.basename(self.meta["mip"]["path"])))
-
-            if os.path.exists(mip_path):
-                self.meta["mipResourceFound"] = 1
-                # self.meta["buffers"]["numBuffer"] += self.meta["mipCount"]
-                mip_data = mip_path.read_bytes()
-                self._mip_reader = BinaryReader.BinaryReader(mip_data)
-                self._mip_reader.skip(16)
-                for i in range(0, self.meta["mipCount"]):
-                    buffer = {}
-
-                    vbuf_size = self._mip_reader.u32()
-                    buffer["vbuf_size"] = vbuf_size
-                    buffer["vertexBuffer"] = self._mip_reader.bytes(vbuf_size)
-                    self._mip_reader.align(4)
-
-                    ibuf_size = self._mip_reader.u32()
-                    buffer["ibuf_size"] = ibuf_size
-                    buffer["indexBuffer"] = self._mip_reader.bytes(ibuf_size)
-                    self._mip_reader.align(4)
-
-                    self.meta["buffers"]["gfxBuffer"].insert(i, buffer)
+        self.meta["clothWrinkleControlPatchBundles"] = self._read_cloth_wrinkle_control_patch_bundles()
+
+        return self.meta
+
+    def _read_cloth_wrinkle_control_patch_bundles(self):
+        return self._reader.bytes(self._reader.size - self._reader.tell())
+
+    def _file_backed_loaders(self):
+        """Loaders of the sections that hold views into the mapped files or depend on the companion .xbgmip"""
+        offsets = self.section_offsets
+        return {
+            "reflex": lambda: self._read_section_at(offsets["reflex"], self._read_reflex),
+            "buffers": lambda: self._read_buffers_with_mips(offsets["buffers"]),
+            "mipResourceFound": self._find_mip_resource,
+            "clothWrinkleControlPatchBundles": lambda: self._read_section_at(
+                offsets["clothWrinkleControlPatchBundles"], self._read_cloth_wrinkle_control_patch_bundles),
+        }
+
+    def _parse_lazy(self):
+        order = []
+        values = {}
+        loaders = {}
+        self.section_offsets = {}
+        self.meta = LazyMeta(order, values, loaders)
+
+        for key, read, skip in self._sections():
+            offset = self._reader.tell()
+            self.section_offsets[key] = offset
+            order.append(key)
+            if skip is None:
+                values[key] = read()
             else:
-                print(f"Mip resource not found: {mip_path}")
+                loaders[key] = lambda offset=offset, read=read: self._read_section_at(offset, read)
+                skip()
+
+        self.section_offsets["clothWrinkleControlPatchBundles"] = self._reader.tell()
+        order += ["mipResourceFound", "clothWrinkleControlPatchBundles"]
+        loaders.update(self._file_backed_loaders())
 
-        self.meta["clothWrinkleControlPatchBundles"] = self._reader.bytes(len(data) - self._reader.tell())
+        return self.meta
 
+    def restore(self, order, values, section_offsets, records=False, arrays=False):
+        """
+        Rebuild lazily parsed meta from section values decoded earlier (e.g. by XBGCache).
+        FILE_BACKED_SECTIONS are not part of values, they are read again from their offsets.
+        """
+        self._open()
+        self._records = records
+        self._arrays = arrays
+        self.section_offsets = dict(section_offsets)
+        self.meta = LazyMeta(list(order), dict(values), self._file_backed_loaders())
         return self.meta
+
+    def _iter_skeleton_events(self):
+        for skeleton in range(self._reader.u32()):
+            for node in range(self._reader.u32()):
+                offset = self._reader.tell()
+                yield ParseEvent(EParseEvent.SkeletonNode, "skeletons", offset, (skeleton, node), self._read_skeleton_node())
+        return {"objectToBone": self._read_object_to_bone()}
+
+    def _iter_scene_mesh_events(self):
+        for lod in range(self.meta["geomParams"]["lodCount"]):
+            for mesh in range(self._reader.u32()):
+                offset = self._reader.tell()
+                header = self._read_scene_mesh_header()
+                yield ParseEvent(EParseEvent.SceneMesh, "meshes", offset, (lod, mesh), header)
+
+                for draw_range in range(header["numRanges"]):
+                    offset = self._reader.tell()
+                    data = self._read_draw_call_range()
+                    yield ParseEvent(EParseEvent.DrawCallRange, "meshes", offset, (lod, mesh, draw_range), data)
+        return None
+
+    def _buffer_event(self, section, index, path, extents):
+        vbuf_offset, vbuf_size, ibuf_offset, ibuf_size = extents
+        data = {
+            "path": path,
+            "vertexBufferOffset": vbuf_offset,
+            "vbuf_size": vbuf_size,
+            "indexBufferOffset": ibuf_offset,
+            "ibuf_size": ibuf_size,
+        }
+        return ParseEvent(EParseEvent.Buffer, section, vbuf_offset - 4, (index,), data)
+
+    def _iter_buffer_events(self):
+        # gfxBuffer indices of the .xbg buffers start after the .xbgmip ones when parse() finds the .xbgmip,
+        # that is only known from the mip section after the buffers
+        start = self._reader.tell()
+        self._skip_buffers()
+        self.meta["mip"] = self._read_mip()
+        self.meta["mipResourceFound"] = self._find_mip_resource()
+        first = self.meta["mipCount"] if self.meta["mipResourceFound"] else 0
+        self._reader.seek(start)
+
+        numBuffer = self._reader.u32()
+        for i in range(numBuffer):
+            extents = self._read_buffer_extents(self._reader)
+            yield self._buffer_event("buffers", first + i, self.file_path, extents)
+        return {"numBuffer": numBuffer}
+
+    def _iter_mip_buffer_events(self):
+        if not self.meta["mipResourceFound"]:
+            return
+        self._mip_offsets = self._index_mip_buffers()
+        for i, extents in enumerate(self._mip_offsets):
+            yield self._buffer_event("mip", i, self._mip_path, extents)
+
+    def iter_events(self, decode=(), records=False, arrays=False):
+        """
+        Walk the file and yield ParseEvents instead of building the nested meta.
+
+        Every top-level section is framed by SectionStart/SectionEnd. Skeleton nodes, scene meshes (without
+        their ranges), draw call ranges and gfx buffers come as individual events, buffers only as offset/size
+        descriptors into the .xbg or .xbgmip. SectionEnd carries the decoded value of the other sections;
+        EVENT_SKIPPED_SECTIONS are skipped and have a None value unless they are listed in decode.
+        Only the small sections are kept, so memory stays flat and the walk can be stopped at any point.
+        records and arrays select the same representations as in parse() for the values of SectionEnd; the
+        skeleton node, scene mesh and draw call range events follow records only, with arrays=True skeleton
+        nodes still come one at a time as dicts or records rather than as per-skeleton tables.
+        """
+        self._open()
+        self._records = records
+        self._arrays = arrays
+        self.meta = {}
+        streams = {
+            "skeletons": self._iter_skeleton_events,
+            "meshes": self._iter_scene_mesh_events,
+            "buffers": self._iter_buffer_events,
+        }
+
+        # also unmapped when the caller stops iterating early
+        try:
+            for key, read, skip in self._sections():
+                offset = self._reader.tell()
+                yield ParseEvent(EParseEvent.SectionStart, key, offset, None, None)
+
+                if key in streams:
+                    value = yield from streams[key]()
+                elif key in EVENT_SKIPPED_SECTIONS and key not in decode:
+                    value = None
+                    skip()
+                else:
+                    value = self.meta[key] = read()
+                    if key == "mip":
+                        yield from self._iter_mip_buffer_events()
+
+                yield ParseEvent(EParseEvent.SectionEnd, key, offset, None, value)
+        finally:
+            self._close_readers()
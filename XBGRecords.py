@@ -0,0 +1,129 @@
+from collections.abc import Mapping
+
+
+# Bit order of the scene mesh fvf, see MeshFVF in xbg_new.bt
+FVF_FLAGS = (
+    "Point", "PointComp", "UV", "UVComp1", "Skin", "SkinExtra", "SkinRigid", "NormalComp",
+    "Color", "TangentComp", "BinormalComp", "PackedFirstUV", "UVComp2", "UVComp3", "Normal",
+    "NormalModifiedComp",
+)
+
+
+class Record(Mapping):
+    """
+    Compact parsed entity, emitted by XBGParser.parse(records=True) instead of a dict.
+    Fields are __slots__ read as attributes, or by key exactly like the default dict shape.
+    Records are mutable: the parser fills some fields in after construction, so assigning a slot
+    by key works, while computed keys and unknown keys raise KeyError.
+    """
+
+    __slots__ = ()
+    # keys of the equivalent dict in parse() order: the slots plus any computed fields
+    _keys = ()
+
+    def __init__(self, *args, **kwargs):
+        for name, value in zip(self.__slots__, args):
+            setattr(self, name, value)
+        for name in self.__slots__[len(args):]:
+            setattr(self, name, kwargs.pop(name, None))
+        if kwargs:
+            raise TypeError(f"{type(self).__name__} has no fields {', '.join(kwargs)}")
+
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __reduce__(self):
+        return type(self), tuple(getattr(self, name) for name in self.__slots__)
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    def as_dict(self):
+        """The dict parse() emits without records=True, nested records included"""
+        return {key: _as_dict(self[key]) for key in self._keys}
+
+
+def _as_dict(value):
+    if isinstance(value, Record):
+        return value.as_dict()
+    if isinstance(value, list):
+        return [_as_dict(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _as_dict(v) for k, v in value.items()}
+    return value
+
+
+class Sphere(Record):
+    __slots__ = ("center", "radius")
+    _keys = __slots__
+
+
+class SkeletonNode(Record):
+    __slots__ = ("boneLOD", "position", "rotation", "parent", "matrixIndex", "id", "name")
+    _keys = __slots__
+
+
+class BasicDrawCall(Record):
+    __slots__ = ("vertexBufferByteOffset", "primitiveCount", "indexCount", "indexBufferStartIndex",
+                 "vertexCount", "minIndexValue", "maxIndexValue", "groupCount")
+    _keys = __slots__
+
+
+class DrawCallRange(Record):
+    __slots__ = ("drawCall", "boundingSphere", "bboxMin", "bboxMax", "name", "skinIndex", "attachedBoneIndex")
+    _keys = __slots__
+
+
+class SceneMesh(Record):
+    """Scene mesh whose FVF flags are properties computed from fvf rather than stored"""
+
+    __slots__ = ("boundingSphere", "bboxMin", "bboxMax", "primitiveType", "materialIndex", "fvf", "vertexSize",
+                 "unk9", "unk10", "boneMapIndex", "mergedRanges", "numRanges", "numSkins", "unk13", "ranges")
+    _keys = __slots__[:10] + FVF_FLAGS + __slots__[10:]
+
+
+def _fvf_flag(bit):
+    return property(lambda self: (self.fvf >> bit) & 1)
+
+
+for _bit, _flag in enumerate(FVF_FLAGS):
+    setattr(SceneMesh, _flag, _fvf_flag(_bit))
+
+
+class Particle(Record):
+    __slots__ = ("name", "radius", "isAttached", "teleportParentBoneIndex", "texCoordinate")
+    _keys = __slots__
+
+
+class Spring(Record):
+    __slots__ = ("index1", "index2", "springType")
+    _keys = __slots__
+
+
+class SphereLimit(Record):
+    __slots__ = ("primitive", "particleIndex", "offset", "radius")
+    _keys = __slots__
+
+
+class BoxLimit(Record):
+    __slots__ = ("primitive", "particleIndex", "offset", "halfRange")
+    _keys = __slots__
+
+
+class CylinderLimit(Record):
+    __slots__ = ("primitive", "particleIndex", "offset", "localDirection", "length", "radius")
+    _keys = __slots__
@@ -1,15 +1,24 @@
-import math
 import sys
 import bpy
-import bmesh
 import os
+import time
 import mathutils
+import numpy as np
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 
 # Add XBG parser path
 sys.path.append(r"C:\Users\mllee\PycharmProjects\XBG_Deserialize")
-import BinaryReader
+import MeshDecoder
+import SkeletonPose
+import Skinning
 from XBGParser import XBGParser
 
+# Mesh datablocks by MeshDecoder.range_hash, shared by every object (and every import) with that geometry
+shared_meshes = {}
+# Armature datablocks by SkeletonPose.skeleton_hash, shared by every import with that skeleton
+shared_armatures = {}
+
 
 # --------------------------
 # Core Helper Functions (No Nesting)
@@ -24,22 +33,6 @@ def create_collection(name, parent_collection=None):
     return new_col
 
 
-def reset_reader(reader, buffer_data):
-    """Reset binary reader to start of buffer"""
-    reader.set_buffer(buffer_data)
-    reader.seek(0)
-
-
-def prune_unused_vertices(bm):
-    """Remove unused vertices from BMesh"""
-    unused_verts = [v for v in bm.verts if not v.link_faces and not v.link_edges]
-    for v in unused_verts:
-        bm.verts.remove(v)
-    bm.verts.ensure_lookup_table()
-    bm.faces.ensure_lookup_table()
-    return bm
-
-
 def full_cleanup():
     """Clear all objects and non-default collections"""
     # Delete all objects
@@ -53,27 +46,115 @@ def full_cleanup():
 
 
 def precompute_bone_mapping(xbg_data):
-    """Precompute bone index mapping to avoid repeated lookups (MAJOR OPTIMIZATION)"""
-    bone_mapping = []
+    """Precompute the matrix index -> skeleton bone table once per import (-1 for unused matrix indices)"""
     if not xbg_data.get("skeletons") or not xbg_data["skeletons"].get("skeletons"):
-        return bone_mapping
-
-    skeleton = xbg_data["skeletons"]["skeletons"][0]
-    if len(xbg_data["bonePalettes"]) > 0:
-        for _ in range(len(xbg_data["bonePalettes"])):
-            bone_map_reorder = {}
-            for bone_id, bone_data in enumerate(skeleton):
-                matrix_index = bone_data["matrixIndex"]
-                bone_map_reorder[matrix_index] = bone_id
-            bone_mapping.append(bone_map_reorder)
-    else:
-        bone_map_reorder = {}
-        for bone_id, bone_data in enumerate(skeleton):
-            matrix_index = bone_data["matrixIndex"]
-            bone_map_reorder[matrix_index] = bone_id
-        bone_mapping.append(bone_map_reorder)
+        return np.empty(0, dtype=np.int64)
+
+    return Skinning.bone_of_matrix(xbg_data["skeletons"]["skeletons"][0])
+
+
+def assign_vertex_groups(mesh_obj, group_names, vertices, bones, weights):
+    """Add the influences to one vertex group per bone, with one add call per distinct (bone, weight)"""
+    order = np.lexsort((weights, bones))
+    vertices, bones, weights = vertices[order], bones[order], weights[order]
+    starts = np.flatnonzero(np.diff(bones, prepend=-1) | np.diff(weights, prepend=-1.0).astype(bool))
+    ends = np.append(starts[1:], len(order))
+
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        vertex_group_name = group_names[bones[start]]
+        vertex_group = mesh_obj.vertex_groups.get(vertex_group_name)
+        if vertex_group is None:
+            vertex_group = mesh_obj.vertex_groups.new(name=vertex_group_name)
+        vertex_group.add(vertices[start:end].tolist(), float(weights[start]), 'ADD')
+
+
+def palette_bone_names(xbg, mesh, bone_mapping):
+    """Skeleton bone name behind every vertex bone index of a skinned mesh, None where there is no bone"""
+    if not (mesh["Skin"] or mesh["SkinRigid"]):
+        return []
+    group_names = [node["name"] for node in xbg["skeletons"]["skeletons"][0]]
+    return [group_names[bone] if bone >= 0 else None
+            for bone in Skinning.palette_bone_table(xbg, mesh, bone_mapping).tolist()]
+
+
+def shared_mesh_data(mesh_key):
+    """Mesh datablock and vertex group names created for a range hash, None if there is none (or it was deleted)"""
+    entry = shared_meshes.get(mesh_key)
+    if entry is None:
+        return None
+    try:
+        entry[0].name
+    except ReferenceError:
+        del shared_meshes[mesh_key]
+        return None
+    return entry
+
+
+def instance_mesh_object(skin_name, mesh_data, group_names):
+    """New object on an existing mesh datablock; vertex group names live on the object so they are re-created"""
+    mesh_obj = bpy.data.objects.new(skin_name, mesh_data)
+    for group_name in group_names:
+        mesh_obj.vertex_groups.new(name=group_name)
+    return mesh_obj
+
+
+def index_tagged_meshes():
+    """Put the mesh datablocks of earlier imports (e.g. in a reopened .blend) back into shared_meshes"""
+    for mesh_data in bpy.data.meshes:
+        mesh_key = mesh_data.get("xbg_mesh_hash")
+        if mesh_key is not None and shared_mesh_data(mesh_key) is None:
+            group_names = mesh_data.get("xbg_vertex_groups", "")
+            shared_meshes[mesh_key] = (mesh_data, group_names.split("\n") if group_names else [])
+
+
+def remove_mesh_object(mesh_obj):
+    """Remove an imported object, and its mesh datablock if nothing else uses it"""
+    mesh_data = mesh_obj.data
+    bpy.data.objects.remove(mesh_obj)
+    if mesh_data is not None and mesh_data.users == 0:
+        bpy.data.meshes.remove(mesh_data)
+
+
+def node_collection(nodes, node, name, parent_collection):
+    """
+    Collection of an import tree node ("LOD0/1/2" = LOD, vertex group, submesh), tagged with the node.
+    Reuses (and renames if needed) the one in nodes from an earlier import of the file.
+    """
+    collection = nodes.get(node)
+    if collection is None:
+        collection = nodes[node] = create_collection(name, parent_collection)
+    elif collection.get("xbg_name") != name:
+        collection.name = name
+    collection["xbg_node"] = node
+    collection["xbg_name"] = name
+    return collection
+
+
+def find_import_root(xbg_path):
+    """Root collection of an earlier import of the file, None if it hasn't been imported"""
+    xbg_path = os.path.normcase(os.path.abspath(xbg_path))
+    for collection in bpy.data.collections:
+        if collection.get("xbg_path") == xbg_path:
+            return collection
+    return None
+
+
+def shared_armature_data(skeleton_key):
+    """Armature datablock built for a skeleton hash, also found by its tag after the .blend was reopened"""
+    armature_data = shared_armatures.get(skeleton_key)
+    if armature_data is not None:
+        try:
+            armature_data.name
+            return armature_data
+        except ReferenceError:
+            del shared_armatures[skeleton_key]
+
+    for armature_data in bpy.data.armatures:
+        if armature_data.get("xbg_skeleton_hash") == skeleton_key:
+            shared_armatures[skeleton_key] = armature_data
+            return armature_data
+    return None
 
-    return bone_mapping
 
 def create_armature(xbg_data, parent_collection):
     """
@@ -93,6 +174,15 @@ def create_armature(xbg_data, parent_collection):
         print("⚠️ 骨架数据为空，跳过Armature创建")
         return None
 
+    # 相同骨架（骨骼名称、父子关系、本地变换）只构建一次，之后的导入直接共享Armature数据
+    skeleton_key = SkeletonPose.skeleton_hash(skeleton_data)
+    armature_data = shared_armature_data(skeleton_key)
+    if armature_data is not None:
+        armature_obj = bpy.data.objects.new(name="XBG_Armature", object_data=armature_data)
+        parent_collection.objects.link(armature_obj)
+        print(f"✅ 复用已有Armature {armature_data.name}，共 {len(armature_data.bones)} 个骨骼")
+        return armature_obj
+
     # 1. 创建Armature数据和对象
     armature_data = bpy.data.armatures.new(name="XBG_Armature")
     armature_obj = bpy.data.objects.new(name="XBG_Armature", object_data=armature_data)
@@ -107,13 +197,13 @@ def create_armature(xbg_data, parent_collection):
     # 存储创建的编辑模式骨骼（用于父子绑定）
     edit_bones = {}
 
-    # 4. 遍历所有骨骼创建（按顺序，确保父骨骼先创建）
+    # 4. 所有骨骼的世界矩阵由SkeletonPose按层级批量计算（不要求父骨骼排在子骨骼之前）
+    world_matrices = SkeletonPose.skeleton_world_matrices(skeleton_data)
+    _, _, parents = SkeletonPose.skeleton_arrays(skeleton_data)
+
     for bone_idx, bone_info in enumerate(skeleton_data):
         # 获取骨骼基础信息
         bone_name = bone_info["name"] if bone_info["name"] else f"Bone_{bone_idx}"
-        parent_idx = bone_info["parent"]
-        local_pos = bone_info["position"]  # 相对于父骨骼本地空间的位置
-        local_rot = bone_info["rotation"]  # [x,y,z,w] 四元数（相对于父骨骼本地空间的旋转）
 
         # 5. 创建编辑模式骨骼
         edit_bone = armature_data.edit_bones.new(bone_name)
@@ -121,43 +211,24 @@ def create_armature(xbg_data, parent_collection):
         # 6. 基础设置：骨骼长度（避免零长度）
         edit_bone.tail = edit_bone.head + mathutils.Vector((0.0, 0.1, 0.0))
 
-        # 7. 构建子骨骼的本地变换矩阵（相对父骨骼）
-        # 7.1 转换XBG四元数到Blender格式 (w,x,y,z)
-        bone_rot_quat = mathutils.Quaternion((
-            local_rot[3],  # w
-            local_rot[0],  # x
-            local_rot[1],  # y
-            local_rot[2]  # z
-        ))
-
-        # 7.2 转换XBG本地位置到Blender向量
-        local_pos_vec = mathutils.Vector((local_pos[0], local_pos[1], local_pos[2]))
+        # 7. 世界矩阵 = 父骨骼世界矩阵 × 本地变换（位置 + 旋转），已预先算好
+        edit_bone.matrix = mathutils.Matrix(world_matrices[bone_idx].tolist())
 
-        # 7.3 创建子骨骼的本地变换矩阵（位置 + 旋转）
-        local_transform = mathutils.Matrix.Translation(local_pos_vec) @ bone_rot_quat.to_matrix().to_4x4()
-
-        # 8. 处理父子关系（核心：基于父骨骼本地空间计算最终矩阵）
-        if parent_idx != 0xFFFF and parent_idx in edit_bones:
-            # 8.1 获取父骨骼
-            parent_bone = edit_bones[parent_idx]
-
-            # 8.2 设置父子关系
-            edit_bone.parent = parent_bone
-
-            # 8.3 子骨骼的最终矩阵 = 父骨骼的本地矩阵 × 子骨骼的本地变换矩阵
-            # （子骨骼的位置/旋转完全基于父骨骼的本地空间）
-            edit_bone.matrix = parent_bone.matrix @ local_transform
-        else:
-            # 根骨骼：直接使用本地变换矩阵（相对于世界空间）
-            edit_bone.matrix = local_transform
-
-        # 9. 存储编辑骨骼引用
+        # 8. 存储编辑骨骼引用
         edit_bones[bone_idx] = edit_bone
 
+    # 9. 所有骨骼创建后再设置父子关系（根骨骼的parent为-1）
+    for bone_idx, parent_idx in enumerate(parents.tolist()):
+        if parent_idx >= 0:
+            edit_bones[bone_idx].parent = edit_bones[parent_idx]
+
     # 10. 退出编辑模式，进入姿势模式
-    print(f"{edit_bones[9].name}: {edit_bones[9].matrix}")
     bpy.ops.object.mode_set(mode='OBJECT')
 
+    # 记录骨架哈希，供后续导入复用
+    armature_data["xbg_skeleton_hash"] = skeleton_key
+    shared_armatures[skeleton_key] = armature_data
+
     # 11. （可选）验证：设置姿势模式骨骼的旋转（确保动画兼容）
     for bone_idx, bone_info in enumerate(skeleton_data):
         bone_name = bone_info["name"] if bone_info["name"] else f"Bone_{bone_idx}"
@@ -170,192 +241,42 @@ def create_armature(xbg_data, parent_collection):
     return armature_obj
 
 
-def read_vertex_data(vertex_reader, vertex_buffer, mesh, pos_min, pos_range, uv_decomp_xy, uv_decomp_zw):
-    """Read vertex positions and UVs (single-purpose function) - FIXED: Pass vertex_buffer explicitly"""
-
-    vertex_offset = mesh["mergedRanges"]["vertexBufferByteOffset"]
-    vertex_count = mesh["mergedRanges"]["vertexCount"]
-    vertex_size = mesh["vertexSize"]
-
-    reset_reader(vertex_reader, vertex_buffer)  # Fixed: Use passed vertex_buffer instead of reader.buffer
-    vertex_reader.seek(vertex_offset)
-
-    positions = []
-    position_extra = []
-    uv0 = []
-    uv1 = []
-    bone_indices = []
-    bone_weights = []
-    normal = []
-    normal_modified = []
-    color = []
-
-    for _ in range(vertex_count):
-        read_bytes = 0
-        # Read position (skip w component)
-
-        if mesh["Point"]:
-            x = vertex_reader.f32()
-            y = vertex_reader.f32()
-            z = vertex_reader.f32()
-            w = vertex_reader.f32()
-            positions.append((x, y, z))
-            read_bytes += 16
-
-        if mesh["PointComp"]:
-            x = vertex_reader.i16() * pos_range + pos_min
-            y = vertex_reader.i16() * pos_range + pos_min
-            z = vertex_reader.i16() * pos_range + pos_min
-            w = vertex_reader.i16()
-            positions.append((x, y, z))
-            read_bytes += 8
-
-        # UV needs wrap address mode, dunno why
-        # Flipped V because blender is fucking stupid
-        # Read UV0
-        if mesh["UVComp1"]:
-            uv0_u = (vertex_reader.i16() * uv_decomp_zw + uv_decomp_xy) % 1.0
-            uv0_v = (-vertex_reader.i16() * uv_decomp_zw + uv_decomp_xy) % 1.0
-            uv0.append((uv0_u, uv0_v))
-            read_bytes += 4
-
-        # Read UV1
-        if mesh["UVComp2"]:
-            uv1_u = (vertex_reader.i16() * uv_decomp_zw + uv_decomp_xy) % 1.0
-            uv1_v = (-vertex_reader.i16() * uv_decomp_zw + uv_decomp_xy) % 1.0
-            uv1.append((uv1_u, uv1_v))
-            read_bytes += 4
-
-        # There is no UV2 in WD1
-        # if mesh["UVComp3"]:
-
-        if mesh["Skin"]:
-            w0 = vertex_reader.u8() / 255.0
-            w1 = vertex_reader.u8() / 255.0
-            w2 = vertex_reader.u8() / 255.0
-            w3 = vertex_reader.u8() / 255.0
-
-            b0 = vertex_reader.u8()
-            b1 = vertex_reader.u8()
-            b2 = vertex_reader.u8()
-            b3 = vertex_reader.u8()
-            read_bytes += 8
-
-            if mesh["SkinExtra"]:
-                w4 = vertex_reader.u8() / 255.0
-                w5 = vertex_reader.u8() / 255.0
-                b4 = vertex_reader.u8()
-                b5 = vertex_reader.u8()
-                read_bytes += 4
-                bone_indices.append((b0, b1, b2, b3, b4, b5))
-                bone_weights.append((w0, w1, w2, w3, w4, w5))
-            else:
-                bone_indices.append((b0, b1, b2, b3))
-                bone_weights.append((w0, w1, w2, w3))
+def update_armature(xbg_data, root_collection):
+    """
+    Armature of a re-imported file: the one of the last import while its skeleton hash still matches,
+    otherwise it is removed (with its datablock once unused) and create_armature shares or builds one.
+    """
+    skeletons = xbg_data.get("skeletons")
+    skeleton_data = skeletons["skeletons"][0] if skeletons and skeletons.get("skeletons") else None
+    skeleton_key = SkeletonPose.skeleton_hash(skeleton_data) if skeleton_data else None
+
+    armature_objs = [obj for obj in root_collection.objects if obj.data is not None and "xbg_skeleton_hash" in obj.data]
+    if [obj.data["xbg_skeleton_hash"] for obj in armature_objs] == ([skeleton_key] if skeleton_key else []):
+        return armature_objs[0] if armature_objs else None
+
+    for armature_obj in armature_objs:
+        armature_data = armature_obj.data
+        bpy.data.objects.remove(armature_obj)
+        if armature_data.users == 0:
+            shared_armatures.pop(armature_data["xbg_skeleton_hash"], None)
+            bpy.data.armatures.remove(armature_data)
+    print("Skeleton changed, replacing the armature")
+    return create_armature(xbg_data, root_collection)
+
+
+def read_vertex_data(vertex_buffer, mesh, pos_min, pos_range, uv_decomp_xy, uv_decomp_zw):
+    """Read vertex positions and UVs (single-purpose function) - decoded as whole arrays by MeshDecoder"""
+    return MeshDecoder.decode_vertices(vertex_buffer, mesh, pos_min, pos_range, uv_decomp_xy, uv_decomp_zw)
 
-        if mesh["SkinRigid"]:
-            w0 = 1.0
-            if mesh["BinormalComp"]:
-                b0 = int(math.floor(w / 256.0))
-            else:
-                b0 = w
-            bone_indices.append((b0, 0, 0, 0))
-            bone_weights.append((w0, 0.0, 0.0, 0.0))
-
-        if mesh["NormalComp"]:
-            n0 = vertex_reader.u8() / 255.0
-            n1 = vertex_reader.u8() / 255.0
-            n2 = vertex_reader.u8() / 255.0
-            n3 = vertex_reader.u8() / 255.0 #alpha
-
-            n0 = n0 * 2.0 - 1.0
-            n1 = n1 * 2.0 - 1.0
-            n2 = n2 * 2.0 - 1.0
-
-            normalizer = math.sqrt(n0*n0 + n1*n1 + n2*n2)
-            
-            normal.append((n2 / normalizer, n1 / normalizer, n0 / normalizer))
-            read_bytes += 4
-
-        if mesh["Color"]:
-            c0 = vertex_reader.u8() / 255.0
-            c1 = vertex_reader.u8() / 255.0
-            c2 = vertex_reader.u8() / 255.0
-            c3 = vertex_reader.u8() / 255.0  # alpha
-
-            color.append((c2, c1, c0, c3))
-            read_bytes += 4
-
-        #not used for blender, but alpha is used for some stuff
-        if mesh["TangentComp"]:
-            n0 = vertex_reader.u8() / 255.0
-            n1 = vertex_reader.u8() / 255.0
-            n2 = vertex_reader.u8() / 255.0
-            n3 = vertex_reader.u8() / 255.0 #alpha
-            read_bytes += 4
-
-        #not used for blender, but alpha is used for some stuff
-        if mesh["BinormalComp"]:
-            n0 = vertex_reader.u8() / 255.0
-            n1 = vertex_reader.u8() / 255.0
-            n2 = vertex_reader.u8() / 255.0
-            n3 = vertex_reader.u8() / 255.0 #alpha
-            read_bytes += 4
-
-        if mesh["NormalModifiedComp"]:
-            n0 = vertex_reader.u8() / 255.0
-            n1 = vertex_reader.u8() / 255.0
-            n2 = vertex_reader.u8() / 255.0
-            n3 = vertex_reader.u8() / 255.0  # alpha
-
-            n0 = n0 * 2.0 - 1.0
-            n1 = n1 * 2.0 - 1.0
-            n2 = n2 * 2.0 - 1.0
-
-            normalizer = math.sqrt(n0 * n0 + n1 * n1 + n2 * n2)
-
-            normal_modified.append((n2 / normalizer, n1 / normalizer, n0 / normalizer))
-            read_bytes += 4
-
-        vertex_reader.skip(vertex_size - read_bytes)
-
-
-    # Prepare UV sets for return
-    uv_sets = []
-    uv_set_names = []
-    if mesh["UVComp1"]:
-        uv_sets.append(uv0)
-        uv_set_names.append("uv0")
-    if mesh["UVComp2"]:
-        uv_sets.append(uv1)
-        uv_set_names.append("uv1")
-
-    return positions, uv_sets, uv_set_names, bone_indices, bone_weights, normal, normal_modified, color
-
-
-def read_indices(index_reader, index_buffer, idx_offset, idx_count, primitive_type):
-    """Read index data (single-purpose function)"""
-    reset_reader(index_reader, index_buffer)  # Uses passed index_buffer (correct)
-    index_reader.seek(idx_offset)
-
-    indices_list = []
-    used_indices = set()
-
-    if primitive_type.name == "TriangleList":
-        for _ in range(idx_count // 3):
-            a, b, c = index_reader.u16(), index_reader.u16(), index_reader.u16()
-            used_indices.update([c, b, a])
-            indices_list.append((c, b, a))
-    elif primitive_type.name == "TriangleStrip":
-        indices = [index_reader.u16() for _ in range(idx_count)]
-        for i in range(2, len(indices)):
-            if i % 2 == 0:
-                a, b, c = indices[i - 2], indices[i - 1], indices[i]
-            else:
-                a, b, c = indices[i - 1], indices[i - 2], indices[i]
-            indices_list.append((a, b, c))
 
-    return indices_list, used_indices
+def read_indices(index_buffer, idx_offset, idx_count, primitive_type):
+    """Read index data (single-purpose function) - decoded as whole arrays by MeshDecoder"""
+    return MeshDecoder.decode_indices(index_buffer, idx_offset, idx_count, primitive_type)
+
+
+def flat_buffer(values, dtype):
+    """Contiguous flat copy in the element type foreach_set expects, so Blender can take the buffer directly"""
+    return np.ascontiguousarray(values, dtype=dtype).ravel()
 
 
 def create_mesh_object(positions, mesh, xbg, bone_mapping, indices_list, used_indices, uv_sets, uv_set_names, skin_name, bone_indices, bone_weights, normal, normal_modified, color):
@@ -396,17 +317,32 @@ def create_mesh_object(positions, mesh, xbg, bone_mapping, indices_list, used_in
     """
 
     mesh_data = bpy.data.meshes.new(skin_name)
-    mesh_data.from_pydata(positions, [], indices_list)
-    mesh_data.update()
+    mesh_data.vertices.add(len(positions))
+    mesh_data.vertices.foreach_set("co", flat_buffer(positions, np.float32))
+
+    if indices_list.shape[1] == 2:
+        # line primitives
+        mesh_data.edges.add(len(indices_list))
+        mesh_data.edges.foreach_set("vertices", flat_buffer(indices_list, np.int32))
+        loop_vertices = np.empty(0, dtype=np.int64)
+    else:
+        # triangles: loop i belongs to face i // 3, loop -> vertex is just the flattened index list
+        loop_vertices = indices_list.ravel()
+        face_count = len(indices_list)
+        mesh_data.loops.add(len(loop_vertices))
+        mesh_data.loops.foreach_set("vertex_index", flat_buffer(loop_vertices, np.int32))
+        mesh_data.polygons.add(face_count)
+        mesh_data.polygons.foreach_set("loop_start", np.arange(0, len(loop_vertices), 3, dtype=np.int32))
+        if bpy.app.version < (4, 0, 0):
+            mesh_data.polygons.foreach_set("loop_total", np.full(face_count, 3, dtype=np.int32))
+    mesh_data.update(calc_edges=True)
 
     mesh_obj = bpy.data.objects.new(skin_name, mesh_data)
 
-    for uv_set_idx, name in enumerate(uv_set_names):
-        uv_layer = mesh_data.uv_layers.new(name=name)
-        for poly in mesh_data.polygons:
-            for loop_idx in poly.loop_indices:
-                vert_idx = mesh_data.loops[loop_idx].vertex_index
-                uv_layer.data[loop_idx].uv = uv_sets[uv_set_idx][vert_idx]
+    if len(loop_vertices):
+        for uv_set_idx, name in enumerate(uv_set_names):
+            uv_layer = mesh_data.uv_layers.new(name=name)
+            uv_layer.data.foreach_set("uv", flat_buffer(uv_sets[uv_set_idx][loop_vertices], np.float32))
     """
     loop_normal = [None] * len(mesh_data.loops)
     for poly in mesh_data.polygons:
@@ -414,12 +350,13 @@ def create_mesh_object(positions, mesh, xbg, bone_mapping, indices_list, used_in
             vert_idx = mesh_data.loops[loop_idx].vertex_index
             loop_normal[loop_idx] = normal[vert_idx]
     """
-    mesh_obj.data.polygons.foreach_set("use_smooth", [True] * len(mesh_obj.data.polygons))
-    mesh_obj.data.normals_split_custom_set_from_vertices(normal)
+    mesh_obj.data.polygons.foreach_set("use_smooth", np.ones(len(mesh_obj.data.polygons), dtype=bool))
+    if len(normal):
+        mesh_obj.data.normals_split_custom_set_from_vertices(flat_buffer(normal, np.float32).reshape(-1, 3))
     #mesh_obj.data.loops.foreach_set("normal", loop_normal)
     #mesh_obj.data.vertex_normals.foreach_set("vector", normal)
 
-    if mesh["NormalModifiedComp"]:
+    if mesh["NormalModifiedComp"] and len(loop_vertices):
         normal_layer_name = 'normal_modified'
         if normal_layer_name not in  mesh_obj.data.attributes:
             normal_attr = mesh_obj.data.attributes.new(
@@ -430,10 +367,7 @@ def create_mesh_object(positions, mesh, xbg, bone_mapping, indices_list, used_in
         else:
             normal_attr = mesh_obj.data.attributes[normal_layer_name]
 
-        for poly in mesh_data.polygons:
-            for loop_idx in poly.loop_indices:
-                vert_idx = mesh_data.loops[loop_idx].vertex_index
-                normal_attr.data[loop_idx].vector = normal_modified[vert_idx]
+        normal_attr.data.foreach_set("vector", flat_buffer(normal_modified[loop_vertices], np.float32))
 
     mesh_obj.data.update()
 
@@ -442,27 +376,20 @@ def create_mesh_object(positions, mesh, xbg, bone_mapping, indices_list, used_in
         if mesh["SkinExtra"]:
             bone_count = 6
 
-        for i in range(mesh["mergedRanges"]["minIndexValue"], mesh["mergedRanges"]["maxIndexValue"] + 1):
-            for j in range(bone_count):
-                if bone_weights[i][j] != 0.0:
-                    if mesh["boneMapIndex"] == 0xFFFFFFFF:
-                        boneIndex = bone_indices[i][j]
-                        boneIndex = bone_mapping[0][boneIndex]
-                        vertex_group_name = xbg["skeletons"]["skeletons"][0][boneIndex]["name"]
-                    else:
-                        boneMap = xbg["bonePalettes"][mesh["boneMapIndex"]]
-                        #print(f"Bone Map Index: {len(boneMap)} {mesh['boneMapIndex']} Bone Index: {bone_indices[i][j]} {i}")
-                        #print(f"Mesh material: {mesh['materialIndex']}")
-                        boneIndex = boneMap[bone_indices[i][j]]
-                        boneIndex = bone_mapping[mesh["boneMapIndex"]][boneIndex]
-                        vertex_group_name = xbg["skeletons"]["skeletons"][0][boneIndex]["name"]
-
-                    if vertex_group_name not in mesh_obj.vertex_groups:
-                        mesh_obj.vertex_groups.new(name=vertex_group_name)
-                    else:
-                        mesh_obj.vertex_groups[vertex_group_name]
-
-                    mesh_obj.vertex_groups[vertex_group_name].add([i], bone_weights[i][j], 'ADD')
+        # palette -> skeleton bone resolved once for the mesh, influences of all vertices gathered at once
+        bone_table = Skinning.palette_bone_table(xbg, mesh, bone_mapping)
+        weights = bone_weights[:, :bone_count]
+        vertices, influences = np.nonzero(weights)
+        local_bones = bone_indices[vertices, influences]
+        bones = np.full(len(local_bones), -1, dtype=np.int64)
+        in_palette = local_bones < len(bone_table)
+        bones[in_palette] = bone_table[local_bones[in_palette]]
+
+        # influences without a skeleton bone have no group to go to
+        mapped = bones >= 0
+        group_names = [node["name"] for node in xbg["skeletons"]["skeletons"][0]]
+        assign_vertex_groups(mesh_obj, group_names, vertices[mapped], bones[mapped],
+                             weights[vertices, influences][mapped])
 
     if mesh["Color"]:
         color_layer_name = 'color'
@@ -475,18 +402,7 @@ def create_mesh_object(positions, mesh, xbg, bone_mapping, indices_list, used_in
         else:
             color_attr = mesh_data.color_attributes[color_layer_name]
 
-        for i in range(len(positions)):
-            color_attr.data[i].color = color[i]
-
-    #bm.free()
-    bm = bmesh.new()
-    bm.from_mesh(mesh_obj.data)
-    bm = prune_unused_vertices(bm)
-    bm.to_mesh(mesh_obj.data)
-    mesh_obj.data.update()
-    bm.free()
-
-
+        color_attr.data.foreach_set("color", flat_buffer(color, np.float32))
 
     return mesh_obj
 
@@ -505,165 +421,638 @@ def get_material_name(meta_data, lod_meshes, submesh_idx, mat_index):
 # --------------------------
 # Main Import Logic (Flat Loop Hierarchy)
 # --------------------------
-def import_xbg(xbg_path):
-    # Parse XBG file
-    xbg_name = os.path.splitext(os.path.basename(xbg_path))[0]
-    parser = XBGParser(xbg_path)
-    meta_data = parser.parse()
-
+def decode_lod(meta_data, lod_index, bone_mapping):
+    """
+    Decode every draw range of one LOD ready for create_mesh_object, grouped like the collections.
+    Touches no bpy data, so it can run in a worker thread while Blender keeps going.
+    """
     # Extract core metadata
-    lod_count = meta_data["geomParams"]["lodCount"]
-    buffers = meta_data["buffers"]["gfxBuffer"]
-    lod_distances = meta_data["geomParams"]["lodDistances"]
     pos_min = meta_data["geomParams"]["meshDecompression"]["positionMin"]
     pos_range = meta_data["geomParams"]["meshDecompression"]["positionRange"]
     uv_decomp_xy = meta_data["geomParams"]["uvDecompression"]["UVDecompressionXY"]
     uv_decomp_zw = meta_data["geomParams"]["uvDecompression"]["UVDecompressionZW"]
 
-    bone_mapping = precompute_bone_mapping(meta_data)
+    # Get LOD buffer data
+    current_buffer = MeshDecoder.lod_buffer(meta_data, lod_index)
+    vertex_buffer = current_buffer["vertexBuffer"]  # This is the raw buffer data
+    index_buffer = current_buffer["indexBuffer"]  # This is the raw buffer data
 
-    # Print basic info
-    print(f"=== XBG Import ===")
-    print(f"File: {xbg_name}")
-    print(f"Total LODs: {lod_count}")
-    print(f"Total Buffers: {len(buffers)}")
-    print(f"==================")
+    # Get LOD meshes
+    lod_meshes = meta_data["meshes"][lod_index]
 
-    # Clean slate
-    full_cleanup()
+    # --------------------------
+    # Group meshes by shared vertex stream (Helper Logic)
+    # --------------------------
+    vertex_groups = {}
+    group_order = []
+    for submesh_idx, scene_mesh in enumerate(lod_meshes):
+        mr = scene_mesh["mergedRanges"]
+        group_key = (mr["vertexBufferByteOffset"], mr["vertexCount"])
+
+        if group_key not in vertex_groups:
+            vertex_groups[group_key] = {
+                "group_idx": len(group_order),
+                "vertex_offset": mr["vertexBufferByteOffset"],
+                "vertex_count": mr["vertexCount"],
+                "vertex_size": scene_mesh["vertexSize"],
+                "primitive_type": scene_mesh["primitiveType"],
+                "submeshes": []
+            }
+            group_order.append(group_key)
+
+        vertex_groups[group_key]["submeshes"].append({
+            "submesh_idx": submesh_idx,
+            "mat_index": scene_mesh["materialIndex"],
+            "draw_ranges": scene_mesh["ranges"]
+        })
 
-    # Create root collection
-    root_collection = create_collection(xbg_name)
+    # --------------------------
+    # Process vertex groups (Level 2 Loop)
+    # --------------------------
+    for group_key in group_order:
+        group = vertex_groups[group_key]
+        primitive_type = group["primitive_type"]
+        mesh = lod_meshes[group["submeshes"][0]["submesh_idx"]]
 
-    armature_obj = create_armature(meta_data, root_collection)
+        # Read vertex data
+        vertices = read_vertex_data(vertex_buffer, mesh, pos_min, pos_range, uv_decomp_xy, uv_decomp_zw)
 
-    # Track progress
-    global_submesh_id = 0
+        # --------------------------
+        # Process submeshes (Level 3 Loop)
+        # --------------------------
+        for submesh_data in group["submeshes"]:
+            submesh_idx = submesh_data["submesh_idx"]
+            scene_mesh = lod_meshes[submesh_idx]
+            bone_names = palette_bone_names(meta_data, scene_mesh, bone_mapping)
 
-    # --------------------------
-    # Process LODs (Level 1 Loop)
-    # --------------------------
-    for lod_index in range(lod_count):
-        # Create LOD collection
-        lod_collection = create_collection(f"LOD{lod_index}", root_collection)
+            # Get material name (DELEGATED TO FUNCTION)
+            submesh_data["material_slot_name"] = get_material_name(meta_data, lod_meshes, submesh_idx, submesh_data["mat_index"])
+            submesh_data["ranges"] = []
 
-        # Get LOD buffer data
-        buffer_idx = min(lod_index, len(buffers) - 1)
-        current_buffer = buffers[buffer_idx]
-        vertex_buffer = current_buffer["vertexBuffer"]  # This is the raw buffer data
-        index_buffer = current_buffer["indexBuffer"]  # This is the raw buffer data
+            # --------------------------
+            # Process draw ranges (Level 4 Loop)
+            # --------------------------
+            for range_idx, draw_range in enumerate(submesh_data["draw_ranges"]):
+                dc = draw_range["drawCall"]
+                idx_offset = dc["indexBufferStartIndex"] * 2
+                idx_count = dc["indexCount"]
 
-        # Initialize readers
-        vertex_reader = BinaryReader.BinaryReader(vertex_buffer)
-        index_reader = BinaryReader.BinaryReader(index_buffer)
+                # Read indices (DELEGATED TO FUNCTION)
+                indices_list, used_indices = read_indices(
+                    index_buffer, idx_offset, idx_count, primitive_type
+                )
 
-        # Get LOD meshes
-        lod_meshes = meta_data["meshes"][lod_index]
+                # Only the vertices this range references go into its mesh, indices remapped onto them
+                range_vertices, indices_list = MeshDecoder.compact_vertices(vertices, indices_list, used_indices)
 
-        # --------------------------
-        # Group meshes by shared vertex stream (Helper Logic)
-        # --------------------------
-        vertex_groups = {}
-        group_order = []
-        for submesh_idx, scene_mesh in enumerate(lod_meshes):
-            mr = scene_mesh["mergedRanges"]
-            group_key = (mr["vertexBufferByteOffset"], mr["vertexCount"])
-
-            if group_key not in vertex_groups:
-                vertex_groups[group_key] = {
-                    "vertex_offset": mr["vertexBufferByteOffset"],
-                    "vertex_count": mr["vertexCount"],
-                    "vertex_size": scene_mesh["vertexSize"],
-                    "primitive_type": scene_mesh["primitiveType"],
-                    "submeshes": []
-                }
-                group_order.append(group_key)
-
-            vertex_groups[group_key]["submeshes"].append({
-                "submesh_idx": submesh_idx,
-                "mat_index": scene_mesh["materialIndex"],
-                "draw_ranges": scene_mesh["ranges"]
-            })
+                submesh_data["ranges"].append({
+                    "range_idx": range_idx,
+                    "skin_name": draw_range["name"]["value"],
+                    "vertices": range_vertices,
+                    "indices": indices_list,
+                    "used_indices": used_indices,
+                    "stream_vertex_count": len(vertices["positions"]),
+                    "mesh_key": MeshDecoder.range_hash(range_vertices, indices_list, scene_mesh["fvf"], *bone_names),
+                })
+
+    return [vertex_groups[group_key] for group_key in group_order]
+
+
+def decoded_ranges(groups):
+    """Draw ranges of a decode_lod result, in build order"""
+    return [range_data for group in groups for submesh_data in group["submeshes"] for range_data in submesh_data["ranges"]]
+
+
+def decoded_bytes(groups):
+    """Size of the decoded arrays of a decode_lod result"""
+    total = 0
+    for range_data in decoded_ranges(groups):
+        arrays = [range_data["indices"], range_data["used_indices"]] + range_data["vertices"]["uvSets"]
+        arrays += [value for name, value in range_data["vertices"].items() if name not in ("uvSets", "uvSetNames")]
+        total += sum(array.nbytes for array in arrays)
+    return total
+
+
+def decode_xbg(xbg_path):
+    """
+    Parse a file and decode every LOD (decode_lod).
+    Touches no bpy data, so it can run in a worker thread while Blender keeps going.
+    """
+    # Parse XBG file; closed once every LOD is decoded, the buffers left in the meta keep the file mapped
+    # only until the decoded result is dropped
+    xbg_name = os.path.splitext(os.path.basename(xbg_path))[0]
+    with XBGParser(xbg_path) as parser:
+        meta_data = parser.parse()
+
+        bone_mapping = precompute_bone_mapping(meta_data)
 
         # --------------------------
-        # Process vertex groups (Level 2 Loop)
+        # Process LODs (Level 1 Loop)
         # --------------------------
-        for group_idx, group_key in enumerate(group_order):
-            group = vertex_groups[group_key]
-            primitive_type = group["primitive_type"]
-
-            # Create vertex group collection
-            group_collection = create_collection(f"Vertex_Group_{group_idx}", lod_collection)
-            mesh = lod_meshes[group["submeshes"][0]["submesh_idx"]]
+        lods = [decode_lod(meta_data, lod_index, bone_mapping) for lod_index in range(meta_data["geomParams"]["lodCount"])]
 
-            # Read vertex data (FIXED: Pass vertex_buffer explicitly)
-            positions, uv_sets, uv_set_names, bone_indices, bone_weights, normal, normal_modified, color= read_vertex_data(
-                vertex_reader, vertex_buffer, mesh, pos_min, pos_range, uv_decomp_xy, uv_decomp_zw
-            )
+    return {
+        "name": xbg_name,
+        "path": os.path.normcase(os.path.abspath(xbg_path)),
+        "meta": meta_data,
+        "bone_mapping": bone_mapping,
+        "lods": lods,
+        "range_count": sum(len(decoded_ranges(groups)) for groups in lods),
+    }
 
-            # --------------------------
-            # Process submeshes (Level 3 Loop)
-            # --------------------------
-            for submesh_data in group["submeshes"]:
-                submesh_idx = submesh_data["submesh_idx"]
-                mat_index = submesh_data["mat_index"]
-                draw_ranges = submesh_data["draw_ranges"]
-
-                # Get material name (DELEGATED TO FUNCTION)
-                material_slot_name = get_material_name(meta_data, lod_meshes, submesh_idx, mat_index)
-
-                # Create submesh collection
-                submesh_collection = create_collection(material_slot_name, group_collection)
-
-                # --------------------------
-                # Process draw ranges (Level 4 Loop)
-                # --------------------------
-                for range_idx, draw_range in enumerate(draw_ranges):
-                    dc = draw_range["drawCall"]
-                    idx_offset = dc["indexBufferStartIndex"] * 2
-                    idx_count = dc["indexCount"]
-
-                    # Read indices (DELEGATED TO FUNCTION)
-                    indices_list, used_indices = read_indices(
-                        index_reader, index_buffer, idx_offset, idx_count, primitive_type
-                    )
 
-                    # Create mesh object (DELEGATED TO FUNCTION)
-                    skin_name = lod_meshes[submesh_idx]["ranges"][range_idx]["name"]["value"]
+def build_lod(meta_data, bone_mapping, lod_index, groups, lod_collection, stats, parent=None, nodes=None, existing=None):
+    """
+    Create the collections and mesh objects of one decode_lod result under lod_collection.
+    A generator yielding every object it creates, so callers can spread the work over several timer ticks.
+    stats counts the created ("submeshes"), the instanced ("instanced") and the kept ("kept") objects.
+
+    Collections and objects are tagged with their node in the import tree, objects also with the hash of
+    their draw range and their material slot. nodes (node -> collection) and existing (node -> object)
+    hold those of an earlier import of the file: objects whose tags still match are kept as they are,
+    the others are replaced. Matched objects are popped from existing, what is left there is stale.
+    """
+    lod_meshes = meta_data["meshes"][lod_index]
+    lod_distances = meta_data["geomParams"]["lodDistances"]
+    nodes = {} if nodes is None else nodes
+    existing = {} if existing is None else existing
+
+    for group in groups:
+        group_idx = group["group_idx"]
+        group_node = f"LOD{lod_index}/{group_idx}"
+
+        # Create vertex group collection
+        group_collection = node_collection(nodes, group_node, f"Vertex_Group_{group_idx}", lod_collection)
+
+        for submesh_data in group["submeshes"]:
+            submesh_idx = submesh_data["submesh_idx"]
+            mat_index = submesh_data["mat_index"]
+            material_slot_name = submesh_data["material_slot_name"]
+            submesh_node = f"{group_node}/{submesh_idx}"
+
+            # Create submesh collection
+            submesh_collection = node_collection(nodes, submesh_node, material_slot_name, group_collection)
+
+            for range_data in submesh_data["ranges"]:
+                range_idx = range_data["range_idx"]
+                range_vertices = range_data["vertices"]
+                used_indices = range_data["used_indices"]
+                range_node = f"{submesh_node}/{range_idx}"
+                skin_name = range_data["skin_name"]
+                mesh_key = range_data["mesh_key"]
+
+                # Unchanged since the last import of the file: leave it alone
+                old_obj = existing.pop(range_node, None)
+                if old_obj is not None:
+                    if (old_obj.get("xbg_mesh_hash"), old_obj.get("xbg_material_slot"), old_obj.get("xbg_skin_name")) == \
+                            (mesh_key, material_slot_name, skin_name):
+                        stats["kept"] += 1
+                        yield old_obj
+                        continue
+                    remove_mesh_object(old_obj)
+
+                # Create mesh object (DELEGATED TO FUNCTION), or instance one with the same geometry
+                shared = shared_mesh_data(mesh_key)
+                if shared is not None:
+                    mesh_obj = instance_mesh_object(skin_name, *shared)
+                    stats["instanced"] += 1
+                else:
                     mesh_obj = create_mesh_object(
-                        positions, lod_meshes[submesh_idx], meta_data, bone_mapping, indices_list, used_indices, uv_sets, uv_set_names, skin_name, bone_indices, bone_weights, normal, normal_modified, color
+                        range_vertices["positions"], lod_meshes[submesh_idx], meta_data, bone_mapping, range_data["indices"], used_indices,
+                        range_vertices["uvSets"], range_vertices["uvSetNames"], skin_name, range_vertices["boneIndices"],
+                        range_vertices["boneWeights"], range_vertices["normal"], range_vertices["normalModified"],
+                        range_vertices["color"]
                     )
+                    shared_meshes[mesh_key] = (mesh_obj.data, [vertex_group.name for vertex_group in mesh_obj.vertex_groups])
+                    mesh_obj.data["xbg_mesh_hash"] = mesh_key
+                    mesh_obj.data["xbg_vertex_groups"] = "\n".join(shared_meshes[mesh_key][1])
+
+                mesh_obj["xbg_node"] = range_node
+                mesh_obj["xbg_mesh_hash"] = mesh_key
+                mesh_obj["xbg_material_slot"] = material_slot_name
+                mesh_obj["xbg_skin_name"] = skin_name
+
+                # Link to collection
+                if mesh_obj.name in bpy.context.scene.collection.objects:
+                    bpy.context.scene.collection.objects.unlink(mesh_obj)
+                submesh_collection.objects.link(mesh_obj)
+                if parent is not None:
+                    mesh_obj.parent = parent
+
+                # Add custom properties
+                # mesh_obj["lod_index"] = lod_index
+                # mesh_obj["vertex_group_idx"] = group_idx
+                # mesh_obj["submesh_idx"] = submesh_idx
+                # mesh_obj["material_index"] = mat_index
+                # mesh_obj["skin_index"] = draw_range["skinIndex"]
+                # mesh_obj["original_vertex_count"] = range_data["stream_vertex_count"]
+                # mesh_obj["used_vertex_count"] = len(used_indices)
+                # if lod_index < len(lod_distances):
+                    # mesh_obj["lod_switch_distance"] = lod_distances[lod_index]
+
+                # Print progress
+                print(
+                    f"LOD {lod_index} Range {range_idx}: Pruned {range_data['stream_vertex_count'] - len(used_indices)} unused vertices")
+                stats["submeshes"] += 1
+                yield mesh_obj
+
+
+def build_xbg(decoded):
+    """
+    Create the collections, armature and mesh objects of a decode_xbg result.
+    A generator yielding after every draw range, so callers can spread the work over several timer ticks.
+    If the file was imported before, that import is updated instead: only the draw ranges whose hash or
+    material slot changed are rebuilt, ranges the file no longer has are removed (see build_lod).
+    """
+    xbg_name = decoded["name"]
+    meta_data = decoded["meta"]
+
+    # Print basic info
+    print(f"=== XBG Import ===")
+    print(f"File: {xbg_name}")
+    print(f"Total LODs: {len(decoded['lods'])}")
+    print(f"Total Buffers: {len(meta_data['buffers']['gfxBuffer'])}")
+    print(f"==================")
+
+    nodes = {}
+    existing = {}
+    root_collection = find_import_root(decoded["path"])
+    incremental = root_collection is not None
+    if not incremental:
+        # Create root collection
+        root_collection = create_collection(xbg_name)
+        root_collection["xbg_path"] = decoded["path"]
+
+        armature_obj = create_armature(meta_data, root_collection)
+    else:
+        # Re-import: diff against the tagged collections and objects of the last one
+        print(f"Updating existing import: {root_collection.name}")
+        armature_obj = update_armature(meta_data, root_collection)
+        index_tagged_meshes()
+        tree = [root_collection] + list(root_collection.children_recursive)
+        nodes = {collection["xbg_node"]: collection for collection in tree if "xbg_node" in collection}
+        existing = {obj["xbg_node"]: obj for collection in tree for obj in collection.objects if "xbg_node" in obj}
+
+    # Track progress
+    stats = {"submeshes": 0, "instanced": 0, "kept": 0}
 
-                    # Link to collection
-                    if mesh_obj.name in bpy.context.scene.collection.objects:
-                        bpy.context.scene.collection.objects.unlink(mesh_obj)
-                    submesh_collection.objects.link(mesh_obj)
-
-                    # Add custom properties
-                    # mesh_obj["lod_index"] = lod_index
-                    # mesh_obj["vertex_group_idx"] = group_idx
-                    # mesh_obj["submesh_idx"] = submesh_idx
-                    # mesh_obj["material_index"] = mat_index
-                    # mesh_obj["skin_index"] = draw_range["skinIndex"]
-                    # mesh_obj["original_vertex_count"] = len(positions)
-                    # mesh_obj["used_vertex_count"] = len(used_indices)
-                    # if lod_index < len(lod_distances):
-                        # mesh_obj["lod_switch_distance"] = lod_distances[lod_index]
-
-                    # Print progress
-                    print(
-                        f"LOD {lod_index} Range {range_idx}: Pruned {len(positions) - len(indices_list)} unused vertices")
-                    global_submesh_id += 1
+    for lod_index, groups in enumerate(decoded["lods"]):
+        # Create LOD collection
+        lod_collection = node_collection(nodes, f"LOD{lod_index}", f"LOD{lod_index}", root_collection)
+        yield from build_lod(meta_data, decoded["bone_mapping"], lod_index, groups, lod_collection, stats,
+                             nodes=nodes, existing=existing)
+
+    # Draw ranges the file no longer has, then the collections that left empty (deepest first)
+    for obj in existing.values():
+        remove_mesh_object(obj)
+    for node in sorted(nodes, key=lambda node: node.count("/"), reverse=True):
+        collection = nodes[node]
+        if incremental and not collection.objects and not collection.children:
+            bpy.data.collections.remove(collection)
 
     # Final output
     print(f"\n✅ Import Complete!")
-    print(f"- Total submeshes created: {global_submesh_id}")
+    print(f"- Total submeshes created: {stats['submeshes']}")
+    print(f"- Instanced from shared meshes: {stats['instanced']}")
+    print(f"- Kept unchanged: {stats['kept']}")
+    print(f"- Removed: {len(existing)}")
     print(f"- Root collection: {root_collection.name}")
 
 
+def import_xbg(xbg_path, cleanup=False):
+    """Import one file in one go, blocking Blender until it is done (ImportQueue doesn't)"""
+    if cleanup:
+        # Clean slate
+        full_cleanup()
+    for _ in build_xbg(decode_xbg(xbg_path)):
+        pass
+
+
+class ImportQueue:
+    """
+    Non-blocking import of a list of files.
+
+    decode_xbg runs on a thread pool, so the decode stages of queued files overlap each other and Blender
+    (the numpy work releases the GIL). The datablocks are created on the main thread from a bpy.app.timers
+    callback, a few draw ranges per tick within time_slice seconds, in queue order. Progress goes to the
+    window manager progress indicator and to on_progress(fraction, xbg_path) if given; cancel() stops
+    after the current draw range and drops the files not built yet.
+    """
+
+    def __init__(self, xbg_paths, workers=2, time_slice=0.02, cleanup=False, on_progress=None):
+        self.xbg_paths = list(xbg_paths)
+        self.time_slice = time_slice
+        self.cleanup = cleanup
+        self.on_progress = on_progress
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.pending = deque()
+        self.builder = None
+        self.current = None
+        self.built_ranges = 0
+        self.files_done = 0
+        self.failed = []
+        self.cancelled = False
+        self.finished = False
+
+    def start(self):
+        """Submit every file for decoding and register the build timer"""
+        if self.cleanup:
+            # Clean slate
+            full_cleanup()
+        for xbg_path in self.xbg_paths:
+            self.pending.append((xbg_path, self.executor.submit(decode_xbg, xbg_path)))
+        bpy.context.window_manager.progress_begin(0, 100)
+        bpy.app.timers.register(self._tick, first_interval=0.0)
+        return self
+
+    def cancel(self):
+        """Stop at the next timer tick; what has been built so far stays in the scene"""
+        self.cancelled = True
+
+    def progress(self):
+        """Fraction of the queue built so far, the file being built counted by its draw ranges"""
+        if not self.xbg_paths:
+            return 1.0
+        done = self.files_done
+        if self.current is not None and self.current["range_count"]:
+            done += self.built_ranges / self.current["range_count"]
+        return done / len(self.xbg_paths)
+
+    def _next_file(self):
+        """Start building the first queued file once it is decoded; False while it is still decoding"""
+        xbg_path, future = self.pending[0]
+        if not future.done():
+            return False
+        self.pending.popleft()
+        try:
+            self.current = future.result()
+        except Exception as e:
+            print(f"❌ Failed to decode {xbg_path}: {e}")
+            self.failed.append((xbg_path, e))
+            self.files_done += 1
+            return True
+        # "path" stays normalised for find_import_root, messages use the path as queued
+        self.current["source_path"] = xbg_path
+        self.builder = build_xbg(self.current)
+        self.built_ranges = 0
+        return True
+
+    def _step(self):
+        """Build one more draw range of the current file"""
+        try:
+            next(self.builder)
+            self.built_ranges += 1
+        except StopIteration:
+            self._end_file()
+        except Exception as e:
+            print(f"❌ Failed to build {self.current['source_path']}: {e}")
+            self.failed.append((self.current["source_path"], e))
+            self._end_file()
+
+    def _end_file(self):
+        self.builder = None
+        self.current = None
+        self.files_done += 1
+
+    def _tick(self):
+        if self.cancelled:
+            print(f"⚠️ Import cancelled, {len(self.pending) + (self.current is not None)} file(s) not finished")
+            return self._finish()
+
+        deadline = time.perf_counter() + self.time_slice
+        while time.perf_counter() < deadline:
+            if self.builder is None:
+                if not self.pending:
+                    return self._finish()
+                if not self._next_file():
+                    # first file in line is still decoding
+                    break
+            else:
+                self._step()
+
+        fraction = self.progress()
+        bpy.context.window_manager.progress_update(int(fraction * 100))
+        if self.on_progress is not None:
+            self.on_progress(fraction, self.current["source_path"] if self.current is not None else None)
+        return 0.01
+
+    def _finish(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.pending.clear()
+        self.builder = None
+        self.current = None
+        self.finished = True
+        bpy.context.window_manager.progress_end()
+        if self.on_progress is not None:
+            self.on_progress(self.progress(), None)
+        # returning None unregisters the timer
+        return None
+
+
+class LODStreamer:
+    """
+    Distance-driven LOD streaming for large scene assemblies.
+
+    add() imports a file as a lightweight proxy: an empty the size of its bounding sphere carrying the LOD
+    distances as custom properties, with nothing decoded yet. A bpy.app.timers callback picks the LOD of
+    every proxy for its distance to the active camera (MeshDecoder.lod_for_distance, lowEndDistances with
+    low_end). A LOD is decoded on a worker thread the first time it is needed, since the file is parsed
+    lazily that is also when its buffers (and .xbgmip) are read, then built under the proxy a few draw
+    ranges per tick. Files are only mapped while one of their LODs is decoded and built. LODs out of range
+    are hidden, and once the decoded size of the built LODs passes memory_budget bytes the least recently
+    shown ones are removed again.
+    """
+
+    def __init__(self, memory_budget=256 * 1024 * 1024, interval=0.25, time_slice=0.02, low_end=False, workers=2):
+        self.memory_budget = memory_budget
+        self.interval = interval
+        self.time_slice = time_slice
+        self.low_end = low_end
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.proxies = []
+        # (proxy index, lod index) -> decoded bytes of the built LODs, least recently shown first
+        self.resident = OrderedDict()
+        self.stats = {"submeshes": 0, "instanced": 0, "kept": 0}
+        self.running = False
+
+    def add(self, xbg_path, location=(0.0, 0.0, 0.0), parent_collection=None):
+        """Add a file as a proxy empty at location, returns the empty"""
+        xbg_name = os.path.splitext(os.path.basename(xbg_path))[0]
+        with XBGParser(xbg_path) as parser:
+            geom_params = parser.parse(lazy=True)["geomParams"]
+
+        collection = create_collection(xbg_name, parent_collection)
+        proxy = bpy.data.objects.new(xbg_name, None)
+        proxy.empty_display_type = 'SPHERE'
+        proxy.empty_display_size = max(geom_params["boundingSphere"]["radius"], 0.01)
+        proxy.location = location
+        proxy["xbg_path"] = xbg_path
+        proxy["lod_distances"] = list(geom_params["lodDistances"])
+        proxy["kill_distance"] = geom_params["killDistance"]
+        proxy["low_end_distances"] = list(geom_params["lowEndDistances"])
+        collection.objects.link(proxy)
+
+        self.proxies.append({
+            "path": xbg_path,
+            "proxy": proxy,
+            "collection": collection,
+            "geom_params": geom_params,
+            "lods": {},
+            "failed": set(),
+            "target": None,
+            "shown": None,
+            "decoding": None,
+            "building": None,
+        })
+        return proxy
+
+    def start(self):
+        """Register the streaming timer"""
+        self.running = True
+        bpy.app.timers.register(self._tick, first_interval=0.0)
+        return self
+
+    def stop(self):
+        """Stop streaming at the next tick, the LODs built so far stay in the scene"""
+        self.running = False
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def update(self, camera_location):
+        """Pick the LOD of every proxy for a camera position, request the missing ones and show the built ones"""
+        camera_location = mathutils.Vector(camera_location)
+        for index, entry in enumerate(self.proxies):
+            distance = (entry["proxy"].matrix_world.translation - camera_location).length
+            entry["target"] = MeshDecoder.lod_for_distance(entry["geom_params"], distance, self.low_end)
+            target = entry["target"]
+            if target is not None and target not in entry["lods"] and target not in entry["failed"]:
+                self._request(entry, target)
+            self._show(index, entry)
+
+    def _decode(self, entry, lod_index):
+        # runs on the worker; the file is parsed again for every LOD so nothing keeps it mapped in between,
+        # the sections build_lod reads are all loaded by decode_lod
+        with XBGParser(entry["path"]) as parser:
+            meta_data = parser.parse(lazy=True)
+            bone_mapping = precompute_bone_mapping(meta_data)
+            return meta_data, bone_mapping, decode_lod(meta_data, lod_index, bone_mapping)
+
+    def _request(self, entry, lod_index):
+        if entry["decoding"] is not None or entry["building"] is not None:
+            # the LOD in flight finishes first, the target is requested again on a later tick
+            return
+        entry["decoding"] = (lod_index, self.executor.submit(self._decode, entry, lod_index))
+
+    def _show(self, index, entry):
+        # until the target LOD is built the previous one stays visible, past killDistance nothing is
+        target = entry["target"]
+        if target is None or target in entry["lods"]:
+            entry["shown"] = target
+        for lod_index, lod in entry["lods"].items():
+            hidden = lod_index != entry["shown"]
+            lod["collection"].hide_viewport = hidden
+            lod["collection"].hide_render = hidden
+        if entry["shown"] is not None:
+            self.resident.move_to_end((index, entry["shown"]))
+
+    def _start_build(self, entry):
+        lod_index, future = entry["decoding"]
+        entry["decoding"] = None
+        try:
+            meta_data, bone_mapping, groups = future.result()
+        except Exception as e:
+            print(f"❌ Failed to decode LOD {lod_index} of {entry['path']}: {e}")
+            entry["failed"].add(lod_index)
+            return
+
+        lod_collection = create_collection(f"LOD{lod_index}", entry["collection"])
+        lod_collection.hide_viewport = True
+        lod_collection.hide_render = True
+        builder = build_lod(meta_data, bone_mapping, lod_index, groups, lod_collection, self.stats,
+                            parent=entry["proxy"])
+        entry["building"] = {"lod_index": lod_index, "builder": builder, "collection": lod_collection,
+                             "bytes": decoded_bytes(groups), "objects": []}
+
+    def _step(self, index, entry):
+        """Build one more draw range of the LOD in progress of a proxy"""
+        building = entry["building"]
+        try:
+            building["objects"].append(next(building["builder"]))
+            return
+        except StopIteration:
+            pass
+        except Exception as e:
+            print(f"❌ Failed to build LOD {building['lod_index']} of {entry['path']}: {e}")
+            entry["failed"].add(building["lod_index"])
+            # a partial LOD is neither shown nor counted against the budget
+            entry["building"] = None
+            self._remove_lod(building["collection"], building["objects"])
+            return
+
+        entry["building"] = None
+        lod_index = building["lod_index"]
+        entry["lods"][lod_index] = {"collection": building["collection"], "objects": building["objects"],
+                                    "bytes": building["bytes"]}
+        self.resident[(index, lod_index)] = building["bytes"]
+        self._show(index, entry)
+
+    def _unload(self, index, lod_index):
+        """Remove a built LOD, and the mesh datablocks only it was using"""
+        entry = self.proxies[index]
+        lod = entry["lods"].pop(lod_index)
+        del self.resident[(index, lod_index)]
+        self._remove_lod(lod["collection"], lod["objects"])
+
+    @staticmethod
+    def _remove_lod(lod_collection, objects):
+        tree = [lod_collection] + list(lod_collection.children_recursive)
+        # a failed build may have linked an object it never yielded
+        objects = list(objects)
+        objects += [obj for collection in tree for obj in collection.objects if obj not in objects]
+        for obj in objects:
+            remove_mesh_object(obj)
+        for collection in tree:
+            bpy.data.collections.remove(collection)
+
+    def _enforce_budget(self):
+        total = sum(self.resident.values())
+        for index, lod_index in list(self.resident):
+            if total <= self.memory_budget:
+                break
+            if lod_index == self.proxies[index]["shown"]:
+                continue
+            total -= self.resident[(index, lod_index)]
+            self._unload(index, lod_index)
+
+    def _tick(self):
+        if not self.running:
+            # returning None unregisters the timer
+            return None
+
+        camera = bpy.context.scene.camera
+        if camera is not None:
+            self.update(camera.matrix_world.translation)
+
+        for entry in self.proxies:
+            if entry["building"] is None and entry["decoding"] is not None and entry["decoding"][1].done():
+                self._start_build(entry)
+
+        deadline = time.perf_counter() + self.time_slice
+        building = [(index, entry) for index, entry in enumerate(self.proxies) if entry["building"] is not None]
+        while building and time.perf_counter() < deadline:
+            for index, entry in building:
+                if entry["building"] is not None:
+                    self._step(index, entry)
+            building = [(index, entry) for index, entry in building if entry["building"] is not None]
+
+        self._enforce_budget()
+
+        busy = any(entry["decoding"] is not None or entry["building"] is not None for entry in self.proxies)
+        return 0.01 if busy else self.interval
+
+
 # --------------------------
 # Run the Import
 # --------------------------
 
 XBG_PATH = r"D:\Steam\steamapps\common\Watch_Dogs\data_win64\worlds\windy_city\windy_city_unpack\graphics\characters\char\char01\char01.xbg"
-import_xbg(XBG_PATH)
\ No newline at end of file
+import_queue = ImportQueue([XBG_PATH]).start()
@@ -1,5 +1,5 @@
 from XBGParser import XBGParser
 
 parser = XBGParser(r".\low_grassnexus_a_8x4.xbg")
-meta_data = parser.parse()
+meta_data = parser.parse(lazy=True)
 print(f"Successfully parsed XBG file! LOD count: {meta_data['geomParams']['lodCount']}")
\ No newline at end of file
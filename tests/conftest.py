@@ -0,0 +1,104 @@
+import os
+import sys
+import types
+from unittest import mock
+
+import pytest
+
+# the modules live flat in the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class ID(dict):
+    """Datablock stand-in: custom properties by key, compared by identity like bpy structs"""
+
+    def __init__(self, name, data=None):
+        super().__init__()
+        self.name = name
+        self.data = data
+        self.users = 0
+
+    def __eq__(self, other):
+        return self is other
+
+    def __bool__(self):
+        # without custom properties it would be a falsy dict
+        return True
+
+    __hash__ = object.__hash__
+
+
+class Links(list):
+    def link(self, block):
+        self.append(block)
+
+    def unlink(self, block):
+        self.remove(block)
+
+
+class Object(ID):
+    def __init__(self, name, data=None):
+        super().__init__(name, data)
+        self.pose = mock.MagicMock()
+        if data is not None:
+            data.users += 1
+
+
+class Armature(ID):
+    def __init__(self, name, data=None):
+        super().__init__(name)
+        self.edit_bones = mock.MagicMock()
+        self.bones = []
+
+
+class Collection(ID):
+    def __init__(self, name, data=None):
+        super().__init__(name)
+        self.objects = Links()
+        self.children = Links()
+
+    @property
+    def children_recursive(self):
+        return [c for child in self.children for c in [child] + child.children_recursive]
+
+
+class IDList(list):
+    """bpy.data collection stand-in, removing a datablock also unlinks it from the collections"""
+
+    def __init__(self, kind, collections=None):
+        super().__init__()
+        self.kind = kind
+        self.collections = self if collections is None else collections
+
+    def new(self, name, object_data=None):
+        block = self.kind(name, object_data)
+        self.append(block)
+        return block
+
+    def remove(self, block):
+        super().remove(block)
+        if block.data is not None:
+            block.data.users -= 1
+        for collection in self.collections:
+            for links in (collection.objects, collection.children):
+                if block in links:
+                    links.unlink(block)
+
+
+@pytest.fixture
+def blender(monkeypatch):
+    """Namespace of blender.py run against a bpy stand-in, without the import it runs at the end"""
+    bpy = mock.MagicMock()
+    bpy.data.collections = IDList(Collection)
+    bpy.data.objects = IDList(Object, bpy.data.collections)
+    bpy.data.armatures = IDList(Armature, bpy.data.collections)
+    monkeypatch.setitem(sys.modules, "bpy", bpy)
+    monkeypatch.setitem(sys.modules, "mathutils", mock.MagicMock())
+
+    script = os.path.join(ROOT, "blender.py")
+    with open(script, encoding="utf-8") as f:
+        source = f.read()
+    module = types.ModuleType("blender")
+    exec(compile(source[:source.index("XBG_PATH = r")], script, "exec"), module.__dict__)
+    return module
@@ -0,0 +1,41 @@
+import numpy as np
+
+from BinaryReader import BinaryReader
+
+
+def write(tmp_path, data):
+    path = tmp_path / "data.bin"
+    path.write_bytes(data)
+    return path
+
+
+def test_close_unmaps(tmp_path):
+    with BinaryReader.from_file(write(tmp_path, bytes(range(16)))) as reader:
+        source = reader.data.obj
+        assert reader.u32() == 0x03020100
+    assert source.closed
+    assert reader.size == 0
+
+
+def test_close_keeps_views_alive(tmp_path):
+    reader = BinaryReader.from_file(write(tmp_path, bytes(range(16))))
+    array = np.frombuffer(reader.data, dtype=np.uint8, count=4, offset=4)
+    source = reader.data.obj
+    reader.close()
+    # unmapped once the last view is gone, not under it
+    assert not source.closed
+    assert array.tolist() == [4, 5, 6, 7]
+    assert reader.size == 0
+
+
+def test_close_empty_file(tmp_path):
+    reader = BinaryReader.from_file(write(tmp_path, b""))
+    reader.close()
+    assert reader.eof()
+
+
+def test_array_negative_count():
+    reader = BinaryReader(bytes(8))
+    assert reader.array("f", -1) == ()
+    assert reader.tell() == 0
+    assert reader.array("f", 2) == (0.0, 0.0)
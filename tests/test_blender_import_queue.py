@@ -0,0 +1,35 @@
+import os
+import time
+
+
+def run(queue):
+    queue.start()
+    while not queue.finished:
+        queue._tick()
+        time.sleep(0.001)
+
+
+def test_reimport_through_queue(blender, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    xbg_path = os.path.join("char", "char01.xbg")
+
+    def decode_xbg(path):
+        return {"name": "char01", "path": os.path.normcase(os.path.abspath(path)), "range_count": 1}
+
+    def build_xbg(decoded):
+        # tag the root collection like build_xbg, or reuse it when the file was imported before
+        if blender.find_import_root(decoded["path"]) is None:
+            blender.bpy.data.collections.new(decoded["name"])["xbg_path"] = decoded["path"]
+        yield
+
+    monkeypatch.setattr(blender, "decode_xbg", decode_xbg)
+    monkeypatch.setattr(blender, "build_xbg", build_xbg)
+
+    progress = []
+    for _ in range(2):
+        run(blender.ImportQueue([xbg_path], on_progress=lambda fraction, path: progress.append(path)))
+
+    assert len(blender.bpy.data.collections) == 1
+    assert blender.bpy.data.collections[0]["xbg_path"] == os.path.normcase(os.path.abspath(xbg_path))
+    # progress reports the path as it was queued
+    assert set(progress) <= {xbg_path, None}
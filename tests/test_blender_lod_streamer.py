@@ -0,0 +1,29 @@
+def test_failed_build_is_removed(blender):
+    bpy = blender.bpy
+    streamer = blender.LODStreamer()
+    lod_collection = blender.create_collection("LOD0")
+    submesh_collection = blender.create_collection("Submesh", lod_collection)
+
+    def builder():
+        obj = bpy.data.objects.new("range0")
+        submesh_collection.objects.link(obj)
+        yield obj
+        # fails after linking an object it never yields
+        submesh_collection.objects.link(bpy.data.objects.new("range1"))
+        raise RuntimeError("broken draw range")
+
+    entry = {"path": "a.xbg", "lods": {}, "failed": set(), "target": 0, "shown": None, "decoding": None,
+             "building": {"lod_index": 0, "builder": builder(), "collection": lod_collection, "bytes": 1024,
+                          "objects": []}}
+    streamer.proxies.append(entry)
+
+    while entry["building"] is not None:
+        streamer._step(0, entry)
+    streamer.stop()
+
+    assert entry["failed"] == {0}
+    assert entry["lods"] == {}
+    assert not streamer.resident
+    assert entry["shown"] is None
+    assert len(bpy.data.objects) == 0
+    assert len(bpy.data.collections) == 0
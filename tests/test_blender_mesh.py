@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from XBGRecords import FVF_FLAGS
+
+
+def make_mesh(*flags):
+    return {flag: int(flag in flags) for flag in FVF_FLAGS}
+
+
+def foreach_set(collection):
+    """attribute -> buffer of every foreach_set call made on a mocked bpy collection"""
+    calls = {}
+    for call in collection.foreach_set.call_args_list:
+        name, values = call.args
+        assert name not in calls
+        calls[name] = values
+    return calls
+
+
+def create(blender, mesh, indices, uv_sets, uv_set_names):
+    positions = np.arange(12, dtype=np.float32).reshape(4, 3)
+    empty = np.empty((0, 3), dtype=np.float32)
+    return blender.create_mesh_object(positions, mesh, None, None, indices, None, uv_sets, uv_set_names, "skin",
+                                      None, None, empty, empty, None)
+
+
+@pytest.mark.parametrize("version, loop_total", [((3, 6, 0), True), ((4, 2, 0), False)])
+def test_triangle_mesh(blender, version, loop_total):
+    bpy = blender.bpy
+    bpy.app.version = version
+    indices = np.array([[0, 1, 2], [2, 1, 3]], dtype=np.int64)
+    uv_sets = [np.arange(8, dtype=np.float32).reshape(4, 2), -np.arange(8, dtype=np.float32).reshape(4, 2)]
+
+    obj = create(blender, make_mesh("UV"), indices, uv_sets, ["uv0", "uv1"])
+
+    mesh_data = bpy.data.meshes.new.return_value
+    assert obj.data is mesh_data
+    mesh_data.vertices.add.assert_called_once_with(4)
+    assert np.array_equal(foreach_set(mesh_data.vertices)["co"], np.arange(12, dtype=np.float32))
+
+    mesh_data.loops.add.assert_called_once_with(6)
+    loops = foreach_set(mesh_data.loops)
+    assert loops["vertex_index"].dtype == np.int32
+    assert np.array_equal(loops["vertex_index"], [0, 1, 2, 2, 1, 3])
+
+    mesh_data.polygons.add.assert_called_once_with(2)
+    polygons = foreach_set(mesh_data.polygons)
+    assert np.array_equal(polygons["loop_start"], [0, 3])
+    assert ("loop_total" in polygons) == loop_total
+    if loop_total:
+        assert np.array_equal(polygons["loop_total"], [3, 3])
+    mesh_data.edges.add.assert_not_called()
+    mesh_data.edges.foreach_set.assert_not_called()
+
+    # one uv per loop, taken from the loop's vertex
+    uv_layer = mesh_data.uv_layers.new.return_value
+    assert [call.kwargs["name"] for call in mesh_data.uv_layers.new.call_args_list] == ["uv0", "uv1"]
+    uvs = [call.args for call in uv_layer.data.foreach_set.call_args_list]
+    assert [name for name, _ in uvs] == ["uv", "uv"]
+    for (_, values), uv_set in zip(uvs, uv_sets):
+        assert values.dtype == np.float32
+        assert np.array_equal(values, uv_set[[0, 1, 2, 2, 1, 3]].ravel())
+
+
+def test_line_mesh(blender):
+    bpy = blender.bpy
+    bpy.app.version = (4, 2, 0)
+    indices = np.array([[0, 1], [1, 3], [3, 2]], dtype=np.int64)
+    uv_sets = [np.arange(8, dtype=np.float32).reshape(4, 2)]
+
+    create(blender, make_mesh("UV"), indices, uv_sets, ["uv0"])
+
+    mesh_data = bpy.data.meshes.new.return_value
+    mesh_data.edges.add.assert_called_once_with(3)
+    edges = foreach_set(mesh_data.edges)
+    assert edges["vertices"].dtype == np.int32
+    assert np.array_equal(edges["vertices"], [0, 1, 1, 3, 3, 2])
+
+    # lines have no faces, so no loops to carry uvs
+    mesh_data.loops.add.assert_not_called()
+    mesh_data.loops.foreach_set.assert_not_called()
+    mesh_data.polygons.add.assert_not_called()
+    assert "loop_start" not in foreach_set(mesh_data.polygons)
+    mesh_data.uv_layers.new.assert_not_called()
@@ -0,0 +1,34 @@
+import os
+
+import SkeletonPose
+
+
+def make_skeleton(*names):
+    return [{"name": name, "position": [0.0, 0.0, float(i)], "rotation": [0.0, 0.0, 0.0, 1.0],
+             "parent": i - 1 if i else 0xFFFF, "matrixIndex": i, "id": i, "boneLOD": 0}
+            for i, name in enumerate(names)]
+
+
+def import_skeleton(blender, path, skeleton):
+    decoded = {"name": "char01", "path": os.path.normcase(os.path.abspath(path)), "lods": [],
+               "meta": {"skeletons": {"skeletons": [skeleton]}, "buffers": {"gfxBuffer": []}}}
+    for _ in blender.build_xbg(decoded):
+        pass
+    root = blender.find_import_root(path)
+    return [obj for obj in root.objects if obj.data is not None and "xbg_skeleton_hash" in obj.data]
+
+
+def test_reimport_replaces_changed_armature(blender, tmp_path):
+    path = str(tmp_path / "char01.xbg")
+    first = import_skeleton(blender, path, make_skeleton("Root", "Spine"))
+    changed = make_skeleton("Root", "Spine", "Head")
+
+    armatures = import_skeleton(blender, path, changed)
+    assert len(armatures) == 1
+    assert armatures[0] is not first[0]
+    assert armatures[0].data["xbg_skeleton_hash"] == SkeletonPose.skeleton_hash(changed)
+    # the old datablock lost its last user
+    assert first[0].data not in blender.bpy.data.armatures
+
+    # unchanged skeleton: the armature is kept as it is
+    assert import_skeleton(blender, path, changed) == armatures
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from ClothSolver import ClothSolver, simulate
+from XBGParser import ESecondaryMotionObjectType
+
+
+IDENTITY = [list(np.eye(4).reshape(-1))]
+
+
+def make_smo(planes=()):
+    """Two particle chain, the first one attached, with the given collision primitives"""
+    return {
+        "simulationParameters": {
+            "objectType": ESecondaryMotionObjectType.Cloth,
+            "gravity": [0.0, 0.0, -9.8],
+            "viscousDrag": 0.0,
+            "aerodynamicDrag": 0.0,
+            "frictionCoefficient": 0.5,
+            "frictionExtraRadius": 0.0,
+            "jiggleStiffness": 0.0,
+            "numIterations": 2,
+            "verticalStiffness": 1.0,
+            "horizontalStiffness": 1.0,
+            "shearStiffness": 1.0,
+            "bendStiffness": 1.0,
+            "useMaxLengthConstraints": False,
+        },
+        "particles": {"particleCount": 2, "particle": [
+            {"radius": 0.1, "isAttached": 1},
+            {"radius": 0.1, "isAttached": 0},
+        ]},
+        "springs": {"spring": [{"index1": 0, "index2": 1, "springType": 1}]},
+        "triangles": {"triangleDesc": []},
+        "connectivities": {"neighbor": []},
+        "collisionPrimitiveCollectionDescription": {
+            "spheres": [],
+            "cylinders": [],
+            "capsules": [],
+            "planes": [{"primitive": {"value": 0}, "primitiveToBone": IDENTITY, "localOrigin": origin,
+                        "localNormal": normal} for origin, normal in planes],
+        },
+        "limitCollectionDescription": {"sphereLimits": [], "boxLimits": [], "cylinderLimits": []},
+    }
+
+
+def test_plane_only_collider():
+    smo = make_smo(planes=[([0.0, 0.0, 0.5], [0.0, 0.0, 1.0])])
+    frames = simulate(smo, [[0.0, 0.0, 1.0], [0.5, 0.0, 0.6]], 30)
+
+    assert frames.dtype == np.float64
+    assert np.isfinite(frames).all()
+    # the free particle falls onto the plane and stays on top of it
+    assert (frames[:, 1, 2] >= 0.6 - 1e-6).all()
+    assert np.isclose(frames[-1, 1, 2], 0.6)
+
+
+def test_positions_per_smo():
+    with pytest.raises(ValueError):
+        ClothSolver([make_smo(), make_smo()], [[[0.0, 0.0, 1.0], [0.0, 0.0, 0.5]]])
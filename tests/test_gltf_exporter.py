@@ -0,0 +1,20 @@
+import numpy as np
+
+from GLTFExporter import _compact_joints
+
+
+def test_compact_joints_unique():
+    # NO_BONE_PALETTE table of a skeleton with a bone on matrixIndex 0xFFFF: mostly unmapped entries
+    table = np.full(0x10000, -1, dtype=np.int64)
+    table[[0, 1, 2, 3, 0xFFFF]] = [0, 1, 2, 3, 4]
+    indices = np.array([[0, 1, 0, 0], [3, 0xFFFF, 0, 0], [5, 2, 0, 0]])
+    weights = np.array([[0.5, 0.5, 0.0, 0.0], [0.25, 0.75, 0.0, 0.0], [0.5, 0.5, 0.0, 0.0]])
+
+    joints, local = _compact_joints(table, indices, weights)
+
+    assert len(set(joints.tolist())) == len(joints)
+    assert joints.tolist() == [0, 1, 2, 3, 4]
+    mapped = (weights > 0.0) & (table[indices] >= 0)
+    assert (joints[local][mapped] == table[indices][mapped]).all()
+    # unweighted influences and the ones without a bone use joint 0
+    assert (local[~mapped] == 0).all()
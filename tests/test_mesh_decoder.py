@@ -0,0 +1,172 @@
+import math
+import struct
+
+import numpy as np
+import pytest
+
+import MeshDecoder
+from XBGParser import EPrimitiveType
+
+
+FLAGS = ("Point", "PointComp", "UVComp1", "UVComp2", "Skin", "SkinExtra", "SkinRigid", "NormalComp", "Color",
+         "TangentComp", "BinormalComp", "NormalModifiedComp")
+
+POS_MIN, POS_RANGE = -2.5, 1.0 / 4096.0
+UV_XY, UV_ZW = 0.5, 1.0 / 2048.0
+
+
+def make_mesh(flags, vertex_count, offset=0, padding=0):
+    mesh = {flag: flag in flags for flag in FLAGS}
+    size = (16 * mesh["Point"] + 8 * mesh["PointComp"] + 4 * mesh["UVComp1"] + 4 * mesh["UVComp2"]
+            + 8 * mesh["Skin"] + 4 * (mesh["Skin"] and mesh["SkinExtra"])
+            + 4 * (mesh["NormalComp"] + mesh["Color"] + mesh["TangentComp"] + mesh["BinormalComp"]
+                   + mesh["NormalModifiedComp"]))
+    mesh.update(fvf=0, vertexSize=size + padding,
+                mergedRanges={"vertexBufferByteOffset": offset, "vertexCount": vertex_count})
+    return mesh
+
+
+def make_buffer(mesh, seed):
+    rng = np.random.default_rng(seed)
+    size = mesh["mergedRanges"]["vertexBufferByteOffset"] + mesh["mergedRanges"]["vertexCount"] * mesh["vertexSize"]
+    data = bytearray(rng.integers(0, 256, size, dtype=np.uint8).tobytes())
+    if mesh["Point"]:
+        # random bytes can be NaN, positions get real floats
+        vertices = np.frombuffer(data, dtype=MeshDecoder.vertex_dtype(mesh), count=mesh["mergedRanges"]["vertexCount"],
+                                 offset=mesh["mergedRanges"]["vertexBufferByteOffset"])
+        vertices["point"] = rng.uniform(-10.0, 10.0, (len(vertices), 4)).astype(np.float32)
+        if mesh["SkinRigid"]:
+            vertices["point"][:, 3] = rng.integers(0, 64, len(vertices))
+    return data
+
+
+def reference_decode(data, mesh):
+    """One vertex at a time with struct, the way the original reader in blender.py did it"""
+    out = {key: [] for key in ("positions", "uv0", "uv1", "boneIndices", "boneWeights", "normal", "color",
+                               "normalModified")}
+
+    def direction(packed):
+        n0, n1, n2 = (value / 255.0 * 2.0 - 1.0 for value in packed[:3])
+        normalizer = math.sqrt(n0 * n0 + n1 * n1 + n2 * n2)
+        return n2 / normalizer, n1 / normalizer, n0 / normalizer
+
+    start = mesh["mergedRanges"]["vertexBufferByteOffset"]
+    for vertex in range(mesh["mergedRanges"]["vertexCount"]):
+        pos = start + vertex * mesh["vertexSize"]
+
+        def read(fmt):
+            nonlocal pos
+            values = struct.unpack_from("<" + fmt, data, pos)
+            pos += struct.calcsize("<" + fmt)
+            return values
+
+        if mesh["Point"]:
+            x, y, z, w = read("4f")
+            out["positions"].append((x, y, z))
+        if mesh["PointComp"]:
+            x, y, z, w = read("4h")
+            out["positions"].append((x * POS_RANGE + POS_MIN, y * POS_RANGE + POS_MIN, z * POS_RANGE + POS_MIN))
+        for uv_set in ("uv0", "uv1"):
+            if mesh["UVComp1" if uv_set == "uv0" else "UVComp2"]:
+                u, v = read("2h")
+                out[uv_set].append(((u * UV_ZW + UV_XY) % 1.0, (-v * UV_ZW + UV_XY) % 1.0))
+        if mesh["Skin"]:
+            weights, bones = list(read("4B")), list(read("4B"))
+            if mesh["SkinExtra"]:
+                weights += read("2B")
+                bones += read("2B")
+            out["boneWeights"].append([weight / 255.0 for weight in weights])
+            out["boneIndices"].append(bones)
+        if mesh["SkinRigid"]:
+            out["boneIndices"].append((int(math.floor(w / 256.0)) if mesh["BinormalComp"] else int(w), 0, 0, 0))
+            out["boneWeights"].append((1.0, 0.0, 0.0, 0.0))
+        if mesh["NormalComp"]:
+            out["normal"].append(direction(read("4B")))
+        if mesh["Color"]:
+            c0, c1, c2, c3 = read("4B")
+            out["color"].append((c2 / 255.0, c1 / 255.0, c0 / 255.0, c3 / 255.0))
+        if mesh["TangentComp"]:
+            read("4B")
+        if mesh["BinormalComp"]:
+            read("4B")
+        if mesh["NormalModifiedComp"]:
+            out["normalModified"].append(direction(read("4B")))
+    return out
+
+
+@pytest.mark.parametrize("flags, offset, padding", [
+    (("Point", "UVComp1", "NormalComp"), 0, 0),
+    (("PointComp", "UVComp1", "UVComp2", "NormalComp", "TangentComp", "BinormalComp"), 32, 0),
+    (("PointComp", "UVComp1", "Skin", "NormalComp", "Color"), 0, 4),
+    (("PointComp", "UVComp1", "Skin", "SkinExtra", "NormalComp", "TangentComp", "BinormalComp"), 8, 0),
+    (("PointComp", "UVComp1", "SkinRigid", "NormalComp", "TangentComp", "BinormalComp"), 0, 0),
+    (("Point", "UVComp1", "SkinRigid", "NormalComp"), 0, 0),
+    (("PointComp", "UVComp1", "NormalComp", "Color", "NormalModifiedComp"), 16, 4),
+])
+def test_decode_vertices_matches_per_vertex_reader(flags, offset, padding):
+    mesh = make_mesh(flags, 97, offset, padding)
+    data = make_buffer(mesh, len(flags) + offset)
+
+    decoded = MeshDecoder.decode_vertices(memoryview(data), mesh, POS_MIN, POS_RANGE, UV_XY, UV_ZW)
+    expected = reference_decode(data, mesh)
+
+    for key in ("positions", "boneIndices", "boneWeights", "normal", "color", "normalModified"):
+        if expected[key]:
+            assert np.array_equal(decoded[key], np.array(expected[key])), key
+        else:
+            assert not len(decoded[key]), key
+    assert decoded["uvSetNames"] == [name for name in ("uv0", "uv1") if expected[name]]
+    for name, uvs in zip(decoded["uvSetNames"], decoded["uvSets"]):
+        assert np.array_equal(uvs, np.array(expected[name])), name
+    assert decoded["positions"].dtype == np.float64
+
+
+R = MeshDecoder.RESTART_INDEX
+
+
+def decode(indices, primitive_type, skip=0):
+    # skip leading junk indices to check the byte offset as well
+    data = np.array([7] * skip + indices, dtype="<u2").tobytes()
+    return MeshDecoder.decode_indices(data, skip * 2, len(indices), primitive_type)
+
+
+def test_triangle_strip_winding():
+    out, used = decode([0, 1, 2, 3, 4], EPrimitiveType.TriangleStrip, skip=2)
+    assert out.tolist() == [[0, 1, 2], [2, 1, 3], [2, 3, 4]]
+    assert used.tolist() == [0, 1, 2, 3, 4]
+
+
+def test_triangle_strip_restart_parity():
+    # the second strip starts at an odd position but its first triangle is not flipped
+    out, used = decode([0, 1, 2, 3, R, 5, 6, 7, 8], EPrimitiveType.TriangleStrip)
+    assert out.tolist() == [[0, 1, 2], [2, 1, 3], [5, 6, 7], [7, 6, 8]]
+    assert R not in used
+
+
+def test_triangle_strip_drops_degenerates():
+    # the repeated index joins two strips, the triangles it makes have no area
+    out, _ = decode([0, 1, 2, 2, 3, 4], EPrimitiveType.TriangleStrip)
+    assert out.tolist() == [[0, 1, 2], [3, 2, 4]]
+
+
+def test_triangle_fan_restart():
+    out, used = decode([0, 1, 2, 3, R, 5, 6, 7], EPrimitiveType.TriangleFan)
+    assert out.tolist() == [[2, 1, 0], [3, 2, 0], [7, 6, 5]]
+    assert used.tolist() == [0, 1, 2, 3, 5, 6, 7]
+
+
+def test_triangle_fan_drops_degenerates():
+    out, _ = decode([0, 1, 1, 2], EPrimitiveType.TriangleFan)
+    assert out.tolist() == [[2, 1, 0]]
+
+
+def test_short_strips():
+    for indices in ([], [0, 1], [0, 1, R, 2, 3]):
+        out, used = decode(indices, EPrimitiveType.TriangleStrip)
+        assert out.shape == (0, 3)
+        assert not len(used)
+
+
+def test_line_strip_restart():
+    out, _ = decode([0, 1, 2, R, 3, 4], EPrimitiveType.LineStrip)
+    assert out.tolist() == [[0, 1], [1, 2], [3, 4]]
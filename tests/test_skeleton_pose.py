@@ -0,0 +1,25 @@
+import numpy as np
+
+from SkeletonPose import skeleton_hash
+
+
+def make_skeleton(rotations):
+    rotations = np.asarray(rotations, dtype=np.float32)
+    return {
+        "position": np.zeros((len(rotations), 3), dtype=np.float32),
+        "rotation": rotations,
+        "parent": np.array([-1] + [0] * (len(rotations) - 1), dtype=np.int32),
+        "name": [f"bone{i}" for i in range(len(rotations))],
+    }
+
+
+def test_hash_ignores_quaternion_sign():
+    rotations = np.array([[0.0, 0.0, 0.0, 1.0], [0.0, 0.6, 0.8, 0.0], [0.0, 0.0, -1.0, 0.0]])
+    flipped = rotations * [[-1.0], [-1.0], [-1.0]]
+    assert skeleton_hash(make_skeleton(rotations)) == skeleton_hash(make_skeleton(flipped))
+
+
+def test_hash_tells_rotations_apart():
+    a = make_skeleton([[0.0, 0.6, 0.8, 0.0]])
+    b = make_skeleton([[0.0, 0.6, -0.8, 0.0]])
+    assert skeleton_hash(a) != skeleton_hash(b)